@@ -1,14 +1,18 @@
 import streamlit as st
-import dashscope
 import os
 import uuid
 import datetime
-from streamlit_agraph import agraph
+import time
 
 # --- Secure API Key Loading ---
+# The offline model client (DEEPMEMORY_MODEL_CLIENT=fake) needs no key.
 try:
-    if "DASHSCOPE_API_KEY" in st.secrets:
-        dashscope.api_key = st.secrets["DASHSCOPE_API_KEY"]
+    if os.environ.get("DEEPMEMORY_MODEL_CLIENT", "dashscope").lower() == "fake":
+        pass
+    elif "DASHSCOPE_API_KEY" in st.secrets:
+        # The DashScope SDK reads the key from the environment when it is first used,
+        # so the SDK itself is only imported on the analysis path.
+        os.environ["DASHSCOPE_API_KEY"] = st.secrets["DASHSCOPE_API_KEY"]
     else:
         # 优雅的错误提示，防止直接报错崩溃
         st.error("⚠️ 未检测到 API Key。请在 .streamlit/secrets.toml 中配置 DASHSCOPE_API_KEY。")
@@ -18,9 +22,24 @@ except FileNotFoundError:
     st.stop()
 
 # Local imports
+# Only the lightweight data layer is imported eagerly. Graph (networkx, numpy) and
+# AI (dashscope, PIL) modules are imported inside the pages that need them.
 from utils import data_manager
-from utils import image_processor
-from utils import graph_visualizer
+from utils import media_server
+from utils import rerun_timer
+
+_run_started = time.perf_counter()
+
+# --- Tenant ---
+# Each session works on one tenant's memories, chosen with ?tenant=<id> when the
+# session starts (default: data/ and assets/ in the working directory).
+def _session_tenant():
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    if get_script_run_ctx() is None:
+        return None # not a session's thread (e.g. an analysis worker)
+    return st.session_state.get("tenant")
+
+data_manager.set_tenant_resolver(_session_tenant)
 
 # --- Configuration ---
 st.set_page_config(
@@ -31,12 +50,19 @@ st.set_page_config(
 )
 
 # Custom CSS
-def local_css(file_name):
+@st.cache_resource
+def _read_static(file_name):
+    # Static assets are read once per process, not on every rerun
     with open(file_name, encoding='utf-8') as f:
-        st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
+        return f.read()
+
+def local_css(file_name):
+    st.markdown(f'<style>{_read_static(file_name)}</style>', unsafe_allow_html=True)
 
 local_css("assets/style.css")
 
+GALLERY_PAGE_SIZE = 24 # events rendered per "Load more" step
+
 # --- Session State Management ---
 if 'step' not in st.session_state:
     st.session_state.step = 'input' # input, review
@@ -48,18 +74,60 @@ if 'graph_center' not in st.session_state:
     st.session_state.graph_center = None
 if 'selected_node_id' not in st.session_state:
     st.session_state.selected_node_id = None
+if 'gallery_limit' not in st.session_state:
+    st.session_state.gallery_limit = GALLERY_PAGE_SIZE
+if 'tenant' not in st.session_state:
+    requested = st.query_params.get("tenant") or data_manager.DEFAULT_TENANT
+    try:
+        data_manager.tenant_root(requested)
+    except ValueError:
+        st.error(f"Invalid tenant id: {requested}")
+        st.stop()
+    st.session_state.tenant = requested
 
 # --- Sidebar ---
 st.sidebar.title("🌌 DeepMemory")
 mode = st.sidebar.radio("Navigation", ["Relationship", "Time Capsule", "Memory Gallery"])
 
+# --- Live Updates ---
+# All sessions of a tenant read one shared store. Each session subscribes to the
+# collections its page shows and reruns only when one of them gets a new version.
+STORE_POLL_SECONDS = 2
+PAGE_COLLECTIONS = {
+    "Relationship": ("nodes", "edges", "events"),
+    "Time Capsule": ("nodes",),
+    "Memory Gallery": ("events", "nodes"), # cards show participant names
+}
+
+_shared_store = data_manager.get_store()
+if st.session_state.get('store_subscription') is None or st.session_state.store_subscription.store is not _shared_store:
+    # Also after the tenant was evicted from the store pool and loaded again
+    st.session_state.store_subscription = _shared_store.subscribe(PAGE_COLLECTIONS[mode])
+subscription = st.session_state.store_subscription
+subscription.watch(PAGE_COLLECTIONS[mode])
+subscription.ack() # this run renders the current versions
+
+@st.fragment(run_every=STORE_POLL_SECONDS)
+def _watch_store():
+    if subscription.changed():
+        st.rerun(scope="app")
+
+_watch_store()
+
 # --- View: Relationship ---
 if mode == "Relationship":
+    from utils import graph_canvas
+    from utils import graph_visualizer
+    from utils import graph_analytics
+    from utils import graph_timeline
+
     st.title("Relationship Graph")
     st.markdown("Explore the constellation of your memories.")
     
     nodes = data_manager.get_nodes()
     edges = data_manager.get_edges()
+    # Process-wide cached analytics; only re-synced when the edge store changed
+    analytics = graph_analytics.get_engine(edges, data_manager.get_edges_version(), tenant=data_manager.current())
     
     # 1. Sidebar Controls
     view_depth = st.sidebar.slider("View Depth (k)", min_value=1, max_value=3, value=1)
@@ -71,235 +139,458 @@ if mode == "Relationship":
         center = None
         st.rerun()
     
+    # Time Travel: replay the network as it was at the end of a given month
     st.sidebar.markdown("---")
+    time_travel = st.sidebar.checkbox("🕰️ Time Travel")
+    playing = False
+    if time_travel:
+        timeline = graph_timeline.get_timeline(data_manager.iter_events, data_manager.get_events_version(),
+                                               tenant=data_manager.current())
+        months = timeline.labels()
+        if months:
+            if st.session_state.get('timeline_month') not in months:
+                st.session_state.timeline_month = months[-1]
+            playing = st.session_state.get('timeline_playing', False)
+            if playing:
+                # Advance one bucket per rerun
+                idx = months.index(st.session_state.timeline_month)
+                if idx + 1 < len(months):
+                    st.session_state.timeline_month = months[idx + 1]
+                else:
+                    playing = st.session_state.timeline_playing = False
+            
+            as_of = st.sidebar.select_slider("As of", options=months, key="timeline_month")
+            if st.sidebar.button("⏸ Pause" if playing else "▶ Play Growth"):
+                if not playing and as_of == months[-1]:
+                    st.session_state.timeline_month = months[0]
+                st.session_state.timeline_playing = not playing
+                st.rerun()
+            
+            # Per-session cursor; each slider step only applies that month's deltas
+            cursor = st.session_state.get('timeline_cursor')
+            if cursor is None or cursor.timeline is not timeline:
+                cursor = st.session_state.timeline_cursor = timeline.cursor()
+            cursor.seek(months.index(as_of))
+            
+            labels = {(e['source'], e['target']): e.get('relation_type', '') for e in edges}
+            edges = cursor.edges(labels)
+            linked = {e['source'] for e in edges} | {e['target'] for e in edges} | {'root_me'}
+            nodes = [n for n in nodes if n['id'] in linked]
+        else:
+            st.sidebar.caption("No dated memories yet.")
+    
     st.sidebar.metric("Total Nodes", len(nodes))
     st.sidebar.metric("Connections", len(edges))
     
     with st.sidebar.expander("⚠️ Developer Options"):
+        from utils import backup # stdlib only, already loaded by data_manager
+        tenant = data_manager.current() # backups cover this tenant's data/ and assets/
+        if st.button("💾 Back up now"):
+            data_manager.flush()
+            stats = backup.create_backup(tenant.backup_dir, base=tenant.root)["stats"]
+            st.success(f"Backed up {stats['files']} files; {stats['hashed_files']} read, {stats['new_blobs']} new.")
+        snapshots = backup.list_snapshots(tenant.backup_dir)
+        if snapshots:
+            snapshot_id = st.selectbox("Snapshot", list(reversed(snapshots)))
+            if st.button("⏪ Restore snapshot"):
+                backup.restore(tenant.backup_dir, snapshot_id, base=tenant.root)
+                backup.reload_app_state()
+                st.session_state.clear()
+                st.rerun()
+        if st.checkbox("Show tenant store metrics"):
+            pool_metrics = data_manager.pool.metrics()
+            st.caption(f"Tenant '{tenant.id}' · {pool_metrics['loaded']} of {pool_metrics['size']} loaded · "
+                       f"{pool_metrics['loads']} loads, {pool_metrics['evictions']} evictions")
+            st.dataframe([dict(m, indexes=", ".join(m['indexes'])) for m in pool_metrics['tenants']], hide_index=True)
         confirm_wipe = st.checkbox("⚠️ I confirm I want to wipe ALL data")
         if confirm_wipe:
             if st.button("🗑️ Reset All Memory", type="primary"):
+                # Keep a way back: the reset itself only removes files
+                data_manager.flush()
+                backup.create_backup(tenant.backup_dir, base=tenant.root)
                 if data_manager.reset_database():
                     st.session_state.clear()
                     st.rerun()
 
     # 2. Layout Split
-    col_main, col_info = st.columns([3, 1])
-    
-    with col_main:
-        # Generate dynamic seed to force physics re-simulation on center change
-        dynamic_seed = 42
-        if center:
-            # Use hash of center ID to ensure consistent but unique layout for each view
-            dynamic_seed = abs(hash(center)) % 10000
-            
-        vis_nodes, vis_edges, config = graph_visualizer.get_graph_data(nodes, edges, center, k_hop=view_depth, seed=dynamic_seed)
+    # The panels are fragments: a widget inside one reruns only that panel. Selecting
+    # a node reruns graph + inspector (the graph data is reused); writes that change
+    # the graph still rerun the whole app.
+    view_analytics = None if time_travel else analytics # cached analytics describe the current graph
+
+    @rerun_timer.timed("graph.canvas")
+    def draw_graph(nodes, edges, center, view_depth, analytics):
+        # Fragment reruns get the same argument objects: reuse the vis data then
+        cache = st.session_state.get('graph_canvas_cache')
+        args = (nodes, edges, center, view_depth, analytics)
+        if cache is None or any(a is not b for a, b in zip(cache[0], args)):
+            # Edge tooltips describe the current graph too (no analytics in time travel)
+            edge_events = data_manager.get_edge_events() if analytics is not None else None
+            cache = st.session_state.graph_canvas_cache = (args, graph_visualizer.get_graph_data(
+                nodes, edges, center, k_hop=view_depth, analytics=analytics,
+                max_per_layer=graph_analytics.LAYER_NODE_CAP, edge_events=edge_events))
+        vis_nodes, vis_edges, options = cache[1]
         
+        # The browser keeps its network between runs; only the changes are sent, and
+        # nodes keep their positions when the center or depth changes
+        if 'graph_canvas_state' not in st.session_state:
+            st.session_state.graph_canvas_state = graph_canvas.CanvasState()
         try:
-            # Graph Component
-            current_selection = agraph(nodes=vis_nodes, edges=vis_edges, config=config)
-            
-            # Update selection state only if changed
-            if current_selection and current_selection != st.session_state.selected_node_id:
-                st.session_state.selected_node_id = current_selection
-                st.rerun()
+            # The inspector below reads the selection in the same run
+            clicked = graph_canvas.graph_canvas(vis_nodes, vis_edges, options, st.session_state.graph_canvas_state)
+            if clicked and clicked != st.session_state.selected_node_id:
+                st.session_state.selected_node_id = clicked
                 
         except Exception as e:
             st.warning(f"Graph visualizer refreshed. ({str(e)})")
             # Reset state on error to prevent loops
+            st.session_state.graph_canvas_state = graph_canvas.CanvasState()
             st.session_state.graph_center = None
-            st.rerun()
+            st.rerun(scope="app")
 
-    # 3. Node Inspector Panel
-    with col_info:
-        st.subheader("Inspector")
+    @st.fragment
+    @rerun_timer.timed("inspector.profile")
+    def inspector_profile(node_data, nodes, edges, center, view_analytics):
+        selected_id = node_data['id']
+        st.markdown(f"### {node_data.get('name', 'Unknown')}")
+        st.caption(f"ID: {node_data['id'][:8]}...")
+        
+        desc = node_data.get('description', 'No description available.')
+        st.info(desc)
+        
+        # Relation context
+        if center and center != selected_id:
+            # Find edge between center and selected
+            # Note: This checks direct connection only. For k-hop, logic might need bfs, 
+            # but for now let's show direct edge info if exists.
+            rel_text = "Indirect connection"
+            for e in edges:
+                if (e['source'] == center and e['target'] == selected_id) or \
+                   (e['target'] == center and e['source'] == selected_id):
+                    rel_text = e.get('relation_type', 'Connected')
+                    break
+            st.markdown(f"**Relation to Center:** {rel_text}")
+        
+        # Connection path ("how do I know X") and mutual neighbors, for the graph on
+        # screen: in time travel that is the snapshot's edges, not the cached engine's
+        analytics = view_analytics
+        if analytics is None:
+            analytics = graph_analytics.GraphAnalytics(data_manager.current().interner())
+            analytics.sync(edges)
+        viewer = center if center else 'root_me'
+        if viewer != selected_id:
+            names = {n['id']: n.get('name', 'Unknown') for n in nodes}
+            path = analytics.connection_path(selected_id, viewer)
+            if path:
+                st.markdown("**Connection Path:** " + " → ".join(names.get(p, '?') for p in path))
+            else:
+                st.caption(f"No connection path from {names.get(viewer, 'Me')}.")
+            mutual = analytics.mutual_neighbors(viewer, selected_id)
+            if mutual:
+                st.markdown(f"**Mutual Connections:** {', '.join(names.get(m, '?') for m in mutual)}")
         
-        selected_id = st.session_state.selected_node_id
-        if selected_id:
-            # Find node data
-            node_data = next((n for n in nodes if n['id'] == selected_id), None)
+        rank, ranked = analytics.centrality_rank(selected_id)
+        if ranked:
+            st.caption(f"Tie strength {analytics.weighted_degree(selected_id):.0f} · Centrality #{rank} of {ranked}")
+        
+        st.markdown("---")
+        
+        # --- Avatar Settings ---
+        with st.expander("🎨 Avatar Settings"):
+            current_style = node_data.get('avatar_type', 'image')
+            style_choice = st.radio("Avatar Style", ["Image", "Solid Color"], 
+                                    index=0 if current_style == 'image' else 1)
             
-            if node_data:
-                # Tabs for Profile and Timeline
-                tab_profile, tab_timeline = st.tabs(["ℹ️ Profile", "📅 Timeline"])
-                
-                with tab_profile:
-                    st.markdown(f"### {node_data.get('name', 'Unknown')}")
-                    st.caption(f"ID: {node_data['id'][:8]}...")
-                    
-                    desc = node_data.get('description', 'No description available.')
-                    st.info(desc)
-                    
-                    # Relation context
-                    if center and center != selected_id:
-                        # Find edge between center and selected
-                        # Note: This checks direct connection only. For k-hop, logic might need bfs, 
-                        # but for now let's show direct edge info if exists.
-                        rel_text = "Indirect connection"
-                        for e in edges:
-                            if (e['source'] == center and e['target'] == selected_id) or \
-                               (e['target'] == center and e['source'] == selected_id):
-                                rel_text = e.get('relation_type', 'Connected')
-                                break
-                        st.markdown(f"**Relation to Center:** {rel_text}")
-                    
-                    st.markdown("---")
-                    
-                    # --- Avatar Settings ---
-                    with st.expander("🎨 Avatar Settings"):
-                        current_style = node_data.get('avatar_type', 'image')
-                        style_choice = st.radio("Avatar Style", ["Image", "Solid Color"], 
-                                                index=0 if current_style == 'image' else 1)
-                        
-                        if style_choice == "Image":
-                            # Show current
-                            avatar_path = os.path.join("assets", "avatars", f"{selected_id}.png")
-                            if os.path.exists(avatar_path):
-                                st.image(avatar_path, width=100, caption="Current Avatar")
-                            else:
-                                st.info("No custom avatar set.")
-                                
-                            new_avatar = st.file_uploader("Upload New Avatar", type=['png', 'jpg'])
-                            if new_avatar:
-                                if st.button("Save Avatar"):
-                                    # Save file
-                                    with open(avatar_path, "wb") as f:
-                                        f.write(new_avatar.getbuffer())
-                                    
-                                    # Update Node
-                                    node_data['avatar_type'] = 'image'
-                                    data_manager.save_node(node_data)
-                                    st.success("Avatar updated!")
-                                    st.rerun()
-                                    
-                        elif style_choice == "Solid Color":
-                            current_color = node_data.get('avatar_value', '#A8DADC')
-                            new_color = st.color_picker("Choose Color", current_color)
-                            
-                            if st.button("Apply Color"):
-                                node_data['avatar_type'] = 'color'
-                                node_data['avatar_value'] = new_color
-                                data_manager.save_node(node_data)
-                                st.success("Color updated!")
-                                st.rerun()
-
-                    if st.button("📍 Set as New Center"):
-                        st.session_state.graph_center = selected_id
-                        st.session_state.selected_node_id = None # Clear selection or keep it? Let's clear to show focus.
-                        st.rerun()
-
-                    # --- Relationship Matrix Editor ---
-                    st.markdown("---")
-                    st.subheader("🔗 Edit Connections")
+            if style_choice == "Image":
+                # Show current
+                avatar_path = data_manager.avatar_path(selected_id)
+                if os.path.exists(avatar_path):
+                    st.image(media_server.src(avatar_path, width=100), width=100, caption="Current Avatar")
+                else:
+                    st.info("No custom avatar set.")
                     
-                    # Prepare data for editor
-                    other_nodes = [n for n in nodes if n['id'] != selected_id]
-                    
-                    # Helper to find existing relation
-                    def get_relation(n_id):
-                        key_sorted = tuple(sorted((selected_id, n_id)))
-                        for e in edges:
-                            if tuple(sorted((e['source'], e['target']))) == key_sorted:
-                                return e.get('relation_type', 'Connected')
-                        return "None"
-
-                    import pandas as pd
-                    
-                    table_data = []
-                    for n in other_nodes:
-                        table_data.append({
-                            "Target Node": n['name'],
-                            "Relationship": get_relation(n['id']),
-                            "Target ID": n['id'] # Hidden column for logic
-                        })
-                    
-                    if table_data:
-                        df = pd.DataFrame(table_data)
+                new_avatar = st.file_uploader("Upload New Avatar", type=['png', 'jpg'])
+                if new_avatar:
+                    if st.button("Save Avatar"):
+                        # Save file (and update the face match index)
+                        from utils import media_store
+                        media_store.save_avatar(selected_id, new_avatar.getbuffer())
                         
-                        edited_df = st.data_editor(
-                            df,
-                            column_config={
-                                "Target Node": st.column_config.TextColumn(disabled=True),
-                                "Relationship": st.column_config.TextColumn(required=True),
-                                "Target ID": None # Hide ID
-                            },
-                            hide_index=True,
-                            key=f"editor_{selected_id}"
-                        )
+                        # Update Node (node dicts are shared across sessions: copy, don't mutate)
+                        data_manager.save_node(dict(node_data, avatar_type='image'))
+                        st.success("Avatar updated!")
+                        st.rerun(scope="app")
                         
-                        if st.button("Update Relationships"):
-                            changes_made = False
-                            for index, row in edited_df.iterrows():
-                                target_id = row['Target ID']
-                                new_label = row['Relationship'].strip()
-                                old_label = get_relation(target_id)
-                                
-                                if new_label != old_label:
-                                    if new_label.lower() in ["none", ""]:
-                                        # Remove edge
-                                        if old_label != "None":
-                                            data_manager.remove_edge(selected_id, target_id)
-                                            changes_made = True
-                                    else:
-                                        # Add/Update edge
-                                        data_manager.add_edge(selected_id, target_id, new_label)
-                                        changes_made = True
-                            
-                            if changes_made:
-                                st.success("Graph updated!")
-                                st.rerun()
-                    else:
-                        st.caption("No other nodes to connect to.")
+            elif style_choice == "Solid Color":
+                current_color = node_data.get('avatar_value', '#A8DADC')
+                new_color = st.color_picker("Choose Color", current_color)
+                
+                if st.button("Apply Color"):
+                    data_manager.save_node(dict(node_data, avatar_type='color', avatar_value=new_color))
+                    st.success("Color updated!")
+                    st.rerun(scope="app")
+
+        if st.button("📍 Set as New Center"):
+            st.session_state.graph_center = selected_id
+            st.session_state.selected_node_id = None # Clear selection or keep it? Let's clear to show focus.
+            st.rerun(scope="app")
+
+        # --- Relationship Matrix Editor ---
+        st.markdown("---")
+        st.subheader("🔗 Edit Connections")
+        connection_editor(selected_id, nodes, edges)
+        
+        # --- Danger Zone ---
+        st.divider()
+        with st.expander("⚠️ Danger Zone"):
+            st.warning("Deleting this node is permanent. All connections will be removed.")
+            
+            confirm_del = st.checkbox(f"Confirm deletion of '{node_data.get('name')}'")
+            if st.button("🗑️ Delete Node", type="primary", disabled=not confirm_del):
+                data_manager.delete_node(selected_id)
+                st.success("Node deleted.")
+                st.session_state.selected_node_id = None
+                st.rerun(scope="app")
+
+    @st.fragment
+    @rerun_timer.timed("inspector.connections")
+    def connection_editor(selected_id, nodes, edges):
+        # Prepare data for editor
+        other_nodes = [n for n in nodes if n['id'] != selected_id]
+        
+        # Existing relations of the selected node, found in one pass over the edges
+        relations = {}
+        for e in edges:
+            if selected_id in (e['source'], e['target']):
+                other = e['target'] if e['source'] == selected_id else e['source']
+                relations.setdefault(other, e.get('relation_type', 'Connected'))
+        
+        def get_relation(n_id):
+            return relations.get(n_id, "None")
+
+        import pandas as pd
+        
+        table_data = []
+        for n in other_nodes:
+            table_data.append({
+                "Target Node": n['name'],
+                "Relationship": get_relation(n['id']),
+                "Target ID": n['id'] # Hidden column for logic
+            })
+        
+        if table_data:
+            df = pd.DataFrame(table_data)
+            
+            edited_df = st.data_editor(
+                df,
+                column_config={
+                    "Target Node": st.column_config.TextColumn(disabled=True),
+                    "Relationship": st.column_config.TextColumn(required=True),
+                    "Target ID": None # Hide ID
+                },
+                hide_index=True,
+                key=f"editor_{selected_id}"
+            )
+            
+            if st.button("Update Relationships"):
+                changes_made = False
+                for index, row in edited_df.iterrows():
+                    target_id = row['Target ID']
+                    new_label = row['Relationship'].strip()
+                    old_label = get_relation(target_id)
                     
-                    # --- Danger Zone ---
-                    st.divider()
-                    with st.expander("⚠️ Danger Zone"):
-                        st.warning("Deleting this node is permanent. All connections will be removed.")
-                        
-                        confirm_del = st.checkbox(f"Confirm deletion of '{node_data.get('name')}'")
-                        if st.button("🗑️ Delete Node", type="primary", disabled=not confirm_del):
-                            data_manager.delete_node(selected_id)
-                            st.success("Node deleted.")
-                            st.session_state.selected_node_id = None
-                            st.rerun()
+                    if new_label != old_label:
+                        if new_label.lower() in ["none", ""]:
+                            # Remove edge
+                            if old_label != "None":
+                                data_manager.remove_edge(selected_id, target_id)
+                                changes_made = True
+                        else:
+                            # Add/Update edge
+                            data_manager.add_edge(selected_id, target_id, new_label)
+                            changes_made = True
+                
+                if changes_made:
+                    st.success("Graph updated!")
+                    st.rerun(scope="app")
+            
+            # Suggested connections from mutual contacts and shared memories (the
+            # engine follows the live stores, not a Time Travel snapshot)
+            from utils import link_prediction
+            engine = link_prediction.get_engine(data_manager.get_edges(), data_manager.iter_events,
+                                                data_manager.get_edges_version(), data_manager.get_events_version(),
+                                                tenant=data_manager.current())
+            names = {n['id']: n.get('name', 'Unknown') for n in other_nodes}
+            suggestions = [s for s in engine.suggest(selected_id, 10) if s['id'] in names]
+            if suggestions:
+                with st.expander(f"✨ Suggested Connections ({len(suggestions)})"):
+                    suggested_df = pd.DataFrame([{
+                        "Accept": False,
+                        "Target Node": names[s['id']],
+                        "Relationship": relations.get(s['id']) or "Connected",
+                        "Why": f"{s['common']} mutual · {s['shared']} shared memories",
+                        "Target ID": s['id']
+                    } for s in suggestions])
+                    picked_df = st.data_editor(
+                        suggested_df,
+                        column_config={
+                            "Accept": st.column_config.CheckboxColumn(),
+                            "Target Node": st.column_config.TextColumn(disabled=True),
+                            "Relationship": st.column_config.TextColumn(required=True),
+                            "Why": st.column_config.TextColumn(disabled=True),
+                            "Target ID": None
+                        },
+                        hide_index=True,
+                        key=f"suggestions_{selected_id}"
+                    )
+                    if st.button("Accept Selected"):
+                        links = [(selected_id, row['Target ID'], row['Relationship'].strip() or "Connected")
+                                 for _, row in picked_df.iterrows() if row['Accept']]
+                        if links:
+                            data_manager.add_edges(links) # one save for all of them
+                            st.success(f"Added {len(links)} connections!")
+                            st.rerun(scope="app")
+        else:
+            st.caption("No other nodes to connect to.")
+
+    @st.fragment
+    @rerun_timer.timed("inspector.timeline")
+    def inspector_timeline(node_data, center):
+        selected_id = node_data['id']
+        st.subheader(f"History with {node_data.get('name', 'Unknown')}")
+        events = data_manager.get_events_for_node(selected_id)
+        
+        if not events:
+            st.caption("No shared memories recorded yet.")
+        
+        for evt in events:
+            with st.container(border=True):
+                col_date, col_badges = st.columns([1, 2])
+                with col_date:
+                    st.caption(evt.get('date', 'Unknown Date'))
+                with col_badges:
+                    # Check for Shared Memory (if current center is involved)
+                    # Default center is 'root_me' if None? Or st.session_state.graph_center
+                    current_viewer = center if center else 'root_me'
+                    if current_viewer in evt.get('related_nodes', []):
+                        st.markdown("⭐ **Shared Memory**")
+                
+                st.markdown(f"**{evt.get('title', 'Memory')}**")
+                st.write(evt.get('content', ''))
+                
+                if evt.get('images'):
+                    for img_path in evt['images']:
+                        if os.path.exists(img_path):
+                            st.image(media_server.src(img_path, width=480), use_container_width=True)
+
+    @st.fragment
+    @rerun_timer.timed("relationship.view")
+    def relationship_view(nodes, edges, center, view_depth, view_analytics):
+        col_main, col_info = st.columns([3, 1])
+        
+        with col_main:
+            draw_graph(nodes, edges, center, view_depth, view_analytics)
+
+        # 3. Node Inspector Panel
+        with col_info:
+            st.subheader("Inspector")
+            
+            selected_id = st.session_state.selected_node_id
+            if selected_id:
+                # Find node data
+                node_data = next((n for n in nodes if n['id'] == selected_id), None)
                 
-                with tab_timeline:
-                    st.subheader(f"History with {node_data.get('name', 'Unknown')}")
-                    events = data_manager.get_events_for_node(selected_id)
+                if node_data:
+                    # Tabs for Profile and Timeline
+                    tab_profile, tab_timeline = st.tabs(["ℹ️ Profile", "📅 Timeline"])
                     
-                    if not events:
-                        st.caption("No shared memories recorded yet.")
+                    with tab_profile:
+                        inspector_profile(node_data, nodes, edges, center, view_analytics)
                     
-                    for evt in events:
-                        with st.container(border=True):
-                            col_date, col_badges = st.columns([1, 2])
-                            with col_date:
-                                st.caption(evt.get('date', 'Unknown Date'))
-                            with col_badges:
-                                # Check for Shared Memory (if current center is involved)
-                                # Default center is 'root_me' if None? Or st.session_state.graph_center
-                                current_viewer = center if center else 'root_me'
-                                if current_viewer in evt.get('related_nodes', []):
-                                    st.markdown("⭐ **Shared Memory**")
-                            
-                            st.markdown(f"**{evt.get('title', 'Memory')}**")
-                            st.write(evt.get('content', ''))
-                            
-                            if evt.get('images'):
-                                for img_path in evt['images']:
-                                    if os.path.exists(img_path):
-                                        st.image(img_path, use_container_width=True)
-                
+                    with tab_timeline:
+                        inspector_timeline(node_data, center)
+                    
+                else:
+                    st.write("Node not found in current data.")
             else:
-                st.write("Node not found in current data.")
-        else:
-            st.markdown("*Select a node to view details.*")
-            if center:
-                st.markdown(f"Current Center: **{next((n['name'] for n in nodes if n['id'] == center), center)}**")
+                st.markdown("*Select a node to view details.*")
+                if center:
+                    st.markdown(f"Current Center: **{next((n['name'] for n in nodes if n['id'] == center), center)}**")
+
+    relationship_view(nodes, edges, center, view_depth, view_analytics)
+
+    if playing:
+        time.sleep(0.8)
+        st.rerun()
 
 # --- View: Time Capsule ---
 elif mode == "Time Capsule":
+    from utils import image_processor
+    from utils import job_queue
+    from utils import media_store
+    from utils import photo_index
+
     st.title("Time Capsule")
+    analysis_queue = job_queue.get_queue()
+    job_owner = data_manager.current_tenant_id() # jobs are only shown to the tenant that submitted them
+    
+    # Re-attach to a job after a browser refresh (the job id lives in the URL)
+    if 'analysis_job' not in st.session_state and st.query_params.get("job"):
+        # The id in a shared link is not enough: the job must be this tenant's
+        restored = analysis_queue.get(st.query_params["job"], owner=job_owner)
+        if restored:
+            st.session_state.analysis_job = restored['id']
+            st.session_state.analysis_jobs = [restored['id']]
+            st.session_state.form_data = restored['params']['form_data']
+            st.session_state.current_image_path = restored['params'].get('image_path')
+            st.session_state.step = 'review'
+    
+    def open_job(job):
+        st.session_state.analysis_job = job['id']
+        st.session_state.form_data = job['params']['form_data']
+        st.session_state.current_image_path = job['params'].get('image_path')
+        st.session_state.detected_people = []
+        st.session_state.step = 'review'
+        st.query_params["job"] = job['id']
+    
+    def close_job(forget=False):
+        job_id = st.session_state.pop('analysis_job', None)
+        if job_id and forget:
+            # Crops that were not promoted to avatars are no longer needed
+            media_store.discard_crops(p.get('face_path') for p in st.session_state.detected_people)
+            analysis_queue.forget(job_id)
+            st.session_state.analysis_jobs = [j for j in st.session_state.get('analysis_jobs', []) if j != job_id]
+        st.query_params.pop("job", None)
+        st.session_state.step = 'input'
+        st.session_state.detected_people = []
+        st.session_state.pop('identity_matches_key', None)
+        st.session_state.current_image_path = None
+    
+    def submit_analysis(form_data, uploaded_file):
+        # Analysis runs in the background; the review page polls the job
+        # A. Image Processing path
+        if uploaded_file:
+            # Save file
+            assets_dir = data_manager.current().assets_dir
+            if not os.path.exists(assets_dir): os.makedirs(assets_dir)
+            
+            file_ext = uploaded_file.name.split('.')[-1]
+            filename = f"{uuid.uuid4()}.{file_ext}"
+            filepath = os.path.join(assets_dir, filename)
+            
+            with open(filepath, "wb") as f:
+                f.write(uploaded_file.getbuffer())
+            
+            job_id = analysis_queue.submit("image", {"image_path": filepath, "context_clues": form_data['context_clues'],
+                                                     "form_data": form_data}, owner=job_owner)
+        
+        # B. Text Processing path
+        else:
+            job_id = analysis_queue.submit("text", {"text": form_data['content'], "form_data": form_data}, owner=job_owner)
+        
+        st.session_state.setdefault('analysis_jobs', []).append(job_id)
+        open_job(analysis_queue.get(job_id))
+        st.rerun()
     
     if st.session_state.step == 'input':
         with st.form("memory_form"):
@@ -318,68 +609,129 @@ elif mode == "Time Capsule":
                     st.stop()
                 
                 # Store Form Data
-                st.session_state.form_data = {
+                form_data = {
                     "date": str(date),
                     "title": event_title,
                     "content": text,
                     "context_clues": context_clues
                 }
                 
-                results = []
-                
-                # A. Image Processing path
+                # Same photo (or a burst shot of it) already in the library? Ask before analyzing.
                 if uploaded_file:
-                    # Save file
-                    assets_dir = os.path.join("assets")
-                    if not os.path.exists(assets_dir): os.makedirs(assets_dir)
-                    
-                    file_ext = uploaded_file.name.split('.')[-1]
-                    filename = f"{uuid.uuid4()}.{file_ext}"
-                    filepath = os.path.join(assets_dir, filename)
-                    
-                    with open(filepath, "wb") as f:
-                        f.write(uploaded_file.getbuffer())
-                    
-                    st.session_state.current_image_path = filepath
-                    
-                    with st.spinner("AI is seeing..."):
-                        results = image_processor.analyze_image_with_qwen(filepath, context_clues)
+                    duplicates = photo_index.find_near_duplicates(uploaded_file.getvalue())
+                    if duplicates:
+                        st.session_state.pending_duplicate = {"form_data": form_data, "matches": duplicates[:3]}
+                        st.rerun()
                 
-                # B. Text Processing path
-                elif text and not uploaded_file:
-                    with st.spinner("AI is reading..."):
-                        results = image_processor.analyze_text_diary(text)
-                        # Results structure: [{'name': 'Old Wang', 'relation': 'Neighbor', 'description': '...'}]
-                        # Convert to common format for Review
-                        normalized = []
-                        for r in results:
-                            normalized.append({
-                                "description": r.get("description", "Mentioned in text"),
-                                "suggested_name": r.get("name"),
-                                "relation_type": r.get("relation")
-                            })
-                        results = normalized
-
-                st.session_state.detected_people = results
-                st.session_state.step = 'review'
-                st.rerun()
+                submit_analysis(form_data, uploaded_file)
+        
+        pending = st.session_state.get('pending_duplicate')
+        if pending and uploaded_file is None:
+            st.session_state.pop('pending_duplicate')
+        elif pending:
+            _, match = pending['matches'][0]
+            earlier = next((e for e in (data_manager.get_event(i) for i in match.get('event_ids', [])) if e), None)
+            st.warning("This photo looks like one you already saved" +
+                       (f": **{earlier.get('title', 'Untitled')}** ({earlier.get('date', '')})." if earlier else "."))
+            col_img, col_actions = st.columns([1, 2])
+            if os.path.exists(match['path']):
+                col_img.image(media_server.src(match['path'], width=480), use_container_width=True)
+            with col_actions:
+                form_data = pending['form_data']
+                if earlier and st.button("📎 Add to that memory"):
+                    # No new file, no analysis: append the new journal text to the earlier event
+                    if form_data['content']:
+                        merged = "\n\n".join(t for t in [earlier.get('content', ''), form_data['content']] if t)
+                        data_manager.update_event(earlier['id'], {"content": merged, "journal_text": merged})
+                    st.session_state.pop('pending_duplicate')
+                    st.success("Added to the earlier memory.")
+                if earlier and st.button("♻️ New memory with the same photo and people"):
+                    # Reuses the earlier analysis (its people) and the stored image
+                    data_manager.save_event({
+                        "id": str(uuid.uuid4()),
+                        "title": form_data['title'] or f"{form_data['date']} Memory",
+                        "date": form_data['date'],
+                        "content": form_data['content'],
+                        "journal_text": form_data['content'],
+                        "images": [match['path']],
+                        "related_nodes": list(earlier.get('related_nodes', []))
+                    })
+                    st.session_state.pop('pending_duplicate')
+                    st.success("Memory Crystallized.")
+                if st.button("🔁 Analyze anyway"):
+                    st.session_state.pop('pending_duplicate')
+                    submit_analysis(form_data, uploaded_file)
+        
+        # Analyses submitted from this session (several can run at once)
+        my_jobs = [j for j in (analysis_queue.get(i, owner=job_owner) for i in st.session_state.get('analysis_jobs', [])) if j]
+        if my_jobs:
+            st.markdown("#### ⏳ Analyses")
+            for job in my_jobs:
+                col_label, col_status, col_open = st.columns([3, 1, 1])
+                form = job['params']['form_data']
+                col_label.write(f"{form['date']} · {form.get('title') or ('Photo' if job['kind'] == 'image' else 'Journal')}")
+                col_status.caption(job['status'])
+                if job['status'] not in job_queue.PENDING and col_open.button("Review", key=f"open_{job['id']}"):
+                    open_job(job)
+                    st.rerun()
 
     elif st.session_state.step == 'review':
         st.subheader("Memory Review & Tagging")
         
+        job = analysis_queue.get(st.session_state.get('analysis_job', ''), owner=job_owner)
+        if job is None and not st.session_state.detected_people:
+            close_job()
+            st.rerun()
+        
         # Display context
         if st.session_state.current_image_path:
-            st.image(st.session_state.current_image_path, caption="Visual Memory", use_container_width=True)
+            st.image(media_server.src(st.session_state.current_image_path, width=960), caption="Visual Memory", use_container_width=True)
         elif st.session_state.form_data.get("content"):
             st.info(f"**Text Memory**: \"{st.session_state.form_data['content']}\"")
             
-        people_data = st.session_state.detected_people
+        if job and job['status'] in job_queue.PENDING:
+            ahead = analysis_queue.position(job['id'])
+            st.info("AI is seeing..." if job['kind'] == 'image' else "AI is reading...")
+            if ahead:
+                st.caption(f"{ahead} analysis job(s) ahead in the queue.")
+            if st.button("⬅ Add another memory"):
+                close_job()
+                st.rerun()
+            
+            @st.fragment(run_every=1)
+            def _poll_job():
+                status = analysis_queue.get(job['id'])
+                if status is None or status['status'] not in job_queue.PENDING:
+                    st.rerun(scope="app")
+                # People stream in one by one while the model is still answering
+                found = [p for p in (status['result'] or []) if "error" not in p]
+                if found:
+                    st.caption(f"Found so far: {len(found)}")
+                    cols = st.columns(4)
+                    for i, person in enumerate(found):
+                        with cols[i % 4]:
+                            if person.get('face_path') and os.path.exists(person['face_path']):
+                                st.image(media_server.src(person['face_path'], width=100), width=100)
+                            st.write(person.get('suggested_name') or person.get('description', ''))
+            _poll_job()
+            st.stop()
+        
+        if job and not st.session_state.detected_people:
+            if job['status'] == 'failed':
+                st.session_state.detected_people = [{"error": f"Analysis failed: {job['error']}"}]
+            else:
+                st.session_state.detected_people = job['result'] or []
         
-        # Check for errors
-        if people_data and isinstance(people_data[0], dict) and "error" in people_data[0]:
-            st.error(people_data[0]["error"])
+        # An error can arrive after people already streamed in (the answer broke
+        # off): show it, and review only the people
+        errors = [p["error"] for p in st.session_state.detected_people if "error" in p]
+        people_data = [p for p in st.session_state.detected_people if "error" not in p]
+        for message in errors:
+            st.error(message)
+        
+        if errors and not people_data:
             if st.button("Back"):
-                st.session_state.step = 'input'
+                close_job(forget=True)
                 st.rerun()
         else:
             if not people_data:
@@ -389,6 +741,14 @@ elif mode == "Time Capsule":
             known_nodes = data_manager.get_nodes()
             node_options = {n['name']: n['id'] for n in known_nodes}
             
+            # Smart Recall: one matching call for everyone without a name, kept until the job closes
+            matches_key = (st.session_state.get('analysis_job'), len(people_data))
+            if st.session_state.get('identity_matches_key') != matches_key:
+                to_match = [i for i, p in enumerate(people_data) if not p.get("suggested_name")]
+                found = image_processor.match_entities([people_data[i] for i in to_match], known_nodes)
+                st.session_state.identity_matches = dict(zip(to_match, found))
+                st.session_state.identity_matches_key = matches_key
+            
             with st.form("review_form"):
                 for i, person in enumerate(people_data):
                     desc = person.get("description", "Unknown")
@@ -397,14 +757,15 @@ elif mode == "Time Capsule":
                     
                     st.markdown(f"---")
                     st.markdown(f"### Entity #{i+1}")
+                    if person.get('face_path') and os.path.exists(person['face_path']):
+                        st.image(media_server.src(person['face_path'], width=100), width=100)
                     st.caption(f"Trace: {desc}")
                     
                     # Smart Recall Logic
                     smart_suggestion = None
-                    if not suggested_name_from_text: # If it's image based, try to match
-                        match_result = image_processor.find_best_match(desc, known_nodes)
-                        if match_result.get("match_found"):
-                            smart_suggestion = match_result
+                    match_result = st.session_state.identity_matches.get(i, {})
+                    if match_result.get("match_found"):
+                        smart_suggestion = match_result
                     
                     # Determine Default State
                     default_choice_idx = 0 # New Person
@@ -418,7 +779,10 @@ elif mode == "Time Capsule":
                              default_choice_idx = 1 # Select Existing
                     
                     elif smart_suggestion:
-                        match_msg = f"AI thinks this is: **{smart_suggestion['suggested_name']}**"
+                        if smart_suggestion.get('source') == 'face':
+                            match_msg = f"Face matches: **{smart_suggestion['suggested_name']}**"
+                        else:
+                            match_msg = f"AI thinks this is: **{smart_suggestion['suggested_name']}**"
                         default_choice_idx = 1 # Select Existing
                         
                     if match_msg:
@@ -527,15 +891,11 @@ elif mode == "Time Capsule":
                             if d['new_name']:
                                 new_id = str(uuid.uuid4())
                                 
-                                # Auto-save avatar if available
-                                detected_person = st.session_state.detected_people[d['index']]
-                                if 'cropped_face' in detected_person:
+                                # Auto-save avatar if available (moves the temporary crop)
+                                detected_person = people_data[d['index']]
+                                if detected_person.get('face_path'):
                                     try:
-                                        avatar_dir = os.path.join("assets", "avatars")
-                                        if not os.path.exists(avatar_dir): os.makedirs(avatar_dir)
-                                        
-                                        avatar_path = os.path.join(avatar_dir, f"{new_id}.png")
-                                        detected_person['cropped_face'].save(avatar_path, format="PNG")
+                                        media_store.promote_crop(detected_person['face_path'], new_id)
                                     except Exception as e:
                                         print(f"Failed to save avatar: {e}")
 
@@ -603,119 +963,172 @@ elif mode == "Time Capsule":
                     data_manager.save_event(new_event)
                     
                     st.success("Memory Crystallized.")
-                    st.session_state.step = 'input'
-                    st.session_state.detected_people = []
-                    st.session_state.current_image_path = None
+                    close_job(forget=True)
                     st.rerun()
 
 # --- View: Memory Gallery ---
 elif mode == "Memory Gallery":
+    from utils import gallery_cards
     st.title("Memory Gallery")
     st.markdown("Review and curate your collected moments.")
     
-    events = data_manager.get_all_events()
+    @st.fragment
+    @rerun_timer.timed("gallery.card")
+    def gallery_card(card):
+        # Toggling "Edit" reruns this card only; reading needs nothing but the card
+        with st.container(border=True):
+            col_view, col_edit = st.columns([5, 1])
+            
+            with col_edit:
+                is_editing = st.checkbox("Edit", key=f"edit_toggle_{card['id']}")
+            
+            with col_view:
+                if not is_editing:
+                    # READ MODE
+                    st.subheader(card['title'])
+                    st.caption(f"📅 {card['date'] or 'Unknown Date'}")
+                    if card['participants']:
+                        st.caption("👥 " + ", ".join(card['participants']))
+                    
+                    text = st.empty()
+                    if card['truncated'] and st.toggle("Read more", key=f"more_{card['id']}"):
+                        # The full journal, from the event's cached shard
+                        evt = data_manager.get_event(card['id'])
+                        text.write(evt.get('content', '') if evt else card['snippet'])
+                    else:
+                        text.write(card['snippet'])
+                    
+                    if card['images']:
+                        # Display thumbnails
+                        cols = st.columns(len(card['images']))
+                        for idx, src in enumerate(card['images']):
+                            with cols[idx]:
+                                st.image(src, use_container_width=True)
+                else:
+                    # EDIT MODE (the full event, re-read from its cached shard)
+                    evt = data_manager.get_event(card['id'])
+                    if evt is None:
+                        st.rerun(scope="app") # deleted meanwhile
+                    st.markdown(f"**Editing: {evt.get('title', 'Untitled')}**")
+                    
+                    with st.form(key=f"edit_form_{evt['id']}"):
+                        new_title = st.text_input("Title", value=evt.get('title', ''))
+                        new_date = st.date_input("Date", 
+                            datetime.datetime.strptime(evt.get('date'), '%Y-%m-%d').date() if evt.get('date') else datetime.date.today()
+                        )
+                        new_content = st.text_area("Journal", value=evt.get('content', ''))
+                        
+                        # Image replacement (optional implementation, for now let's just keep logic simple)
+                        # st.file_uploader... handling image replacement is complex (delete old? keep both?). 
+                        # Let's skip file upload in edit for MVP Phase 13 unless strictly required. 
+                        # Prompt says: "st.file_uploader('Replace Image')".
+                        new_image = st.file_uploader("Replace Image", type=['jpg', 'png'], key=f"up_{evt['id']}")
+                        
+                        col_save, col_del = st.columns(2)
+                        with col_save:
+                            save_btn = st.form_submit_button("💾 Save Changes")
+                        with col_del:
+                            del_btn = st.form_submit_button("🗑️ Delete Event", type="primary")
+                        
+                        if save_btn:
+                            updates = {
+                                "title": new_title,
+                                "date": str(new_date),
+                                "content": new_content,
+                                "journal_text": new_content # Sync alias
+                            }
+                            
+                            if new_image:
+                                # Save new image
+                                assets_dir = data_manager.current().assets_dir
+                                if not os.path.exists(assets_dir): os.makedirs(assets_dir)
+                                file_ext = new_image.name.split('.')[-1]
+                                filename = f"{uuid.uuid4()}.{file_ext}"
+                                filepath = os.path.join(assets_dir, filename)
+                                with open(filepath, "wb") as f:
+                                    f.write(new_image.getbuffer())
+                                
+                                updates["images"] = [filepath] # Replace strategy
+                                
+                            data_manager.update_event(evt['id'], updates)
+                            st.success("Updated!")
+                            st.rerun(scope="app") # the date may move the card
+                            
+                        if del_btn:
+                            data_manager.delete_event(evt['id'])
+                            st.warning("Deleted!")
+                            st.rerun(scope="app")
+
+    # Newest first, from the tenant's materialized cards (only shards a page reaches are built)
+    tenant = data_manager.current()
+    gallery = gallery_cards.get_gallery(tenant.events, data_manager.get_nodes, data_manager.get_events_version(),
+                                        data_manager.get_nodes_version(), tenant=tenant)
+    cards = gallery.page(0, st.session_state.gallery_limit)
     
     # View Toggle
     view_mode = st.radio("View Mode", ["List", "Grid"], horizontal=True, label_visibility="collapsed")
     
-    if not events:
+    if not cards:
         st.info("No memories found. Go to 'Time Capsule' to add some!")
     else:
         if view_mode == "Grid":
             # GRID VIEW
             cols = st.columns(3)
-            for index, evt in enumerate(events):
+            for index, card in enumerate(cards):
                 with cols[index % 3]:
                     with st.container(border=True):
                         # Show Image (First one if available)
-                        if evt.get('images'):
-                            img_path = evt['images'][0]
-                            if os.path.exists(img_path):
-                                st.image(img_path, use_container_width=True)
+                        if card['thumbnail']:
+                            st.image(card['thumbnail'], use_container_width=True)
                         else:
                             # Placeholder or just skip
                             st.caption("No Image")
 
-                        st.subheader(evt.get('title', 'Untitled'))
-                        st.caption(f"📅 {evt.get('date', 'Unknown Date')}")
+                        st.subheader(card['title'])
+                        st.caption(f"📅 {card['date'] or 'Unknown Date'}")
+                        if card['participants']:
+                            st.caption("👥 " + ", ".join(card['participants']))
                         
         else:
             # LIST VIEW
-            for evt in events:
-                # Create a card for each event
-                with st.container(border=True):
-                    col_view, col_edit = st.columns([5, 1])
-                    
-                    with col_edit:
-                        is_editing = st.checkbox("Edit", key=f"edit_toggle_{evt['id']}")
-                    
-                    with col_view:
-                        if not is_editing:
-                            # READ MODE
-                            st.subheader(f"{evt.get('title', 'Untitled Memory')}")
-                            st.caption(f"📅 {evt.get('date', 'Unknown Date')}")
-                            
-                            # Show participants names roughly?
-                            # This would require fetching node names. For speed, maybe just IDs or skip.
-                            # Skipping for clean gallery view.
-                            
-                            st.write(evt.get('content', ''))
-                            
-                            if evt.get('images'):
-                                # Display thumbnails
-                                cols = st.columns(len(evt['images']))
-                                for idx, img_path in enumerate(evt['images']):
-                                    if os.path.exists(img_path):
-                                        with cols[idx]:
-                                            st.image(img_path, use_container_width=True)
-                        else:
-                            # EDIT MODE
-                            st.markdown(f"**Editing: {evt.get('title', 'Untitled')}**")
-                            
-                            with st.form(key=f"edit_form_{evt['id']}"):
-                                new_title = st.text_input("Title", value=evt.get('title', ''))
-                                new_date = st.date_input("Date", 
-                                    datetime.datetime.strptime(evt.get('date'), '%Y-%m-%d').date() if evt.get('date') else datetime.date.today()
-                                )
-                                new_content = st.text_area("Journal", value=evt.get('content', ''))
-                                
-                                # Image replacement (optional implementation, for now let's just keep logic simple)
-                                # st.file_uploader... handling image replacement is complex (delete old? keep both?). 
-                                # Let's skip file upload in edit for MVP Phase 13 unless strictly required. 
-                                # Prompt says: "st.file_uploader('Replace Image')".
-                                new_image = st.file_uploader("Replace Image", type=['jpg', 'png'], key=f"up_{evt['id']}")
-                                
-                                col_save, col_del = st.columns(2)
-                                with col_save:
-                                    save_btn = st.form_submit_button("💾 Save Changes")
-                                with col_del:
-                                    del_btn = st.form_submit_button("🗑️ Delete Event", type="primary")
-                                
-                                if save_btn:
-                                    updates = {
-                                        "title": new_title,
-                                        "date": str(new_date),
-                                        "content": new_content,
-                                        "journal_text": new_content # Sync alias
-                                    }
-                                    
-                                    if new_image:
-                                        # Save new image
-                                        assets_dir = os.path.join("assets")
-                                        if not os.path.exists(assets_dir): os.makedirs(assets_dir)
-                                        file_ext = new_image.name.split('.')[-1]
-                                        filename = f"{uuid.uuid4()}.{file_ext}"
-                                        filepath = os.path.join(assets_dir, filename)
-                                        with open(filepath, "wb") as f:
-                                            f.write(new_image.getbuffer())
-                                        
-                                        updates["images"] = [filepath] # Replace strategy
-                                        
-                                    data_manager.update_event(evt['id'], updates)
-                                    st.success("Updated!")
-                                    st.rerun()
-                                    
-                                if del_btn:
-                                    data_manager.delete_event(evt['id'])
-                                    st.warning("Deleted!")
-                                    st.rerun()
+            for card in cards:
+                gallery_card(card)
+                
+        # Pagination
+        total_events = gallery.count()
+        if total_events > len(cards):
+            st.caption(f"Showing {len(cards)} of {total_events} memories")
+            if st.button("Load more"):
+                st.session_state.gallery_limit += GALLERY_PAGE_SIZE
+                st.rerun()
+        
+        # Library-wide near-duplicate scan
+        @st.fragment
+        def duplicate_scan():
+            with st.expander("🔍 Find duplicate photos"):
+                if st.button("Scan library"):
+                    from utils import photo_index
+                    st.session_state.duplicate_groups = photo_index.find_duplicate_groups()
+                groups = st.session_state.get('duplicate_groups')
+                if groups is not None:
+                    if not groups:
+                        st.info("No near-duplicate photos found.")
+                    for g, group in enumerate(groups):
+                        st.markdown(f"**Group {g + 1}** · {len(group)} photos")
+                        cols = st.columns(min(len(group), 4))
+                        for i, entry in enumerate(group):
+                            with cols[i % len(cols)]:
+                                if os.path.exists(entry['path']):
+                                    st.image(media_server.src(entry['path'], width=480), use_container_width=True)
+                                for event_id in entry.get('event_ids', []):
+                                    evt = data_manager.get_event(event_id)
+                                    if evt:
+                                        st.caption(f"{evt.get('title', 'Untitled')} · {evt.get('date', '')}")
+        
+        duplicate_scan()
+
+# --- Rerun timings ---
+if rerun_timer.ENABLED:
+    rerun_timer.record(f"app:{mode}", (time.perf_counter() - _run_started) * 1000)
+    with st.sidebar.expander("⏱ Rerun timings"):
+        st.dataframe(rerun_timer.summary(), hide_index=True)
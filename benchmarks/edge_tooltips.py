@@ -0,0 +1,72 @@
+"""
+Edge hover summaries (latest shared memory per tie, utils.edge_events) on a
+synthetic memory store: index sync cost on add/edit/delete next to the edge
+rebuild it runs beside, and the per-render cost of titling every edge against
+scanning the events for each one.
+
+    python benchmarks/edge_tooltips.py [--people 5000] [--events 50000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.edge_events import EdgeEventIndex
+from utils.graph_model import EdgeTable, Event, rebuild_edges
+
+NAIVE_SAMPLE = 200 # edges titled by scanning; the total is extrapolated
+
+def synthetic_events(n_people, n_events, seed=7):
+    rng = random.Random(seed)
+    people = [f"person-{i:06d}" for i in range(n_people)]
+    circles = [rng.sample(people, 10) for _ in range(n_people // 6)]
+    return [{"id": f"event-{i}", "title": f"Memory {i}", "content": "", "images": [],
+             "date": f"{rng.randint(2015, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+             "related_nodes": ["root_me"] + rng.sample(rng.choice(circles), rng.randint(1, 4))}
+            for i in range(n_events)]
+
+def timed(label, fn):
+    t0 = time.perf_counter()
+    result = fn()
+    print(f"{label:<40}{(time.perf_counter() - t0) * 1000:>10.2f} ms")
+    return result
+
+def naive_latest(events, a, b):
+    # What a render would do without the index: scan every memory for the pair
+    shared = [e for e in events if a in e["related_nodes"] and b in e["related_nodes"]]
+    return max(shared, key=lambda e: e["date"]) if shared else None
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--people", type=int, default=5_000)
+    parser.add_argument("--events", type=int, default=50_000)
+    args = parser.parse_args()
+
+    events = synthetic_events(args.people, args.events)
+    typed = [Event.from_dict(e) for e in events]
+    edges = timed("edge rebuild (weights)", lambda: rebuild_edges(typed, EdgeTable.from_dicts([])).to_dicts())
+    print(f"{args.people} people, {len(events)} memories, {len(edges)} edges")
+    index = EdgeEventIndex()
+    timed("index sync (initial)", lambda: index.sync(lambda: typed, 1))
+    timed("index sync, unchanged version", lambda: index.sync(lambda: typed, 1))
+
+    typed.append(Event.from_dict(dict(events[0], id="event-new", date="2026-01-01")))
+    timed("index sync after one new memory", lambda: index.sync(lambda: typed, 2))
+    typed[-1] = Event.from_dict(dict(events[0], id="event-new", date="2014-01-01"))
+    timed("index sync after editing its date", lambda: index.sync(lambda: typed, 3))
+    typed.pop()
+    timed("index sync after deleting it", lambda: index.sync(lambda: typed, 4))
+
+    pairs = [(e["source"], e["target"]) for e in edges]
+    timed(f"latest memory for all {len(pairs)} edges", lambda: [index.latest(a, b) for a, b in pairs])
+    t0 = time.perf_counter()
+    for a, b in pairs[:NAIVE_SAMPLE]:
+        naive_latest(events, a, b)
+    per_edge = (time.perf_counter() - t0) / NAIVE_SAMPLE
+    print(f"{'event scan per edge (extrapolated)':<40}{per_edge * len(pairs) * 1000:>10.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Memory Gallery pages from the materialized card read model (utils.gallery_cards)
+against assembling them from events on every render, on a synthetic library:
+cold and warm page cost, deep pages, and what an event edit and a node rename
+cost the next page.
+
+The per-render baseline reads the first page of events newest first, resolves
+participant names from the node list and checks every image path, which is
+what the gallery did before (without names in the List view).
+
+    python benchmarks/gallery_cards.py [--people 2000] [--events 50000]
+"""
+import argparse
+import itertools
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PAGE = 24 # the app's GALLERY_PAGE_SIZE
+
+def seed(data_manager, people, events, rng):
+    nodes = [data_manager._root_node()]
+    nodes += [{"id": f"p{i}", "name": f"Person {i}", "type": "person"} for i in range(people)]
+    # Written as the legacy single file, which the shard store imports in one commit
+    os.makedirs(data_manager.DATA_DIR, exist_ok=True)
+    data_manager.save_records(data_manager.EVENTS_FILE, [{
+        "id": f"e{i}", "title": f"Memory {i}", "date": f"20{10 + i % 14}-{1 + i % 12:02d}-{1 + i % 28:02d}",
+        "content": "A long day out by the sea. " * rng.randint(1, 40),
+        "images": [f"assets/photo-{i}-{k}.jpg" for k in range(rng.randint(0, 3))],
+        "related_nodes": ["root_me"] + rng.sample([n["id"] for n in nodes[1:]], rng.randint(1, 4))}
+        for i in range(events)])
+    data_manager._save("nodes", nodes)
+    data_manager.count_events() # the import, kept out of the timings
+
+def render_from_events(data_manager, limit):
+    names = {n["id"]: n["name"] for n in data_manager.get_nodes()}
+    page = []
+    for e in itertools.islice(data_manager.iter_all_events(), limit):
+        page.append((e["title"], [names.get(p) for p in e["related_nodes"]],
+                     [p for p in e["images"] if os.path.exists(p)], e["content"][:280]))
+    return page
+
+def render_from_cards(data_manager, gallery_cards, offset, limit):
+    tenant = data_manager.current()
+    gallery = gallery_cards.get_gallery(tenant.events, data_manager.get_nodes, data_manager.get_events_version(),
+                                        data_manager.get_nodes_version(), tenant=tenant)
+    return gallery.page(offset, limit)
+
+def timed(label, fn, runs=1):
+    t0 = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    print(f"{label:<40}{(time.perf_counter() - t0) * 1000 / runs:>10.3f} ms")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--people", type=int, default=2_000)
+    parser.add_argument("--events", type=int, default=50_000)
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix="deepmemory-bench-")
+    os.chdir(work)
+    try:
+        from utils import data_manager, gallery_cards
+        seed(data_manager, args.people, args.events, random.Random(5))
+        print(f"{args.people} people, {args.events} memories, pages of {PAGE}\n")
+        cards = lambda offset=0: render_from_cards(data_manager, gallery_cards, offset, PAGE)
+        timed("first page from events (cold)", lambda: render_from_events(data_manager, PAGE))
+        timed("first page from events (warm)", lambda: render_from_events(data_manager, PAGE), runs=20)
+        timed("first page from cards (cold)", cards)
+        timed("first page from cards (warm)", cards, runs=20)
+        timed("page 40 from events", lambda: render_from_events(data_manager, 40 * PAGE))
+        timed("page 40 from cards (cold)", lambda: cards(39 * PAGE))
+        timed("page 40 from cards (warm)", lambda: cards(39 * PAGE), runs=20)
+
+        newest = cards()[0]["id"]
+        data_manager.update_event(newest, {"title": "Edited"})
+        timed("first page after an event edit", cards)
+        data_manager.save_node({"id": "p1", "name": "Renamed", "type": "person"})
+        timed("first page after a rename", cards)
+    finally:
+        if "utils.data_manager" in sys.modules:
+            sys.modules["utils.data_manager"].pool.close_all() # flush into the scratch dir, not back here
+        os.chdir(ROOT)
+        shutil.rmtree(work, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Latency of the cached analytics engine (utils.graph_analytics) on a synthetic graph.
+
+    python benchmarks/graph_analytics.py [--nodes 50000] [--degree 10]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.graph_analytics import LAYER_NODE_CAP, GraphAnalytics
+
+def synthetic_edges(n_nodes, degree, seed=3):
+    rng = random.Random(seed)
+    people = [f"person-{i:06d}" for i in range(n_nodes)]
+    edges = {}
+    for p in people:
+        edges[tuple(sorted(("root_me", p)))] = rng.randint(1, 20)
+    for _ in range(n_nodes * degree // 2):
+        a, b = rng.sample(people, 2)
+        edges[tuple(sorted((a, b)))] = rng.randint(1, 5)
+    return people, [{"source": a, "target": b, "weight": w, "last_interaction": "2024-01-01",
+                     "relation_type": ""} for (a, b), w in edges.items()]
+
+def timed(label, fn):
+    t0 = time.perf_counter()
+    result = fn()
+    print(f"{label:<38}{(time.perf_counter() - t0) * 1000:>10.2f} ms")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type=int, default=50_000)
+    parser.add_argument("--degree", type=int, default=10)
+    args = parser.parse_args()
+
+    people, edges = synthetic_edges(args.nodes, args.degree)
+    print(f"{args.nodes} nodes, {len(edges)} edges")
+    engine = GraphAnalytics()
+    timed("initial sync", lambda: engine.sync(edges, version=1))
+    timed("sync, unchanged version", lambda: engine.sync(edges, version=1))
+    timed("weighted degree (cold)", engine.weighted_degrees)
+    timed("pagerank (cold)", engine.centrality_scores)
+    timed("pagerank (cached)", engine.centrality_scores)
+    target = people[-1]
+    timed("connection path (cold BFS)", lambda: engine.connection_path(target))
+    timed("connection path (cached)", lambda: engine.connection_path(people[-2]))
+    timed("mutual neighbors (cold)", lambda: engine.mutual_neighbors("root_me", target))
+    timed("mutual neighbors (cached)", lambda: engine.mutual_neighbors("root_me", target))
+    center = people[len(people) // 2]
+    timed("3-hop ball, uncached BFS", lambda: engine.adj.k_hop(engine.ids.get(center), 3))
+    timed("neighborhood k=2, capped (cold)", lambda: engine.neighborhood(center, 2, LAYER_NODE_CAP))
+    timed("neighborhood k=3 (from cached k=2)", lambda: engine.neighborhood(center, 3, LAYER_NODE_CAP))
+    timed("neighborhood k=3 (cached)", lambda: engine.neighborhood(center, 3, LAYER_NODE_CAP))
+
+    # One new edge between two nodes on adjacent BFS layers keeps the cached tree
+    edges.append({"source": people[0], "target": people[1], "weight": 1,
+                  "last_interaction": "2024-02-01", "relation_type": ""})
+    timed("incremental sync (+1 edge)", lambda: engine.sync(edges, version=2))
+    timed("pagerank (warm restart)", engine.centrality_scores)
+    timed("connection path after edit", lambda: engine.connection_path(target))
+    timed("neighborhood k=3 after edit", lambda: engine.neighborhood(center, 3, LAYER_NODE_CAP))
+
+if __name__ == "__main__":
+    main()
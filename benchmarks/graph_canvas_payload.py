@@ -0,0 +1,84 @@
+"""
+Bytes sent to the browser per run by the incremental graph canvas
+(utils.graph_canvas) against resending the whole graph on every run, as the
+streamlit-agraph component did, on a synthetic graph with avatars.
+
+    python benchmarks/graph_canvas_payload.py [--nodes 5000] [--degree 6] [--avatars 0.1]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils import graph_canvas, graph_visualizer
+from utils.graph_analytics import GraphAnalytics
+
+def synthetic_graph(n_nodes, degree, avatars, seed=11):
+    from PIL import Image
+    rng = random.Random(seed)
+    nodes = [{"id": "root_me", "name": "Me", "type": "person", "avatar_type": "color"}]
+    os.makedirs(os.path.join("assets", "avatars"))
+    for i in range(n_nodes):
+        node = {"id": f"p{i}", "name": f"Person {i}", "type": "person", "description": "",
+                "avatar_type": "color", "avatar_value": "#A8DADC"}
+        if rng.random() < avatars:
+            node["avatar_type"] = "image"
+            noise = bytes(rng.getrandbits(8) for _ in range(48 * 48 * 3))
+            Image.frombytes("RGB", (48, 48), noise).save(os.path.join("assets", "avatars", f"p{i}.png"))
+        nodes.append(node)
+    edges = {}
+    for i in range(n_nodes):
+        edges[("root_me", f"p{i}")] = rng.randint(1, 10)
+    for _ in range(n_nodes * degree // 2):
+        a, b = sorted(rng.sample(range(n_nodes), 2))
+        edges[(f"p{a}", f"p{b}")] = rng.randint(1, 5)
+    return nodes, [{"source": a, "target": b, "weight": w, "relation_type": ""} for (a, b), w in edges.items()]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type=int, default=5000)
+    parser.add_argument("--degree", type=int, default=6)
+    parser.add_argument("--avatars", type=float, default=0.1)
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix="deepmemory-bench-")
+    os.chdir(work)
+    try:
+        nodes, edges = synthetic_graph(args.nodes, args.degree, args.avatars)
+        analytics = GraphAnalytics()
+        analytics.sync(edges, version=1)
+        state = graph_canvas.CanvasState()
+        recolored = [dict(n) for n in nodes]
+        recolored[7] = dict(recolored[7], avatar_value="#000000")
+
+        steps = [
+            ("first render", nodes, None, 1),
+            ("rerun, nothing changed", nodes, None, 1),
+            ("recolor one person", recolored, None, 1),
+            ("center on a person, k=2", recolored, "p3", 2),
+            ("depth k=2 -> k=1", recolored, "p3", 1),
+            ("back to the full graph", recolored, None, 1),
+        ]
+        print(f"{args.nodes} people, {len(edges)} edges, {args.avatars:.0%} with avatars\n")
+        print(f"{'step':<28}{'full graph':>14}{'diff':>14}{'diff ms':>10}")
+        for label, step_nodes, center, k in steps:
+            vis_nodes, vis_edges, options = graph_visualizer.get_graph_data(
+                step_nodes, edges, center, k_hop=k, analytics=analytics)
+            full = len(json.dumps({"nodes": vis_nodes, "edges": vis_edges, "options": options}))
+            t0 = time.perf_counter()
+            diff = len(json.dumps(graph_canvas.build_message(state, vis_nodes, vis_edges, options)))
+            diff_ms = (time.perf_counter() - t0) * 1000
+            print(f"{label:<28}{full / 1024:>11.0f} KB{diff / 1024:>11.1f} KB{diff_ms:>10.1f}")
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(work, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Identity matching for an N-person photo: one find_best_match call per person
+(each resending the whole contact list) against one match_entities call for
+all of them, on the offline model stub (utils.model_client.FakeModelClient).
+
+Prompt/completion tokens are estimated from the text (1 per CJK character,
+1 per 4 other characters). Latency is the stub's sampled per-call latency,
+taken on a virtual clock, plus a per-token cost for prefill and decoding, so
+longer prompts and answers cost time as they would on the real service.
+
+    python benchmarks/identity_matching.py [--contacts 200] [--photos 20] [--latency lognormal:0.6,0.3]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils import image_processor, model_client
+
+PREFILL_MS_PER_1K_TOKENS = 60 # modelled prompt processing time
+DECODE_MS_PER_TOKEN = 25 # modelled generation time
+
+_CJK = re.compile("[\u3000-\u9fff\uff00-\uffef]")
+
+def estimate_tokens(text):
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+class Meter(model_client.FakeModelClient):
+    """
+    The stub, counting calls, tokens and (virtual) time.
+    """
+    def __init__(self, **kwargs):
+        super().__init__(sleep=self._wait, **kwargs)
+        self.reset()
+
+    def reset(self):
+        self.n_calls, self.prompt_tokens, self.completion_tokens, self.elapsed = 0, 0, 0, 0.0
+
+    def _wait(self, seconds):
+        self.elapsed += seconds
+
+    def generation_call(self, model, prompt, **kwargs):
+        response = super().generation_call(model, prompt, **kwargs)
+        completion = estimate_tokens(response.output.choices[0].message.content) if response.output else 0
+        prompt_tokens = estimate_tokens(prompt)
+        self.n_calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion
+        self.elapsed += prompt_tokens / 1000 * PREFILL_MS_PER_1K_TOKENS / 1000 + completion * DECODE_MS_PER_TOKEN / 1000
+        return response
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contacts", type=int, default=200)
+    parser.add_argument("--photos", type=int, default=20)
+    parser.add_argument("--latency", default="lognormal:0.6,0.3")
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    traits = ["戴眼镜", "短发", "长发", "穿西装", "爱笑", "留胡子", "戴帽子", "穿运动服"]
+    known = [{"id": "root_me", "name": "Me"}] + [
+        {"id": f"n{i}", "name": f"Person {i}", "description": "，".join(rng.sample(traits, 2))}
+        for i in range(args.contacts)]
+    client = Meter(seed=7, latency=model_client.LatencyModel.parse(args.latency), match_rate=0.6)
+    model_client.set_client(client)
+
+    print(f"{args.contacts} contacts, {args.photos} photos per size, stub latency {args.latency}\n")
+    print(f"{'people':>6}  {'path':<10}{'calls':>7}{'prompt tok':>12}{'output tok':>12}"
+          f"{'latency s':>11}{'dup ids':>9}{'cpu ms':>8}")
+    for n in (1, 2, 4, 8):
+        photos = [[{"description": f"{rng.choice(model_client._FAKE_DESCRIPTIONS)} #{p}.{k}"} for k in range(n)]
+                  for p in range(args.photos)]
+        for label, match in [
+                ("per-entity", lambda people: [image_processor.find_best_match(e["description"], known) for e in people]),
+                ("batched", lambda people: image_processor.match_entities(people, known))]:
+            client.reset()
+            duplicates = 0
+            start = time.perf_counter()
+            for people in photos:
+                ids = [r["suggested_id"] for r in match(people) if r.get("match_found")]
+                duplicates += len(ids) - len(set(ids))
+            cpu_ms = (time.perf_counter() - start) * 1000 / args.photos
+            print(f"{n:>6}  {label:<10}{client.n_calls / args.photos:>7.1f}{client.prompt_tokens / args.photos:>12.0f}"
+                  f"{client.completion_tokens / args.photos:>12.0f}{client.elapsed / args.photos:>11.2f}"
+                  f"{duplicates:>9}{cpu_ms:>8.1f}")
+
+if __name__ == "__main__":
+    main()
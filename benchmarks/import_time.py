@@ -0,0 +1,84 @@
+"""
+Cold-start benchmark based on `python -X importtime`.
+
+Compares the modules the old app.py imported on every rerun (eager) with what each
+page now pulls in on its first render (lazy). Run from the project root:
+
+    python benchmarks/import_time.py [--repeat 5]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Statement executed in a fresh interpreter for each scenario
+SCENARIOS = {
+    "eager (before)": (
+        "import streamlit, dashscope, streamlit_agraph, networkx, PIL.Image\n"
+        "from utils import data_manager, image_processor, graph_visualizer"
+    ),
+    "page: Memory Gallery": "import streamlit\nfrom utils import data_manager",
+    "page: Relationship": (
+        "import streamlit\nfrom utils import data_manager\n"
+        "from utils import graph_canvas, graph_visualizer"
+    ),
+    "page: Time Capsule": (
+        "import streamlit\nfrom utils import data_manager\nfrom utils import image_processor"
+    ),
+    "first analysis": (
+        "import streamlit\nfrom utils import data_manager, image_processor\n"
+        "import dashscope, PIL.Image"
+    ),
+}
+
+def measure(stmt):
+    """
+    Returns (total_ms, top-level breakdown) for one cold interpreter, or raises on failure.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", stmt],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+    total_us = 0
+    top = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = [p for p in line[len("import time:"):].split("|")]
+        # Top-level imports are the ones without indentation in the tree
+        if name.startswith("  "):
+            continue
+        us = int(cumulative)
+        total_us += us
+        top[name.strip()] = us
+    return total_us / 1000, top
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5, help="show the N slowest top-level imports")
+    args = parser.parse_args()
+
+    baseline = None
+    print(f"{'scenario':<24}{'best ms':>10}{'vs eager':>10}  slowest imports")
+    for label, stmt in SCENARIOS.items():
+        try:
+            runs = [measure(stmt) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(f"{label:<24}{'n/a':>10}{'':>10}  ({e})")
+            continue
+        best_ms, top = min(runs, key=lambda r: r[0])
+        if baseline is None:
+            baseline = best_ms
+        ratio = f"{best_ms / baseline:.0%}" if baseline else "-"
+        slowest = sorted(top.items(), key=lambda kv: kv[1], reverse=True)[:args.top]
+        detail = ", ".join(f"{name} {us / 1000:.0f}ms" for name, us in slowest)
+        print(f"{label:<24}{best_ms:>10.1f}{ratio:>10}  {detail}")
+
+if __name__ == "__main__":
+    main()
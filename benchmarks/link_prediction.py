@@ -0,0 +1,89 @@
+"""
+Connection suggestions (utils.link_prediction) on a synthetic memory store:
+sync cost, cold and cached top-k latency, and what one new memory costs,
+against a plain-Python scoring loop over every candidate.
+
+    python benchmarks/link_prediction.py [--people 20000] [--events 100000]
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.graph_model import EdgeTable, Event, rebuild_edges
+from utils.link_prediction import LinkSuggestions
+
+def synthetic_store(n_people, n_events, seed=5):
+    rng = random.Random(seed)
+    people = [f"person-{i:06d}" for i in range(n_people)]
+    # Small circles of friends who keep showing up together
+    circles = [rng.sample(people, 12) for _ in range(n_people // 8)]
+    events = []
+    for i in range(n_events):
+        circle = rng.choice(circles)
+        events.append({"id": f"event-{i}", "date": f"{rng.randint(2015, 2025)}-{rng.randint(1, 12):02d}-15",
+                       "related_nodes": rng.sample(circle, rng.randint(1, 4))})
+    return people, events
+
+def edges_for(events):
+    as_events = (Event.from_dict(dict(e, title="", content="", images=[])) for e in events)
+    return rebuild_edges(as_events, EdgeTable.from_dicts([])).to_dicts()
+
+def timed(label, fn):
+    t0 = time.perf_counter()
+    result = fn()
+    print(f"{label:<40}{(time.perf_counter() - t0) * 1000:>10.2f} ms")
+    return result
+
+def naive_scores(node, edges, events):
+    # Per-candidate set intersections and event scans
+    adj = defaultdict(set)
+    for e in edges:
+        adj[e["source"]].add(e["target"])
+        adj[e["target"]].add(e["source"])
+    mine = [e for e in events if node in e["related_nodes"]]
+    scores = {}
+    for other in adj:
+        if other == node:
+            continue
+        score = sum(1 / math.log(max(len(adj[m]), 2)) for m in adj[node] & adj[other])
+        score += sum(1 for e in mine if other in e["related_nodes"])
+        if score:
+            scores[other] = score
+    return sorted(scores, key=scores.get, reverse=True)[:10]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--people", type=int, default=20_000)
+    parser.add_argument("--events", type=int, default=100_000)
+    args = parser.parse_args()
+
+    people, events = synthetic_store(args.people, args.events)
+    edges = edges_for(events)
+    print(f"{args.people} people, {len(events)} memories, {len(edges)} edges")
+    engine = LinkSuggestions()
+    timed("initial sync", lambda: engine.sync(edges, lambda: events, 1, 1))
+    timed("sync, unchanged versions", lambda: engine.sync(edges, lambda: events, 1, 1))
+    node = events[0]["related_nodes"][0]
+    timed("top-10 (cold)", lambda: engine.suggest(node, 10))
+    timed("top-10 (cached)", lambda: engine.suggest(node, 10))
+    for p in people[:200]:
+        engine.suggest(p, 10)
+    timed("top-10 for 200 more people", lambda: [engine.suggest(p, 10) for p in people[200:400]])
+    timed("plain-Python scoring, one person", lambda: naive_scores(node, edges, events))
+
+    # One new memory: only the results it can reach are dropped
+    events.append({"id": "event-new", "date": "2025-06-01", "related_nodes": [people[0], people[1]]})
+    edges = edges_for(events)
+    cached = len(engine._results)
+    timed("sync after one new memory", lambda: engine.sync(edges, lambda: events, 2, 2))
+    print(f"{'cached results kept':<40}{len(engine._results):>7} of {cached}")
+    timed("top-10 for a touched person", lambda: engine.suggest(people[0], 10))
+
+if __name__ == "__main__":
+    main()
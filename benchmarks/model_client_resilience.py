@@ -0,0 +1,93 @@
+"""
+The model client under throttling, faults, an outage and slow answers, against
+the local fake DashScope server (utils.fake_model_server), through the real SDK.
+
+Each scenario sends the same calls from many threads, first with the plain
+DashScopeClient, then through ResilientClient (utils.resilient_client), and one
+more time through its async interface. It reports outcomes, what the server
+saw (requests, 429s, TCP connections) and the client's own stats.
+
+    python benchmarks/model_client_resilience.py [--calls 120] [--threads 16]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import dashscope
+
+from utils.fake_model_server import FakeModelServer
+from utils.model_client import DashScopeClient, FakeModelClient, LatencyModel
+from utils.resilient_client import CircuitBreaker, ResilientClient
+
+SCENARIOS = [
+    # name, server quota (rate/s, concurrent), fake latency, fake error rate, client timeout
+    ("quota 8/s, 4 at once", 8, 4, "lognormal:0.3,0.3", 0.0, 10.0),
+    ("20% 429/500 faults", None, None, "lognormal:0.3,0.3", 0.2, 10.0),
+    ("outage (all 500)", None, None, "fixed:0.05", 1.0, 10.0),
+    ("slow tail, 1.5s timeout", None, None, "lognormal:0.4,1.0", 0.0, 1.5),
+]
+
+def prompt(i):
+    return f"分析这篇日记内容：\"第 {i} 天\""
+
+def run_sync(client, calls, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        responses = list(pool.map(lambda i: client.generation_call("qwen-plus", prompt(i), result_format="message"),
+                                  range(calls)))
+    return responses, time.perf_counter() - start
+
+def run_async(client, calls):
+    async def go():
+        return await asyncio.gather(*(client.ageneration_call("qwen-plus", prompt(i), result_format="message")
+                                      for i in range(calls)))
+    start = time.perf_counter()
+    responses = asyncio.run(go())
+    return responses, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=120)
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+    dashscope.api_key = "fake"
+
+    print(f"{args.calls} calls from {args.threads} threads per run\n")
+    print(f"{'scenario':<24}{'client':<11}{'ok':>5}{'failed':>8}{'wall s':>8}{'srv req':>9}{'srv 429':>9}"
+          f"{'conns':>7}{'retries':>9}{'timeouts':>10}{'rejected':>10}{'p50 s':>7}{'p90 s':>7}")
+    for name, rate, concurrency, latency, error_rate, timeout in SCENARIOS:
+        for label in ("plain", "resilient", "async"):
+            fake = FakeModelClient(seed=1, latency=LatencyModel.parse(latency), error_rate=error_rate)
+            server = FakeModelServer(fake, rate=rate, concurrency=concurrency)
+            dashscope.base_http_api_url = server.start()
+            stats = {}
+            if label == "plain":
+                responses, wall = run_sync(DashScopeClient(), args.calls, args.threads)
+            else:
+                # Configured under the quota: a bucket of rate r and burst b admits r + b in a second
+                client = ResilientClient(DashScopeClient(), rate=rate * 0.75 if rate else 50, burst=1 if rate else 10,
+                                         concurrency=concurrency or 8, timeout=timeout, seed=1,
+                                         breaker=CircuitBreaker(failures=5, reset_seconds=2.0))
+                if label == "resilient":
+                    responses, wall = run_sync(client, args.calls, args.threads)
+                else:
+                    responses, wall = run_async(client, args.calls)
+                stats = client.stats()
+            server.shutdown()
+            server.server_close()
+            ok = sum(1 for r in responses if r.status_code == 200)
+            p50, p90 = stats.get("latency_p50"), stats.get("latency_p90")
+            print(f"{name:<24}{label:<11}{ok:>5}{len(responses) - ok:>8}{wall:>8.1f}{server.stats['requests']:>9}"
+                  f"{server.stats['throttled']:>9}{server.stats['connections']:>7}{stats.get('retries', '-'):>9}"
+                  f"{stats.get('timeouts', '-'):>10}{stats.get('rejected', '-'):>10}"
+                  f"{p50 if p50 is not None else '-':>7}{p90 if p90 is not None else '-':>7}")
+        print()
+
+if __name__ == "__main__":
+    main()
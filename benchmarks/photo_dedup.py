@@ -0,0 +1,56 @@
+"""
+Near-duplicate lookup latency of the perceptual-hash index (utils.perceptual_hash)
+against a linear scan, on synthetic 64-bit hashes.
+
+    python benchmarks/photo_dedup.py [--photos 100000] [--radius 6]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.perceptual_hash import MultiIndexHash, hamming
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--photos", type=int, default=100_000)
+    parser.add_argument("--radius", type=int, default=6)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    hashes = [rng.getrandbits(64) for _ in range(args.photos)]
+    t0 = time.perf_counter()
+    index = MultiIndexHash()
+    for i, h in enumerate(hashes):
+        index.add(h, i)
+    print(f"{args.photos} photos, build {time.perf_counter() - t0:.2f} s")
+
+    # Half the queries are near-copies of indexed photos (a few flipped bits)
+    queries = []
+    for q in range(args.queries):
+        h = rng.choice(hashes)
+        if q % 2 == 0:
+            for bit in rng.sample(range(64), rng.randint(1, args.radius)):
+                h ^= 1 << bit
+        else:
+            h = rng.getrandbits(64)
+        queries.append(h)
+
+    t0 = time.perf_counter()
+    index_hits = [sorted(k for _, k in index.search(q, args.radius)) for q in queries]
+    index_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+
+    t0 = time.perf_counter()
+    scan_hits = [[i for i, h in enumerate(hashes) if hamming(h, q) <= args.radius] for q in queries]
+    scan_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+
+    assert index_hits == scan_hits
+    print(f"{'multi-index lookup':<20}{index_ms:>10.3f} ms/query")
+    print(f"{'linear scan':<20}{scan_ms:>10.3f} ms/query")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Memory footprint of the dict model vs the slotted/interned model (utils.graph_model).
+
+Generates a synthetic library (default 100k events) and measures, with tracemalloc,
+the resident size of events + edges as plain dicts vs typed records with CSR adjacency.
+Also times the edge rebuild on both representations.
+
+    python benchmarks/record_model_memory.py [--events 100000] [--people 2000]
+"""
+import argparse
+import datetime
+import gc
+import itertools
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import graph_model
+
+def synthetic_events(n_events, n_people, seed=7):
+    rng = random.Random(seed)
+    people = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(n_people)]
+    start = datetime.date(2015, 1, 1).toordinal()
+    events = []
+    for i in range(n_events):
+        related = ["root_me"] + rng.sample(people, rng.randint(1, 5))
+        content = f"Memory #{i}"
+        events.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "title": f"Event {i}",
+            "date": str(datetime.date.fromordinal(start + rng.randint(0, 3650))),
+            "content": content,
+            "journal_text": content,
+            "images": [f"assets/{uuid.UUID(int=rng.getrandbits(128))}.jpg"],
+            "related_nodes": related,
+        })
+    return events
+
+def dict_rebuild(events):
+    # The pre-CSR algorithm: string tuple keys in a dict
+    edges_map = {}
+    for event in events:
+        participants = event["related_nodes"]
+        date = event["date"]
+        pairs = [tuple(sorted(("root_me", p))) for p in participants if p != "root_me"]
+        pairs += [tuple(sorted(pq)) for pq in itertools.combinations(participants, 2) if "root_me" not in pq]
+        for key in pairs:
+            e = edges_map.setdefault(key, {"source": key[0], "target": key[1], "weight": 0,
+                                           "last_interaction": "", "relation_type": ""})
+            e["weight"] += 1
+            if date > e["last_interaction"]:
+                e["last_interaction"] = date
+    return list(edges_map.values())
+
+def measured(fn):
+    """
+    Returns (result, retained bytes, seconds). Timing comes from a second, untraced
+    run since tracemalloc slows allocation-heavy code considerably.
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = fn()
+    gc.collect()
+    size, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    t0 = time.perf_counter()
+    fn()
+    return result, size, time.perf_counter() - t0
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--people", type=int, default=2_000)
+    args = parser.parse_args()
+
+    # Both models start from the serialized store, as they would on load
+    text = json.dumps(synthetic_events(args.events, args.people), ensure_ascii=False)
+
+    # Dict model: events as parsed from JSON, plus rebuilt edge dicts
+    def build_dicts():
+        events = json.loads(text)
+        return events, dict_rebuild(events)
+    dict_model, dict_bytes, dict_s = measured(build_dicts)
+
+    # Typed model: slotted events, rebuilt edge table, CSR adjacency
+    def build_typed():
+        events = [graph_model.Event.from_dict(e) for e in json.loads(text)]
+        edges = graph_model.rebuild_edges(events, graph_model.EdgeTable.from_dicts([]))
+        return events, edges, graph_model.CSRAdjacency.from_table(edges)
+    typed_model, typed_bytes, typed_s = measured(build_typed)
+
+    mb = 1024 * 1024
+    print(f"{args.events} events, {args.people} people, {len(typed_model[1])} edges")
+    print(f"dict model  : {dict_bytes / mb:8.1f} MiB   load+rebuild {dict_s:6.2f}s")
+    print(f"typed model : {typed_bytes / mb:8.1f} MiB   load+rebuild {typed_s:6.2f}s")
+    print(f"reduction   : {1 - typed_bytes / dict_bytes:8.0%}")
+    assert len(dict_model[1]) == len(typed_model[1])
+
+if __name__ == "__main__":
+    main()
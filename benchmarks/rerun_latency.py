@@ -0,0 +1,81 @@
+"""
+Rerun cost of the app's fragments against full script runs, using the rerun
+timing instrumentation (utils.rerun_timer) on a synthetic library.
+
+Before the views were split into fragments, every interaction (toggling a card's
+"Edit", selecting a node, editing a connection) reran the whole page, and selecting
+a node ran it twice. Now an interaction reruns only the fragment it happens in.
+
+    python benchmarks/rerun_latency.py [--people 300] [--events 3000] [--runs 5]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def seed(people, events):
+    from utils import data_manager
+    rng = random.Random(5)
+    nodes = [{"id": "root_me", "name": "Me", "type": "person", "description": "",
+              "avatar_type": "color", "avatar_value": "#2C3E50"}]
+    nodes += [{"id": f"p{i}", "name": f"Person {i}", "type": "person", "description": "",
+               "avatar_type": "color", "avatar_value": "#A8DADC"} for i in range(people)]
+    data_manager._save("nodes", nodes)
+    for i in range(events):
+        data_manager.current().events.add({
+            "id": f"e{i}", "title": f"Memory {i}", "date": f"20{10 + i % 14}-{1 + i % 12:02d}-01",
+            "content": "A day out.", "images": [],
+            "related_nodes": ["root_me"] + rng.sample([n["id"] for n in nodes[1:]], 3)})
+    data_manager.update_edges_from_events()
+    data_manager.flush()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--people", type=int, default=300)
+    parser.add_argument("--events", type=int, default=3000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ["DEEPMEMORY_PROFILE_RERUNS"] = "1"
+    os.environ.setdefault("DEEPMEMORY_MODEL_CLIENT", "fake")
+    work = tempfile.mkdtemp(prefix="deepmemory-bench-")
+    for name in ("app.py", "utils", "assets"):
+        os.symlink(os.path.join(ROOT, name), os.path.join(work, name))
+    os.chdir(work)
+    sys.path.insert(0, work)
+    try:
+        from streamlit.testing.v1 import AppTest
+        from utils import rerun_timer
+
+        seed(args.people, args.events)
+        for _ in range(args.runs):
+            at = AppTest.from_file(os.path.join(work, "app.py"), default_timeout=120)
+            at.session_state["selected_node_id"] = "p1"
+            at.run()
+            at.sidebar.radio[0].set_value("Memory Gallery").run()
+            assert not at.exception, [e.value for e in at.exception]
+
+        rows = {r["scope"]: r for r in rerun_timer.summary()}
+        print(f"{'scope':<24}{'median':>10}{'p90':>10}  (ms)")
+        for row in rows.values():
+            print(f"{row['scope']:<24}{row['median_ms']:>10.1f}{row['p90_ms']:>10.1f}")
+        print()
+        # An interaction used to cost the full run of its page (node selection: two).
+        # A selection reruns the relationship view with the graph data reused.
+        ms = lambda scope: rows[scope]["median_ms"]
+        for label, before, after in [
+                ("select a node", 2 * ms("app:Relationship"), ms("relationship.view") - ms("graph.canvas")),
+                ("edit a connection", ms("app:Relationship"), ms("inspector.connections")),
+                ("avatar settings", ms("app:Relationship"), ms("inspector.profile")),
+                ("toggle a card's Edit", ms("app:Memory Gallery"), ms("gallery.card"))]:
+            print(f"{label:<24}{before:>10.1f} ms -> {after:>8.1f} ms")
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(work, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Many tenants' memories served from one process through the tenant store pool
+(utils.data_manager.StorePool): first-load and cached access times, evictions
+with their flushes, and memory per loaded tenant.
+
+Each tenant gets a synthetic library under a scratch TENANTS_DIR; the pool holds
+--pool of them, so round-robin access over more tenants evicts on every load.
+
+    python benchmarks/tenant_pool.py [--tenants 24] [--pool 8] [--people 200] [--events 1000]
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def seed(data_manager, people, events, rng):
+    nodes = [data_manager._root_node()]
+    nodes += [{"id": f"p{i}", "name": f"Person {i}", "type": "person", "description": "",
+               "avatar_type": "color", "avatar_value": "#A8DADC"} for i in range(people)]
+    data_manager._save("nodes", nodes)
+    for i in range(events):
+        data_manager.current().events.add({
+            "id": f"e{i}", "title": f"Memory {i}", "date": f"20{10 + i % 14}-{1 + i % 12:02d}-01",
+            "content": "A day out.", "images": [],
+            "related_nodes": ["root_me"] + rng.sample([n["id"] for n in nodes[1:]], 3)})
+    data_manager.update_edges_from_events()
+
+def touch(data_manager):
+    # What a page run reads
+    return len(data_manager.get_nodes()), len(data_manager.get_edges()), len(data_manager.get_events())
+
+def timed(fn):
+    t0 = time.perf_counter()
+    fn()
+    return (time.perf_counter() - t0) * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tenants", type=int, default=24)
+    parser.add_argument("--pool", type=int, default=8)
+    parser.add_argument("--people", type=int, default=200)
+    parser.add_argument("--events", type=int, default=1000)
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix="deepmemory-bench-")
+    os.environ["DEEPMEMORY_TENANTS_DIR"] = os.path.join(work, "tenants")
+    os.environ["DEEPMEMORY_TENANT_POOL_SIZE"] = str(args.pool)
+    os.chdir(work)
+    try:
+        from utils import data_manager
+        rng = random.Random(5)
+        names = [f"t{i:03d}" for i in range(args.tenants)]
+        t0 = time.perf_counter()
+        for name in names:
+            with data_manager.use_tenant(name):
+                seed(data_manager, args.people, args.events, rng)
+        print(f"{args.tenants} tenants x {args.people} people, {args.events} memories; pool of {args.pool}")
+        print(f"{'seeding':<36}{time.perf_counter() - t0:>10.2f} s\n")
+
+        pool = data_manager.pool
+        before = dict(pool.stats)
+        cold = []
+        for name in names:
+            with data_manager.use_tenant(name):
+                cold.append(timed(lambda: touch(data_manager)))
+        warm_names = names[-args.pool:]
+        warm = []
+        for _ in range(5):
+            for name in warm_names:
+                with data_manager.use_tenant(name):
+                    warm.append(timed(lambda: touch(data_manager)))
+        loads, evictions = pool.stats["loads"] - before["loads"], pool.stats["evictions"] - before["evictions"]
+        print(f"{'page read, tenant not loaded':<36}{statistics.median(cold):>10.2f} ms (median)")
+        print(f"{'page read, tenant in pool':<36}{statistics.median(warm):>10.3f} ms (median)")
+        print(f"{'loads / evictions':<36}{loads:>10} / {evictions}\n")
+
+        # A write left in a tenant's write-behind buffer survives its eviction
+        victim = warm_names[0]
+        with data_manager.use_tenant(victim):
+            data_manager.save_node({"id": "late", "name": "Late Arrival", "type": "person"})
+            pending = data_manager.current().writes.dirty()
+        for name in names[:args.pool]:
+            with data_manager.use_tenant(name):
+                touch(data_manager)
+        with data_manager.use_tenant(victim):
+            kept = any(n["id"] == "late" for n in data_manager.get_nodes())
+        print(f"{'unflushed saves before eviction':<36}{pending:>10}")
+        print(f"{'reloaded after eviction':<36}{'kept' if kept else 'LOST':>10}\n")
+
+        metrics = pool.metrics()
+        sizes = [m["memory_bytes"] for m in metrics["tenants"]]
+        loads_s = [m["load_seconds"] * 1000 for m in metrics["tenants"]]
+        print(f"{'memory per loaded tenant':<36}{statistics.mean(sizes) / 1e6:>10.2f} MB (estimated)")
+        print(f"{'pool memory':<36}{sum(sizes) / 1e6:>10.2f} MB for {metrics['loaded']} tenants")
+        print(f"{'store load time per tenant':<36}{statistics.mean(loads_s):>10.2f} ms")
+    finally:
+        if "utils.data_manager" in sys.modules:
+            sys.modules["utils.data_manager"].pool.close_all() # flush into the scratch dir, not back here
+        os.chdir(ROOT)
+        shutil.rmtree(work, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+"""
+Runs app.py with the immutable media route (utils.media_server) mounted:
+
+    streamlit run serve.py      (or: python serve.py)
+"""
+import streamlit as st
+
+from utils import media_server
+
+app = st.App("app.py", routes=media_server.routes())
+
+if __name__ == "__main__":
+    app.run()
@@ -0,0 +1,73 @@
+import io
+import json
+import os
+import tarfile
+
+import pytest
+
+from utils import backup
+
+def _archive(path, snapshot, member=None):
+    # A hand-made export: one snapshot manifest and no blobs
+    data = json.dumps(snapshot).encode("utf-8")
+    info = tarfile.TarInfo(member or f"snapshots/{snapshot['id']}.json")
+    info.size = len(data)
+    with tarfile.open(path, "w") as tar:
+        tar.addfile(info, io.BytesIO(data))
+
+def _base(tmp_path):
+    base = tmp_path / "base"
+    (base / "data").mkdir(parents=True)
+    (base / "data" / "nodes.json").write_text("[]", encoding="utf-8")
+    return str(base)
+
+def test_export_import_round_trip(tmp_path):
+    repo, copy, archive = str(tmp_path / "repo"), str(tmp_path / "copy"), str(tmp_path / "a.tar")
+    manifest = backup.create_backup(repo, base=_base(tmp_path))
+    backup.export_archive(repo, archive)
+    assert backup.import_archive(archive, copy) == manifest["id"]
+    assert backup.load_snapshot(copy)["files"] == manifest["files"]
+
+@pytest.mark.parametrize("snapshot_id", ["../../escaped", "/tmp/escaped", "20240101T000000000000Z/../../x"])
+def test_import_rejects_traversing_snapshot_id(tmp_path, snapshot_id):
+    repo, archive = str(tmp_path / "repo"), str(tmp_path / "evil.tar")
+    _archive(archive, {"format": 1, "id": snapshot_id, "files": {}}, member="snapshots/x.json")
+    with pytest.raises(backup.BackupError):
+        backup.import_archive(archive, repo)
+    _archive(archive, {"format": 1, "id": snapshot_id, "files": {}}, member="snapshots/escaped.json")
+    with pytest.raises(backup.BackupError):
+        backup.import_archive(archive, repo)
+    assert not os.path.exists(tmp_path / "escaped.json")
+    assert backup.list_snapshots(repo) == []
+
+def test_import_rejects_id_not_matching_member(tmp_path):
+    repo, archive = str(tmp_path / "repo"), str(tmp_path / "a.tar")
+    _archive(archive, {"format": 1, "id": "20240101T000000000000Z", "files": {}},
+             member="snapshots/20250101T000000000000Z.json")
+    with pytest.raises(backup.BackupError):
+        backup.import_archive(archive, repo)
+    assert backup.list_snapshots(repo) == []
+
+def test_restore_keeps_excluded_paths_in_place(tmp_path):
+    base, repo = _base(tmp_path), str(tmp_path / "repo")
+    photo = os.path.join(base, "assets", "photo.jpg")
+    media = os.path.join(base, "data", "tmp", "media")
+    os.makedirs(os.path.dirname(photo))
+    os.makedirs(media)
+    with open(photo, "wb") as f:
+        f.write(b"jpeg")
+    os.link(photo, os.path.join(media, "abc.jpg")) # as media_server publishes it
+    jobs = os.path.join(base, "data", "jobs.json")
+    with open(jobs, "w", encoding="utf-8") as f:
+        f.write('[{"id": "before"}]')
+    manifest = backup.create_backup(repo, base=base)
+    assert "data/jobs.json" not in manifest["files"]
+
+    with open(jobs, "w", encoding="utf-8") as f:
+        f.write('[{"id": "after"}]')
+    inode = os.stat(os.path.join(media, "abc.jpg")).st_ino
+    backup.restore(repo, manifest["id"], base=base)
+    linked = os.stat(os.path.join(media, "abc.jpg"))
+    assert linked.st_ino == inode # moved, not copied
+    with open(jobs, encoding="utf-8") as f:
+        assert "after" in f.read() # other tenants' jobs are not rolled back
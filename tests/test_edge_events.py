@@ -0,0 +1,99 @@
+import random
+
+from utils.edge_events import EdgeEventIndex
+from utils.graph_model import ROOT_ID, Event, IdInterner, tie_keys
+
+class _Events:
+    # An event store stand-in: dicts by id and a version bumped on every change
+    def __init__(self, interner):
+        self.ids = interner
+        self.events = {}
+        self.version = 0
+
+    def put(self, event_id, date, related, title=None):
+        self.events[event_id] = {"id": event_id, "title": title or event_id, "date": date, "related_nodes": related}
+        self.version += 1
+
+    def delete(self, event_id):
+        del self.events[event_id]
+        self.version += 1
+
+    def sync(self, index):
+        index.sync(lambda: [Event.from_dict(e, self.ids) for e in self.events.values()], self.version)
+
+def _store():
+    interner = IdInterner([ROOT_ID])
+    return _Events(interner), EdgeEventIndex(interner)
+
+def test_update_moves_an_event_between_ties():
+    store, index = _store()
+    store.put("e1", "2024-01-01", ["a", "b"])
+    store.put("e2", "2024-03-01", ["a", "b"])
+    store.sync(index)
+    assert index.latest("b", "a") == {"event_id": "e2", "title": "e2", "date": "2024-03-01", "count": 2}
+    assert index.latest(ROOT_ID, "a")["count"] == 2
+
+    store.put("e2", "2024-03-01", ["a", "c"], title="renamed") # b left the latest event
+    store.sync(index)
+    assert index.latest("a", "b") == {"event_id": "e1", "title": "e1", "date": "2024-01-01", "count": 1}
+    assert index.latest("a", "c") == {"event_id": "e2", "title": "renamed", "date": "2024-03-01", "count": 1}
+
+    store.put("e1", "2024-05-01", ["a", "c"]) # an older event becomes the newest
+    store.sync(index)
+    assert index.latest("a", "b") is None
+    assert index.latest("a", "c")["event_id"] == "e1"
+    assert index.latest(ROOT_ID, "b") is None
+
+def test_delete_falls_back_to_the_next_latest():
+    store, index = _store()
+    store.put("e1", "2024-01-01", ["a", "b"])
+    store.put("e2", "2024-01-01", ["a", "b"]) # same day: the larger id is latest
+    store.put("e3", "", ["a", "b"])
+    store.sync(index)
+    assert index.latest("a", "b")["event_id"] == "e2"
+    store.delete("e2")
+    store.sync(index)
+    assert index.latest("a", "b") == {"event_id": "e1", "title": "e1", "date": "2024-01-01", "count": 2}
+    store.delete("e1")
+    store.delete("e3")
+    store.sync(index)
+    assert index.latest("a", "b") is None and len(index) == 0
+
+def test_unchanged_version_skips_loading():
+    store, index = _store()
+    store.put("e1", "2024-01-01", ["a"])
+    store.sync(index)
+    calls = []
+    index.sync(lambda: calls.append(1) or [], store.version)
+    assert calls == [] and index.latest(ROOT_ID, "a")["event_id"] == "e1"
+
+def test_matches_a_rebuild_after_random_edits():
+    rng = random.Random(7)
+    store, index = _store()
+    people = [f"p{i}" for i in range(8)] + [ROOT_ID]
+
+    def put(event_id):
+        date = rng.choice(["", f"2020-{rng.randint(1, 9):02d}-01"])
+        store.put(event_id, date, rng.sample(people, rng.randint(0, 4)), title=f"t{rng.randint(0, 3)}")
+
+    for step in range(300):
+        roll = rng.random()
+        if roll < 0.4 or not store.events:
+            put(f"e{rng.randint(0, 60)}")
+        elif roll < 0.7:
+            put(rng.choice(list(store.events))) # edit participants, date or title
+        else:
+            store.delete(rng.choice(list(store.events)))
+        store.sync(index)
+
+        ties = {}
+        for e in store.events.values():
+            event = Event.from_dict(e, store.ids)
+            for key in tie_keys(event.related, store.ids):
+                ties.setdefault(key, []).append(event)
+        assert len(index) == len(ties)
+        for key, events in ties.items():
+            a, b = store.ids.lookup(key >> 32), store.ids.lookup(key & 0xFFFFFFFF)
+            best = max(events, key=lambda e: (e.ordinal, e.id))
+            assert index.latest(b, a) == {"event_id": best.id, "title": best.title, "date": best.date,
+                                          "count": len(events)}, step
@@ -0,0 +1,96 @@
+import multiprocessing
+import os
+import threading
+
+import pytest
+
+from utils import event_shards, record_store
+from utils.event_shards import EventShardStore
+
+def _events(n, prefix="e"):
+    return [{"id": f"{prefix}{i}", "date": f"2024-{i % 3 + 1:02d}-{i % 28 + 1:02d}", "title": str(i)}
+            for i in range(n)]
+
+def test_imports_the_legacy_events_file(tmp_path):
+    legacy = str(tmp_path / "events.json")
+    events = _events(9) + [{"id": "undated", "date": "", "title": "?"}]
+    record_store.save_records(legacy, events)
+    store = EventShardStore(str(tmp_path / "events"), legacy_file=legacy)
+    assert store.keys() == ["undated", "2024-01", "2024-02", "2024-03"]
+    assert sorted(store.iter_events(), key=lambda e: e["id"]) == sorted(events, key=lambda e: e["id"])
+    assert store.get("e4") == events[4]
+
+    # One-time: once the manifest exists the legacy file is no longer read
+    record_store.save_records(legacy, [])
+    reopened = EventShardStore(str(tmp_path / "events"), legacy_file=legacy)
+    assert reopened.count() == len(events)
+
+def test_index_log_ignores_a_crashed_tail(tmp_path, monkeypatch):
+    monkeypatch.setattr(event_shards, "INDEX_LOG_MIN_ENTRIES", 1000)
+    root = str(tmp_path / "events")
+    store = EventShardStore(root)
+    for e in _events(6):
+        store.add(e)
+    store.update("e1", {"date": "2023-05-01"})
+    store.delete("e2")
+    manifest = store.manifest()
+    assert manifest["index_log_entries"] == 8
+    with open(os.path.join(root, manifest["index_log"]), "ab") as f:
+        # A write that died before its manifest swap: a full line and a torn one
+        f.write(b'{"e0": null}\n{"e3": "20')
+
+    fresh = EventShardStore(root)
+    assert fresh.get("e0")["id"] == "e0"
+    assert fresh.get("e1")["date"] == "2023-05-01"
+    assert fresh.get("e2") is None
+    fresh.add({"id": "late", "date": "2024-02-03"}) # truncates the tail before appending
+    again = EventShardStore(root)
+    assert again._id_index() == {"e0": "2024-01", "e1": "2023-05", "e3": "2024-01", "e4": "2024-02",
+                                 "e5": "2024-03", "late": "2024-02"}
+    assert store._id_index() == again._id_index() # the first store replays only the new line
+
+def test_two_stores_on_one_root_interleave(tmp_path):
+    root = str(tmp_path / "events")
+    a, b = EventShardStore(root), EventShardStore(root)
+    for i, e in enumerate(_events(20)):
+        (a if i % 2 else b).add(e)
+    assert b.delete("e1")
+    assert a.update("e2", {"date": "2023-01-01"})
+    for store in (a, b, EventShardStore(root)):
+        assert store.count() == 19
+        assert store.get("e1") is None
+        assert store.get("e2")["date"] == "2023-01-01"
+
+def test_two_stores_writing_at_once_lose_nothing(tmp_path):
+    root = str(tmp_path / "events")
+
+    def write(prefix):
+        store = EventShardStore(root)
+        for e in _events(40, prefix):
+            store.add(e)
+
+    threads = [threading.Thread(target=write, args=(p,)) for p in "ab"]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    store = EventShardStore(root)
+    assert store.count() == len(store._id_index()) == 80
+
+def _write_in_process(root, prefix):
+    store = EventShardStore(root)
+    for e in _events(25, prefix):
+        store.add(e)
+
+@pytest.mark.skipif(event_shards.fcntl is None, reason="writers are serialized across processes with fcntl")
+def test_two_processes_writing_at_once_lose_nothing(tmp_path):
+    root = str(tmp_path / "events")
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=_write_in_process, args=(root, p)) for p in "ab"]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+    assert [p.exitcode for p in processes] == [0, 0]
+    store = EventShardStore(root)
+    assert store.count() == len(store._id_index()) == 50
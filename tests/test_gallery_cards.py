@@ -0,0 +1,80 @@
+import os
+import shutil
+
+import pytest
+
+from utils import media_server
+from utils.event_shards import EventShardStore
+from utils.gallery_cards import GalleryCards
+
+@pytest.fixture
+def gallery(tmp_path):
+    store = EventShardStore(str(tmp_path / "events"))
+    for i, date in enumerate(["2024-01-05", "2024-01-20", "2024-02-03", "2024-03-09", ""]):
+        store.add({"id": f"e{i}", "title": f"T{i}", "date": date, "content": "x" * i,
+                   "related_nodes": ["root_me", "a"] if i % 2 else ["b"], "images": []})
+    nodes = {"a": "Ann", "b": "Ben"}
+    cards = GalleryCards()
+    reads = []
+    read_shard = store.read_shard
+    store.read_shard = lambda key: reads.append(key) or read_shard(key)
+
+    def sync():
+        cards.sync(store, lambda: [{"id": k, "name": v} for k, v in nodes.items()],
+                   store.manifest()["generation"], tuple(nodes.items()))
+        return cards
+
+    return store, nodes, sync, reads
+
+def test_pages_newest_first_and_build_only_reached_shards(gallery):
+    store, _, sync, reads = gallery
+    cards = sync()
+    assert cards.count() == 5
+    assert [c["id"] for c in cards.page(0, 2)] == ["e3", "e2"]
+    assert reads == ["2024-03", "2024-02"]
+    assert [c["id"] for c in cards.page(2, 10)] == ["e1", "e0", "e4"] # undated last
+    assert cards.page(0, 1)[0]["participants"] == ["Ann"]
+
+def test_event_edit_rebuilds_only_its_shard(gallery):
+    store, _, sync, reads = gallery
+    sync().page(0, 10)
+    store.update("e0", {"title": "Edited"})
+    reads.clear()
+    assert [c["title"] for c in sync().page(0, 10)] == ["T3", "T2", "T1", "Edited", "T4"]
+    assert reads == ["2024-01"]
+
+    store.update("e2", {"date": "2024-01-01"}) # moves between shards
+    store.delete("e4")
+    reads.clear()
+    assert [c["id"] for c in sync().page(0, 10)] == ["e3", "e1", "e0", "e2"]
+    assert sorted(reads) == ["2024-01"]
+
+def test_rename_patches_cards_without_rebuilding(gallery):
+    store, nodes, sync, reads = gallery
+    before = sync().page(0, 10)
+    reads.clear()
+    nodes["a"] = "Annie"
+    after = sync().page(0, 10)
+    assert reads == []
+    assert [c["participants"] for c in after] == [["Annie"], ["Ben"], ["Annie"], ["Ben"], ["Ben"]]
+    assert before[0]["participants"] == ["Ann"] # pages already handed out are not changed
+
+def test_image_urls_survive_a_pruned_media_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv(media_server.MOUNTED_ENV, "1")
+    os.makedirs("assets")
+    with open(os.path.join("assets", "photo.png"), "wb") as f:
+        f.write(b"png")
+    store = EventShardStore("events")
+    store.add({"id": "e1", "date": "2024-01-01", "images": [os.path.join("assets", "photo.png"), "assets/gone.png"]})
+    cards = GalleryCards()
+    cards.sync(store, list, 1, 1)
+
+    card = cards.page()[0]
+    name = card["thumbnail"].rsplit("/", 1)[1].replace("-w480", "")
+    assert card["images"] == [card["thumbnail"]] # the missing file is left out
+    assert os.path.exists(os.path.join(media_server.MEDIA_DIR, name))
+
+    shutil.rmtree(media_server.MEDIA_DIR) # the media cache is emptied
+    assert cards.page()[0]["thumbnail"] == card["thumbnail"]
+    assert os.path.exists(os.path.join(media_server.MEDIA_DIR, name)) # published again
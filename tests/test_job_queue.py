@@ -0,0 +1,68 @@
+import threading
+import time
+
+from utils import record_store
+from utils.job_queue import JOB_TTL_SECONDS, JobQueue
+
+def _wait(queue, job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+def _job(job_id, status, **fields):
+    return dict({"id": job_id, "kind": "echo", "params": {"x": job_id}, "owner": "a", "status": status,
+                 "result": None, "error": None, "created_at": time.time(), "started_at": None,
+                 "finished_at": None}, **fields)
+
+def test_restart_requeues_interrupted_jobs(tmp_path):
+    path = str(tmp_path / "jobs.json")
+    now = time.time()
+    record_store.save_records(path, [
+        _job("running", "running", started_at=now),
+        _job("queued", "queued"),
+        _job("done", "done", result="kept", finished_at=now),
+        _job("stale", "done", result="old", finished_at=now - JOB_TTL_SECONDS - 1),
+    ])
+    queue = JobQueue({"echo": lambda params: params["x"]}, path=path)
+    assert queue.get("stale") is None # expired unreviewed results are dropped
+    assert queue.get("running")["status"] == "queued"
+    queue.resume()
+    assert _wait(queue, "running")["result"] == "running"
+    assert _wait(queue, "queued")["result"] == "queued"
+    assert queue.get("done")["result"] == "kept"
+    assert {j["id"]: j["status"] for j in record_store.load_records(path)} == \
+        {"running": "done", "queued": "done", "done": "done"}
+
+def test_get_only_returns_the_owners_jobs(tmp_path):
+    queue = JobQueue({"echo": lambda params: params["x"]}, path=str(tmp_path / "jobs.json"))
+    job_id = queue.submit("echo", {"x": 1}, owner="a")
+    assert queue.get(job_id, owner="b") is None
+    assert queue.get(job_id, owner="a")["owner"] == "a"
+    assert _wait(queue, job_id)["result"] == 1
+
+def test_streamed_items_are_shown_but_not_persisted_one_by_one(tmp_path):
+    path = str(tmp_path / "jobs.json")
+    release, writes = threading.Event(), []
+
+    def stream(params):
+        yield "first"
+        release.wait(5)
+        yield from range(100)
+
+    queue = JobQueue({"stream": stream}, path=path)
+    persist = queue._persist
+    queue._persist = lambda: (writes.append(1), persist())
+    job_id = queue.submit("stream", {})
+    deadline = time.monotonic() + 5
+    while queue.get(job_id)["result"] != ["first"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert queue.get(job_id)["result"] == ["first"] # a poller sees partial results
+    assert record_store.load_records(path)[0]["result"] is None
+    release.set()
+    assert _wait(queue, job_id)["result"] == ["first"] + list(range(100))
+    assert len(writes) == 3 # submitted, running, done
+    assert record_store.load_records(path)[0]["result"] == ["first"] + list(range(100))
@@ -0,0 +1,48 @@
+import json
+
+import pytest
+
+from utils.image_processor import JsonArrayStream
+
+ENTITIES = [
+    {"description": "穿\"蓝色\"衬衫 {not a brace} [nor a bracket]", "name": "老王"},
+    {"description": "back\\slash \\\" and \\\\", "box": [1, [2, 3]], "meta": {"a": {"b": "}"}}},
+    {"description": "é \\u00e9 \n", "name": None},
+]
+
+def _feed_all(parser, pieces):
+    objects = []
+    for piece in pieces:
+        objects += parser.feed(piece)
+    return objects
+
+@pytest.mark.parametrize("wrap", ["{}", "```json\n{}\n```", "Here they are:\n{}\nDone."])
+def test_every_split_point_yields_the_same_objects(wrap):
+    text = wrap.format(json.dumps(ENTITIES, ensure_ascii=False, indent=2))
+    for cut in range(len(text) + 1):
+        assert _feed_all(JsonArrayStream(), [text[:cut], text[cut:]]) == ENTITIES, cut
+
+def test_one_character_at_a_time():
+    text = json.dumps(ENTITIES)
+    parser = JsonArrayStream()
+    seen = []
+    for i, c in enumerate(text):
+        for obj in parser.feed(c):
+            # Each object is returned as soon as its closing brace arrives
+            assert text[i] == "}"
+            seen.append(obj)
+    assert seen == ENTITIES
+    assert parser.finished and parser.buffer == ""
+
+def test_escapes_split_across_chunks():
+    text = '[{"a": "x\\\\"}, {"b": "\\"}{\\""}]'
+    assert _feed_all(JsonArrayStream(), ['[{"a": "x\\', '\\"}, {"b": "\\', '"}{\\', '""}]']) == \
+        json.loads(text)
+
+def test_bare_object_and_trailing_text():
+    assert _feed_all(JsonArrayStream(), ['{"name": "A', 'lice"}', ' [{"ignored": 1}]']) == [{"name": "Alice"}]
+
+def test_skips_malformed_items_and_non_objects():
+    parser = JsonArrayStream()
+    assert _feed_all(parser, ['[1, "two", {"ok": 1}, {"bad": tru', 'e x}, [{"nested": 1}], {"ok": 2}]']) == \
+        [{"ok": 1}, {"ok": 2}]
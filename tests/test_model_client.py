@@ -0,0 +1,48 @@
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+from utils import model_client, resilient_client
+from utils.model_client import FakeModelClient, ModelClient
+
+def test_model_client_is_abstract():
+    with pytest.raises(TypeError):
+        ModelClient()
+
+def _statuses(client, n, threads):
+    out = []
+    def run():
+        for _ in range(n // threads):
+            out.append(client.generation_call("qwen-plus", "hi").status_code)
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return out
+
+def test_fake_client_counts_and_faults_under_concurrency():
+    # The same seed gives the same faults whether the calls come from one thread or many
+    expected = Counter(_statuses(FakeModelClient(seed=3, error_rate=0.5), 4000, 1))
+    client = FakeModelClient(seed=3, error_rate=0.5)
+    assert Counter(_statuses(client, 4000, 8)) == expected
+    assert client.calls == 4000
+
+def test_concurrent_first_calls_share_one_client(monkeypatch):
+    class Slow(resilient_client.ResilientClient):
+        def __init__(self, backend):
+            time.sleep(0.05) # widen the window between the check and the assignment
+            super().__init__(backend)
+
+    monkeypatch.setattr(resilient_client, "ResilientClient", Slow)
+    monkeypatch.setattr(model_client, "_client", None)
+    monkeypatch.setenv(model_client.CLIENT_ENV, "fake")
+    clients = []
+    workers = [threading.Thread(target=lambda: clients.append(model_client.get_client())) for _ in range(8)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    assert len(clients) == 8 and len({id(c) for c in clients}) == 1
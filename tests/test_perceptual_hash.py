@@ -0,0 +1,30 @@
+import pytest
+
+from utils.perceptual_hash import HashIndex, MultiIndexHash
+
+def _image(path, shade):
+    Image = pytest.importorskip("PIL.Image")
+    Image.new("RGB", (64, 64), (shade, 255 - shade, 40)).save(path)
+    return str(path)
+
+def test_sync_drops_entries_for_files_it_can_no_longer_read(tmp_path):
+    index = HashIndex(str(tmp_path / "hashes.json"))
+    files = {"a": _image(tmp_path / "a.png", 10), "b": _image(tmp_path / "b.png", 200)}
+    assert index.sync(files) == 2
+
+    (tmp_path / "a.png").unlink()
+    (tmp_path / "b.png").write_bytes(b"not an image any more")
+    assert index.sync(files) == 2
+    assert len(index) == 0 and index.get("a") is None
+    assert len(HashIndex(index.path)) == 0 # persisted
+    assert index.sync(files) == 0
+
+def test_multi_index_size_only_counts_real_removals():
+    mih = MultiIndexHash()
+    mih.add(0x0123456789ABCDEF, "a")
+    mih.add(0x0123456789ABCDEE, "b")
+    assert not mih.remove(0x0123456789ABCDEF, "missing")
+    assert not mih.remove(0xFFFF, "a") # the key under another value
+    assert mih.size == 2
+    assert mih.remove(0x0123456789ABCDEF, "a")
+    assert mih.size == 1 and mih.search(0x0123456789ABCDEF, 4) == [(1, "b")]
@@ -0,0 +1,24 @@
+import pytest
+
+from utils import record_store
+
+def test_round_trip_binary(tmp_path):
+    path = str(tmp_path / "nodes.dmr")
+    records = [{"id": "a", "name": "Ann"}, {"id": "b", "name": "Ben"}]
+    record_store.save_records(path, records)
+    assert record_store.load_records(path) == records
+
+@pytest.mark.parametrize("name, content", [
+    ("nodes.json", b"[{broken"),
+    ("nodes.dmr", b"NOPE\x01\x00"), # not a record file
+    ("nodes.dmr", record_store.MAGIC + bytes([record_store.FORMAT_VERSION + 1, 0])), # newer format
+    ("nodes.dmr", record_store.MAGIC + bytes([record_store.FORMAT_VERSION, 7])), # unknown codec
+])
+def test_unreadable_files_raise_instead_of_reading_empty(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_bytes(content)
+    with pytest.raises(record_store.RecordFormatError):
+        record_store.load_records(str(path))
+
+def test_missing_file_is_empty(tmp_path):
+    assert record_store.load_records(str(tmp_path / "nodes.json")) == []
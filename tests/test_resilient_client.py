@@ -0,0 +1,150 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils.fake_model_server import FakeModelServer
+from utils.model_client import DashScopeClient, FakeModelClient, ModelClient, error_response, _make_response
+from utils.resilient_client import CircuitBreaker, ResilientClient
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class _Scripted(ModelClient):
+    # Answers with the given statuses in order, then 200s
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+
+    def multimodal_call(self, model, messages, **kwargs):
+        return self.generation_call(model, "")
+
+    def generation_call(self, model, prompt, **kwargs):
+        status = self.statuses.pop(0) if self.statuses else 200
+        if status == 200:
+            return _make_response("ok")
+        return error_response(status, "Scripted", str(status))
+
+def _client(statuses, clock):
+    breaker = CircuitBreaker(failures=2, reset_seconds=10, clock=clock)
+    return ResilientClient(_Scripted(statuses), rate=1000, burst=1000, attempts=1, backoff_base=0, breaker=breaker)
+
+def test_half_open_probe_throttled_is_released():
+    clock = _Clock()
+    client = _client([500, 500, 429], clock)
+    client.generation_call("m", "p")
+    client.generation_call("m", "p")
+    assert client.breaker.state == "open"
+    assert client.generation_call("m", "p").code == "CircuitOpen"
+
+    clock.now = 11
+    assert client.generation_call("m", "p").status_code == 429 # the probe, throttled
+    assert client.breaker.state == "half-open"
+    response = client.generation_call("m", "p") # probes again instead of failing fast
+    assert response.status_code == 200
+    assert client.breaker.state == "closed"
+    assert client.stats()["rejected"] == 1
+
+def test_cancelled_probe_is_released():
+    clock = _Clock()
+    breaker = CircuitBreaker(failures=1, reset_seconds=10, clock=clock)
+    breaker.failure()
+    clock.now = 11
+    client = ResilientClient(_Scripted([]), rate=1000, burst=1000, attempts=1, breaker=breaker)
+
+    async def never():
+        await asyncio.sleep(3600)
+
+    async def cancel_probe():
+        task = asyncio.ensure_future(client._attempt(never))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(cancel_probe())
+    assert breaker.allow() # not stuck half-open with a probe that never finished
+
+# --- Over the real SDK and HTTP, against utils.fake_model_server ---
+
+@pytest.fixture
+def serve(monkeypatch):
+    # Starts a FakeModelServer, points the SDK at it and hands out clients over it
+    dashscope = pytest.importorskip("dashscope")
+    from dashscope.api_entities.aio_session import close_shared_aio_session
+    servers, clients = [], []
+
+    def start(fake, **limits):
+        server = FakeModelServer(fake, **limits)
+        monkeypatch.setattr(dashscope, "base_http_api_url", server.start())
+        servers.append(server)
+        return server
+
+    def client(**kwargs):
+        clients.append(ResilientClient(DashScopeClient(), **kwargs))
+        return clients[-1]
+
+    monkeypatch.setattr(dashscope, "api_key", "fake")
+    start.client = client
+    yield start
+    for c in clients:
+        c._run(close_shared_aio_session()) # the SDK pools one session per client loop
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def _call(client, i=0):
+    return client.generation_call("qwen-plus", f"第 {i} 天", result_format="message")
+
+def test_retries_injected_429_and_500_over_http(serve):
+    server = serve(FakeModelClient(seed=3, error_rate=0.5))
+    client = serve.client(rate=1000, burst=1000, attempts=10, backoff_base=0.01, seed=1,
+                          breaker=CircuitBreaker(failures=100))
+    responses = [_call(client, i) for i in range(12)]
+    assert all(r.status_code == 200 for r in responses)
+    stats = client.stats()
+    assert server.stats["faults"] == stats["retries"] > 0
+    assert 0 < stats["throttled"] < stats["retries"] # both 429s and 500s were retried
+
+def test_retries_server_quota_429s(serve):
+    server = serve(FakeModelClient(), rate=4)
+    client = serve.client(rate=1000, burst=1000, attempts=10, backoff_base=0.2, seed=1)
+    with ThreadPoolExecutor(8) as pool:
+        responses = list(pool.map(lambda i: _call(client, i), range(8)))
+    assert all(r.status_code == 200 for r in responses)
+    assert server.stats["throttled"] == client.stats()["throttled"] > 0
+
+def test_token_bucket_paces_under_the_server_quota(serve):
+    server = serve(FakeModelClient(), rate=10)
+    client = serve.client(rate=8, burst=1, attempts=1)
+    start = time.monotonic()
+    with ThreadPoolExecutor(6) as pool:
+        responses = list(pool.map(lambda i: _call(client, i), range(12)))
+    assert time.monotonic() - start >= 11 / 8 * 0.9
+    assert all(r.status_code == 200 for r in responses)
+    assert server.stats["throttled"] == 0
+
+def test_breaker_opens_half_opens_and_closes_over_http(serve):
+    clock = _Clock()
+    server = serve(FakeModelClient(seed=2, error_rate=1.0))
+    breaker = CircuitBreaker(failures=3, reset_seconds=10, clock=clock)
+    client = serve.client(rate=1000, burst=1000, attempts=20, backoff_base=0, breaker=breaker)
+    assert _call(client).code == "CircuitOpen" # opened by the 500s among the retries
+    assert breaker.state == "open"
+    sent = server.stats["requests"]
+    assert _call(client).code == "CircuitOpen"
+    assert server.stats["requests"] == sent # failed fast, nothing sent
+
+    server.fake.error_rate = 0.0 # the service recovers
+    clock.now = 11
+    assert breaker.allow() and breaker.state == "half-open"
+    breaker.release()
+    assert _call(client).status_code == 200 # the probe
+    assert breaker.state == "closed"
+    assert server.stats["requests"] == sent + 1
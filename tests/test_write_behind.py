@@ -0,0 +1,77 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from utils.write_behind import WriteBehind
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class _Writer:
+    def __init__(self, fail=0):
+        self.writes = []
+        self.fail = fail # the next `fail` writes raise
+
+    def __call__(self, path, data, fsync):
+        if self.fail:
+            self.fail -= 1
+            raise OSError("disk full")
+        self.writes.append((path, data, fsync))
+
+def test_saves_coalesce_into_one_write_per_collection():
+    writer, flushed = _Writer(), []
+    writes = WriteBehind(writer, interval=60, on_flushed=flushed.append)
+    for i in range(10):
+        writes.put("nodes", "nodes.json", [i])
+    writes.put("edges", "edges.json", ["a"])
+    writes.put("edges", "edges.json", ["b"])
+    assert writer.writes == [] and writes.dirty() == 2
+    assert writes.pending("nodes") == [9]
+
+    writes.flush()
+    assert sorted(writer.writes) == [("edges.json", ["b"], True), ("nodes.json", [9], True)]
+    assert sorted(flushed) == ["edges", "nodes"]
+    assert writes.dirty() == 0 and writes.pending("nodes") is None
+    assert writes.stats["saves"] == 12 and writes.stats["writes"] == 2
+
+def test_pile_of_saves_flushes_before_the_interval():
+    writer = _Writer()
+    writes = WriteBehind(writer, durability="relaxed", interval=60, max_pending=5)
+    for i in range(5):
+        writes.put("nodes", "nodes.json", [i])
+    deadline = time.monotonic() + 5
+    while not writer.writes and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert writer.writes == [("nodes.json", [4], False)]
+
+def test_failed_write_stays_dirty_and_newer_saves_win():
+    writer = _Writer(fail=1)
+    writes = WriteBehind(writer, interval=60)
+    writes.put("nodes", "nodes.json", [1])
+    with pytest.raises(OSError):
+        writes.flush()
+    assert writes.pending("nodes") == [1]
+    writes.put("nodes", "nodes.json", [2])
+    writes.flush()
+    assert writer.writes == [("nodes.json", [2], True)]
+
+def test_close_flushes_and_later_saves_are_synchronous():
+    writer = _Writer()
+    writes = WriteBehind(writer, interval=60)
+    writes.put("nodes", "nodes.json", [1])
+    writes.close()
+    assert writer.writes == [("nodes.json", [1], True)]
+    writes.put("nodes", "nodes.json", [2])
+    assert writer.writes[-1] == ("nodes.json", [2], True)
+
+def test_pending_saves_are_flushed_on_interpreter_exit(tmp_path):
+    # A save followed straight by exit, long before the flush interval
+    script = "from utils import data_manager; data_manager.save_node({'id': 'n1', 'name': 'Ann'})"
+    (tmp_path / "data").mkdir() # shipped with the repo for the default tenant
+    env = dict(os.environ, PYTHONPATH=ROOT, DEEPMEMORY_FLUSH_INTERVAL="3600", DEEPMEMORY_STORAGE_FORMAT="json")
+    subprocess.run([sys.executable, "-c", script], cwd=str(tmp_path), env=env, check=True, timeout=60)
+    with open(tmp_path / "data" / "nodes.json", encoding="utf-8") as f:
+        assert "n1" in [n["id"] for n in json.load(f)]
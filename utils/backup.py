@@ -0,0 +1,367 @@
+"""
+Incremental backups of data/ and assets/.
+
+A backup repository is a directory holding content-addressed blobs and one
+manifest per snapshot:
+
+    <repo>/objects/ab/cdef...        file contents, named by their SHA-256
+    <repo>/snapshots/<id>.json       {"id", "created_at", "roots",
+                                      "files": {"data/nodes.json": {"sha256", "size", "mtime_ns"}}}
+
+A file whose size and mtime match the previous snapshot is not read again, and a
+blob that is already in the repository is never copied twice, so a nightly backup
+of a large, mostly unchanged photo library only touches what changed. Files are
+hashed and copied in one streaming pass. Event shards are immutable and written
+under new names, so an edited month costs one shard, not the whole history.
+
+Restores build complete copies of data/ and assets/ next to the live ones and swap
+them in with directory renames, recorded in a journal so that an interrupted swap
+is finished by recover() instead of leaving a half-restored tree.
+
+    python -m utils.backup create BACKUP_DIR
+    python -m utils.backup list BACKUP_DIR
+    python -m utils.backup restore BACKUP_DIR [SNAPSHOT_ID]
+    python -m utils.backup export BACKUP_DIR ARCHIVE.tar [SNAPSHOT_ID]
+    python -m utils.backup import ARCHIVE.tar BACKUP_DIR
+    python -m utils.backup prune BACKUP_DIR KEEP
+"""
+import datetime
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import tarfile
+import uuid
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+BACKUP_DIR = os.environ.get("DEEPMEMORY_BACKUP_DIR", "backups")
+ROOTS = ("data", "assets")
+EXCLUDED_DIRS = {os.path.join("data", "tmp")} # unreviewed face crops and published media links, re-creatable
+EXCLUDED_FILES = {os.path.join("data", "jobs.json")} # the analysis job table, shared by all tenants
+CHUNK_BYTES = 1 << 20 # streaming read/write size
+SETTLE_PASSES = 3 # re-scans when files change while a backup is running
+JOURNAL_FILE = ".restore-journal.json"
+MANIFEST_FORMAT = 1
+SNAPSHOT_ID = re.compile(r"\d{8}T\d{12}Z") # create_backup's UTC timestamp ids
+
+class BackupError(RuntimeError):
+    pass
+
+# --- Repository layout ---
+
+def _object_path(repo: str, digest: str) -> str:
+    return os.path.join(repo, "objects", digest[:2], digest[2:])
+
+def _snapshot_path(repo: str, snapshot_id: str) -> str:
+    # Ids also come from archives and the command line: never let one leave snapshots/
+    if not isinstance(snapshot_id, str) or not SNAPSHOT_ID.fullmatch(snapshot_id):
+        raise BackupError(f"invalid snapshot id: {snapshot_id!r}")
+    return os.path.join(repo, "snapshots", snapshot_id + ".json")
+
+def _write_json(path: str, data: Dict[str, Any]):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def list_snapshots(repo: str) -> List[str]:
+    """
+    Snapshot IDs in the repository, oldest first.
+    """
+    folder = os.path.join(repo, "snapshots")
+    if not os.path.isdir(folder):
+        return []
+    return sorted(name[:-5] for name in os.listdir(folder) if name.endswith(".json"))
+
+def load_snapshot(repo: str, snapshot_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    The manifest of snapshot_id (the latest if omitted).
+    """
+    if snapshot_id is None:
+        snapshots = list_snapshots(repo)
+        if not snapshots:
+            raise BackupError(f"no snapshots in {repo}")
+        snapshot_id = snapshots[-1]
+    path = _snapshot_path(repo, snapshot_id)
+    if not os.path.exists(path):
+        raise BackupError(f"unknown snapshot: {snapshot_id}")
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format", 0) > MANIFEST_FORMAT:
+        raise BackupError("snapshot manifest is newer than supported")
+    return manifest
+
+# --- Backup ---
+
+def _walk(base: str, roots) -> Iterator[Tuple[str, os.stat_result]]:
+    # (relative path, stat) of every file to back up, in a stable order
+    for root in roots:
+        for dirpath, dirnames, filenames in os.walk(os.path.join(base, root)):
+            rel_dir = os.path.relpath(dirpath, base)
+            dirnames[:] = sorted(d for d in dirnames if os.path.join(rel_dir, d) not in EXCLUDED_DIRS)
+            for name in sorted(filenames):
+                if name.endswith(".tmp") or os.path.join(rel_dir, name) in EXCLUDED_FILES:
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield os.path.join(rel_dir, name).replace(os.sep, "/"), stat
+
+def _store_blob(repo: str, src, expected: Optional[str] = None) -> Tuple[str, int]:
+    """
+    Streams a file object into the repository, hashing while copying.
+    Returns (sha256, size); an existing blob is kept and the copy discarded.
+    """
+    tmp_dir = os.path.join(repo, "objects", "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    tmp_path = os.path.join(tmp_dir, uuid.uuid4().hex)
+    digest, size = hashlib.sha256(), 0
+    try:
+        with open(tmp_path, "wb") as dst:
+            for chunk in iter(lambda: src.read(CHUNK_BYTES), b""):
+                digest.update(chunk)
+                dst.write(chunk)
+                size += len(chunk)
+        sha = digest.hexdigest()
+        if expected is not None and sha != expected:
+            raise BackupError(f"blob {expected} is corrupt")
+        final = _object_path(repo, sha)
+        if not os.path.exists(final):
+            os.makedirs(os.path.dirname(final), exist_ok=True)
+            os.replace(tmp_path, final)
+        return sha, size
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def create_backup(repo: str = BACKUP_DIR, base: str = ".", roots=ROOTS) -> Dict[str, Any]:
+    """
+    Takes a snapshot of roots (relative to base) into repo and returns its
+    manifest, with "stats" on how much had to be read and copied.
+    """
+    previous = load_snapshot(repo) if list_snapshots(repo) else {"files": {}}
+    known = dict(previous["files"])
+    stats = {"files": 0, "bytes": 0, "hashed_files": 0, "hashed_bytes": 0, "new_blobs": 0}
+    files: Dict[str, Dict[str, Any]] = {}
+    for _ in range(SETTLE_PASSES):
+        # Writers replace files atomically, but may touch several files per commit
+        # (e.g. a shard and the event manifest): rescan until a pass sees no change.
+        changed = False
+        seen = {}
+        for rel, stat in _walk(base, roots):
+            seen[rel] = stat
+            entry = files.get(rel) or known.get(rel)
+            if (entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+                    and os.path.exists(_object_path(repo, entry["sha256"]))):
+                files[rel] = entry
+                continue
+            changed = True
+            try:
+                with open(os.path.join(base, rel), "rb") as src:
+                    sha, size = _store_blob(repo, src)
+            except FileNotFoundError:
+                continue
+            stats["hashed_files"] += 1
+            stats["hashed_bytes"] += size
+            files[rel] = {"sha256": sha, "size": size, "mtime_ns": stat.st_mtime_ns}
+        for rel in [r for r in files if r not in seen]:
+            del files[rel]
+            changed = True
+        if not changed:
+            break
+    stats["files"] = len(files)
+    stats["bytes"] = sum(e["size"] for e in files.values())
+    referenced = {e["sha256"] for e in previous["files"].values()}
+    stats["new_blobs"] = len({e["sha256"] for e in files.values()} - referenced)
+
+    snapshot_id = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    manifest = {"format": MANIFEST_FORMAT, "id": snapshot_id,
+                "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+                "roots": list(roots), "files": files, "stats": stats}
+    _write_json(_snapshot_path(repo, snapshot_id), manifest)
+    return manifest
+
+def prune(repo: str, keep: int) -> int:
+    """
+    Deletes all but the newest keep snapshots and the blobs only they used.
+    Returns the number of blobs removed.
+    """
+    snapshots = list_snapshots(repo)
+    for snapshot_id in snapshots[:-keep] if keep > 0 else snapshots:
+        os.remove(_snapshot_path(repo, snapshot_id))
+    live = set()
+    for snapshot_id in list_snapshots(repo):
+        live.update(e["sha256"] for e in load_snapshot(repo, snapshot_id)["files"].values())
+    removed = 0
+    objects = os.path.join(repo, "objects")
+    for prefix in os.listdir(objects) if os.path.isdir(objects) else []:
+        if len(prefix) != 2:
+            continue
+        for name in os.listdir(os.path.join(objects, prefix)):
+            if prefix + name not in live:
+                os.remove(os.path.join(objects, prefix, name))
+                removed += 1
+    return removed
+
+# --- Restore ---
+
+def _staging(base: str, root: str) -> str:
+    return os.path.join(base, f".{root}.restore")
+
+def _retired(base: str, root: str) -> str:
+    return os.path.join(base, f".{root}.old")
+
+def recover(base: str = "."):
+    """
+    Finishes a restore that was interrupted during the swap (see restore()).
+    Safe to call at any time; does nothing without a journal.
+    """
+    journal = os.path.join(base, JOURNAL_FILE)
+    if not os.path.exists(journal):
+        return
+    with open(journal, encoding="utf-8") as f:
+        state = json.load(f)
+    roots = state["roots"]
+    for root in roots:
+        live, staging, retired = os.path.join(base, root), _staging(base, root), _retired(base, root)
+        if os.path.isdir(staging):
+            # Paths excluded from backups carry over by rename: no copy, hard links kept
+            for rel in state.get("carry", ()):
+                head, _, rest = rel.partition(os.sep)
+                src, dst = os.path.join(base, rel), os.path.join(staging, rest)
+                if head == root and os.path.exists(src) and not os.path.exists(dst):
+                    os.makedirs(os.path.dirname(dst), exist_ok=True)
+                    os.rename(src, dst)
+            if os.path.exists(live):
+                shutil.rmtree(retired, ignore_errors=True)
+                os.replace(live, retired)
+            os.replace(staging, live)
+    os.remove(journal)
+    for root in roots:
+        shutil.rmtree(_retired(base, root), ignore_errors=True)
+
+def restore(repo: str = BACKUP_DIR, snapshot_id: Optional[str] = None, base: str = ".") -> Dict[str, Any]:
+    """
+    Replaces the snapshot's roots under base with their backed-up contents.
+    Everything is copied and verified in staging directories first; the live
+    directories are only touched by the final renames.
+    """
+    recover(base)
+    manifest = load_snapshot(repo, snapshot_id)
+    roots = manifest["roots"]
+    for root in roots:
+        shutil.rmtree(_staging(base, root), ignore_errors=True)
+        os.makedirs(_staging(base, root))
+    for rel, entry in manifest["files"].items():
+        root, _, rest = rel.partition("/")
+        if root not in roots or not rest or ".." in rest.split("/"):
+            raise BackupError(f"unexpected path in snapshot: {rel}")
+        if os.path.join(*rel.split("/")) in EXCLUDED_FILES:
+            continue # taken before it was excluded; the live one is kept
+        target = os.path.join(_staging(base, root), *rest.split("/"))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        blob = _object_path(repo, entry["sha256"])
+        if not os.path.exists(blob):
+            raise BackupError(f"snapshot {manifest['id']} is missing blob {entry['sha256']}")
+        digest = hashlib.sha256()
+        with open(blob, "rb") as src, open(target, "wb") as dst:
+            for chunk in iter(lambda: src.read(CHUNK_BYTES), b""):
+                digest.update(chunk)
+                dst.write(chunk)
+            dst.flush()
+            os.fsync(dst.fileno())
+        if digest.hexdigest() != entry["sha256"]:
+            raise BackupError(f"blob {entry['sha256']} is corrupt")
+        # Keep the recorded mtime so the next backup recognises the file unchanged
+        os.utime(target, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+    # Excluded paths (pending crops, media links, the job table) are moved into
+    # staging as part of the journaled swap, so an interrupted restore keeps them
+    _write_json(os.path.join(base, JOURNAL_FILE), {"snapshot": manifest["id"], "roots": roots,
+                                                   "carry": sorted(EXCLUDED_DIRS | EXCLUDED_FILES)})
+    recover(base)
+    return manifest
+
+def reload_app_state():
+    """
+    Drops the process caches that still describe the replaced files.
+    """
+    from utils import data_manager # deferred: the CLI works without the app modules
+    data_manager.reload()
+
+# --- Archives ---
+
+def export_archive(repo: str, out_path: str, snapshot_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Writes one snapshot and its blobs as an uncompressed tar stream (photos
+    don't compress), without holding any file in memory.
+    """
+    manifest = load_snapshot(repo, snapshot_id)
+    with tarfile.open(out_path, "w|") as tar:
+        tar.add(_snapshot_path(repo, manifest["id"]), arcname=f"snapshots/{manifest['id']}.json")
+        for digest in sorted({e["sha256"] for e in manifest["files"].values()}):
+            tar.add(_object_path(repo, digest), arcname=f"objects/{digest[:2]}/{digest[2:]}")
+    return manifest
+
+def import_archive(archive_path: str, repo: str) -> str:
+    """
+    Streams an exported archive into repo (blobs are verified, existing ones
+    skipped). Returns the imported snapshot ID.
+    """
+    snapshot = None
+    with tarfile.open(archive_path, "r|") as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            parts = member.name.split("/")
+            src = tar.extractfile(member)
+            if len(parts) == 3 and parts[0] == "objects":
+                _store_blob(repo, src, expected=parts[1] + parts[2])
+            elif len(parts) == 2 and parts[0] == "snapshots" and parts[1].endswith(".json"):
+                snapshot = json.load(src)
+                if not isinstance(snapshot, dict) or snapshot.get("id") != parts[1][:-5]:
+                    raise BackupError(f"snapshot id does not match archive member: {member.name}")
+                _snapshot_path(repo, snapshot["id"]) # rejects a bad id before the blobs after it are stored
+            else:
+                raise BackupError(f"unexpected archive member: {member.name}")
+    if snapshot is None:
+        raise BackupError("archive contains no snapshot")
+    # Written last, so a truncated archive never yields a snapshot with missing blobs
+    _write_json(_snapshot_path(repo, snapshot["id"]), snapshot)
+    return snapshot["id"]
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    commands = {"create": (2, 2), "list": (2, 2), "restore": (2, 3),
+                "export": (3, 4), "import": (3, 3), "prune": (3, 3)}
+    if not argv or argv[0] not in commands or not commands[argv[0]][0] <= len(argv) <= commands[argv[0]][1]:
+        print(__doc__.split("\n\n")[-1], file=sys.stderr)
+        return 2
+    command, args = argv[0], argv[1:]
+    if command == "create":
+        stats = create_backup(args[0])["stats"]
+        print(f"{stats['files']} files ({stats['bytes']} bytes), read {stats['hashed_files']} "
+              f"({stats['hashed_bytes']} bytes), {stats['new_blobs']} new blobs")
+    elif command == "list":
+        for snapshot_id in list_snapshots(args[0]):
+            print(snapshot_id)
+    elif command == "restore":
+        manifest = restore(args[0], args[1] if len(args) > 1 else None)
+        print(f"restored {manifest['id']}: {len(manifest['files'])} files")
+    elif command == "export":
+        manifest = export_archive(args[0], args[1], args[2] if len(args) > 2 else None)
+        print(f"exported {manifest['id']} to {args[1]}")
+    elif command == "import":
+        print(f"imported {import_archive(args[0], args[1])}")
+    elif command == "prune":
+        print(f"removed {prune(args[0], int(args[1]))} blobs")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,52 @@
+import atexit
+import contextlib
+import contextvars
 import json
 import os
+import re
+import sys
+import threading
+import time
 import datetime
-from typing import List, Dict, Any
-import itertools
+from collections import OrderedDict
+from functools import partial
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple
 
+from utils import backup, record_store
+from utils.event_shards import EventShardStore
+from utils.shared_store import SharedStore
+from utils.write_behind import WriteBehind
+
+# Paths of the default tenant; every other tenant has the same layout under
+# TENANTS_DIR/<tenant id>/ (see TenantStore)
 DATA_DIR = "data"
-NODES_FILE = os.path.join(DATA_DIR, "nodes.json")
-EVENTS_FILE = os.path.join(DATA_DIR, "events.json")
-EDGES_FILE = os.path.join(DATA_DIR, "edges.json")
+ASSETS_DIR = "assets"
+# "json" (pretty-printed lists, default) or "binary" (compact .dmr records, see record_store)
+STORAGE_FORMAT = os.environ.get("DEEPMEMORY_STORAGE_FORMAT", "json")
+_EXT = record_store.BINARY_EXT if STORAGE_FORMAT == "binary" else ".json"
+NODES_FILE = os.path.join(DATA_DIR, "nodes" + _EXT)
+EDGES_FILE = os.path.join(DATA_DIR, "edges" + _EXT)
+
+# Nodes and edges are saved in memory and written by a background flusher (see
+# write_behind): "immediate" (fsync before returning), "batched" (default) or "relaxed".
+DURABILITY = os.environ.get("DEEPMEMORY_DURABILITY", "batched")
+FLUSH_INTERVAL_SECONDS = float(os.environ.get("DEEPMEMORY_FLUSH_INTERVAL", "1.0"))
+FLUSH_MAX_PENDING = 100 # saves that trigger a flush before the interval is up
+
+# Events are sharded by date under EVENTS_DIR (see event_shards).
+# "month" (default), "year" or "all" (a single shard).
+EVENT_SHARD_GRANULARITY = os.environ.get("DEEPMEMORY_EVENT_SHARDS", "month")
+EVENTS_DIR = os.path.join(DATA_DIR, "events")
+# Legacy single-file store, imported into shards on first use
+EVENTS_FILE = os.path.join(DATA_DIR, "events" + _EXT)
+
+# One process can serve many people's memories. Up to TENANT_POOL_SIZE tenants
+# stay loaded (parsed stores and indexes); the least recently used one is flushed
+# and dropped.
+DEFAULT_TENANT = "default" # data/ and assets/ in the working directory
+TENANTS_DIR = os.environ.get("DEEPMEMORY_TENANTS_DIR", "tenants")
+TENANT_POOL_SIZE = int(os.environ.get("DEEPMEMORY_TENANT_POOL_SIZE", "8"))
+_TENANT_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
 
 def load_json(filepath: str) -> List[Dict[str, Any]]:
     if not os.path.exists(filepath):
@@ -22,12 +61,307 @@ def save_json(filepath: str, data: List[Dict[str, Any]]):
     with open(filepath, 'w', encoding='utf-8') as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
 
+def _read_path(filepath: str) -> str:
+    # A binary store that has not been written yet is read from its JSON twin,
+    # so switching STORAGE_FORMAT needs no explicit migration step.
+    if not os.path.exists(filepath) and record_store.is_binary(filepath):
+        legacy = os.path.splitext(filepath)[0] + ".json"
+        if os.path.exists(legacy):
+            return legacy
+    return filepath
+
+def iter_records(filepath: str) -> Iterator[Dict[str, Any]]:
+    """
+    Streams records from a store file in either format. An unreadable file
+    (corrupt, newer format, codec not installed) raises RecordFormatError rather
+    than reading as empty, so the next save cannot overwrite it.
+    """
+    yield from record_store.iter_records(_read_path(filepath))
+
+def load_records(filepath: str) -> List[Dict[str, Any]]:
+    return list(iter_records(filepath))
+
+def save_records(filepath: str, data: List[Dict[str, Any]]):
+    record_store.save_records(filepath, data)
+
+def _file_token(filepath: str):
+    # Cheap change token for a store file (mtime + size)
+    try:
+        stat = os.stat(_read_path(filepath))
+    except FileNotFoundError:
+        return (0, 0)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def _root_node() -> Dict[str, Any]:
+    return {
+        "id": "root_me",
+        "name": "Me",
+        "type": "person",
+        "description": "The center of the universe",
+        "created_at": str(datetime.date.today()),
+        "avatar_type": "color",
+        "avatar_value": "#2C3E50"
+    }
+
+def _estimate_bytes(records) -> int:
+    # Deep size of an even sample of the records, scaled up; cheap enough for a metrics panel
+    if not records:
+        return 0
+    step = max(1, len(records) // 64)
+    sample = records[::step]
+    per_record = sum(_deep_size(r) for r in sample) / len(sample)
+    return int(sys.getsizeof(records) + per_record * len(records))
+
+def _deep_size(obj) -> int:
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_size(k) + _deep_size(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(_deep_size(v) for v in obj)
+    return size
+
+class TenantStore:
+    """
+    One tenant's memories: its data and media roots, one parsed copy of nodes/edges
+    shared read-only by all of its sessions, the buffered node/edge writer and the
+    event shards (cached per shard; the shared store only versions them). Derived
+    per-tenant structures (analytics engines, hash indexes) are kept in index().
+    """
+    def __init__(self, tenant_id: str, root: str):
+        started = time.perf_counter()
+        self.id = tenant_id
+        self.root = root
+        self.data_dir = os.path.join(root, DATA_DIR)
+        self.assets_dir = os.path.join(root, ASSETS_DIR)
+        self.avatar_dir = os.path.join(self.assets_dir, "avatars")
+        self.nodes_file = os.path.join(self.data_dir, "nodes" + _EXT)
+        self.edges_file = os.path.join(self.data_dir, "edges" + _EXT)
+        self.events_file = os.path.join(self.data_dir, "events" + _EXT)
+        self.backup_dir = backup.BACKUP_DIR if tenant_id == DEFAULT_TENANT else os.path.join(root, "backups")
+        self.stats = {"load_seconds": 0.0, "loads": 0}
+        self._lock = threading.Lock()
+        self._indexes: Dict[str, Any] = {}
+
+        # Finish a restore that was interrupted while swapping data/ and assets/
+        backup.recover(root)
+        # Event writes touch a single shard, so they stay synchronous (fsync'd when immediate)
+        self.events = EventShardStore(os.path.join(self.data_dir, "events"), EVENT_SHARD_GRANULARITY, _EXT,
+                                      legacy_file=_read_path(self.events_file), fsync=DURABILITY == "immediate")
+        self.store = SharedStore(
+            tokens={"nodes": lambda: _file_token(self.nodes_file),
+                    "edges": lambda: _file_token(self.edges_file),
+                    "events": lambda: self.events.manifest()["generation"]},
+            loaders={"nodes": lambda: self._load("nodes", self.nodes_file),
+                     "edges": lambda: self._load("edges", self.edges_file)})
+        self.writes = WriteBehind(lambda path, data, fsync: record_store.save_records(path, data, fsync=fsync),
+                                  durability=DURABILITY, interval=FLUSH_INTERVAL_SECONDS,
+                                  max_pending=FLUSH_MAX_PENDING, on_flushed=self.store.mark_synced)
+        if tenant_id != DEFAULT_TENANT and not os.path.exists(_read_path(self.nodes_file)):
+            # A new tenant starts like a factory reset: just 'Me'
+            os.makedirs(self.data_dir, exist_ok=True)
+            self.save("nodes", [_root_node()])
+            self.save("edges", [])
+        self.stats["load_seconds"] += time.perf_counter() - started
+
+    def file_of(self, collection: str) -> str:
+        return self.nodes_file if collection == "nodes" else self.edges_file
+
+    def _load(self, collection: str, filepath: str) -> List[Dict[str, Any]]:
+        started = time.perf_counter()
+        # Unflushed saves win over the file
+        pending = self.writes.pending(collection)
+        data = load_records(filepath) if pending is None else pending
+        self.stats["load_seconds"] += time.perf_counter() - started
+        self.stats["loads"] += 1
+        return data
+
+    def save(self, collection: str, data: List[Dict[str, Any]]):
+        data = list(data)
+        self.writes.put(collection, self.file_of(collection), data)
+        self.store.put(collection, data)
+
+    def index(self, name: str, factory: Callable[[], Any]) -> Any:
+        """
+        The tenant's derived structure `name`, built with factory() on first use and
+        dropped with the tenant.
+        """
+        with self._lock:
+            value = self._indexes.get(name)
+            if value is None:
+                value = self._indexes[name] = factory()
+            return value
+
+    def interner(self):
+        """
+        The tenant's node id table (graph_model.IdInterner), which its edge tables
+        and graph engines intern into, so their arrays span only its own nodes.
+        """
+        # Deferred: numpy is only needed by the graph model
+        from utils.graph_model import IdInterner, ROOT_ID
+        return self.index("ids", lambda: IdInterner([ROOT_ID]))
+
+    def memory_bytes(self) -> int:
+        """
+        Estimated size of the parsed nodes, edges and cached event shards (derived
+        indexes not included).
+        """
+        total = sum(_estimate_bytes(self.store.cached(name)) for name in ("nodes", "edges"))
+        return total + sum(_estimate_bytes(shard) for shard in self.events.cached_shards())
+
+    def metrics(self) -> Dict[str, Any]:
+        return {"tenant": self.id, "memory_bytes": self.memory_bytes(),
+                "load_seconds": round(self.stats["load_seconds"], 4), "loads": self.stats["loads"],
+                "unflushed": self.writes.dirty(), "indexes": sorted(self._indexes)}
+
+    def close(self):
+        """
+        Writes what is pending. A session still holding this store afterwards
+        keeps working, with saves written through immediately.
+        """
+        self.writes.close()
+
+def tenant_root(tenant_id: str) -> str:
+    if tenant_id == DEFAULT_TENANT:
+        return "."
+    if not _TENANT_ID.fullmatch(tenant_id or ""):
+        raise ValueError(f"invalid tenant id: {tenant_id!r}")
+    return os.path.join(TENANTS_DIR, tenant_id)
+
+class StorePool:
+    """
+    Tenant stores by id, at most `size` loaded. Getting a tenant marks it most
+    recently used; loading one more than fits closes (flushes) the least recently
+    used one and drops it, with its parsed data and indexes.
+    """
+    def __init__(self, size: int = TENANT_POOL_SIZE):
+        self.size = size
+        self.stats = {"hits": 0, "loads": 0, "evictions": 0}
+        self._tenants: "OrderedDict[str, TenantStore]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, tenant_id: str) -> TenantStore:
+        evicted = []
+        with self._lock:
+            tenant = self._tenants.get(tenant_id)
+            if tenant is not None:
+                self._tenants.move_to_end(tenant_id)
+                self.stats["hits"] += 1
+                return tenant
+            # Opened under the lock: two writers for the same files must not exist
+            tenant = self._tenants[tenant_id] = TenantStore(tenant_id, tenant_root(tenant_id))
+            self.stats["loads"] += 1
+            while len(self._tenants) > max(self.size, 1):
+                evicted.append(self._tenants.popitem(last=False)[1])
+                self.stats["evictions"] += 1
+        for old in evicted:
+            old.close()
+        return tenant
+
+    def evict(self, tenant_id: str) -> bool:
+        with self._lock:
+            tenant = self._tenants.pop(tenant_id, None)
+        if tenant is None:
+            return False
+        tenant.close()
+        return True
+
+    def close_all(self):
+        with self._lock:
+            tenants = list(self._tenants.values())
+        for tenant in tenants:
+            tenant.close()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            tenants = list(self._tenants.values())
+            stats = dict(self.stats, size=self.size, loaded=len(tenants))
+        return dict(stats, tenants=[t.metrics() for t in reversed(tenants)]) # most recent first
+
+pool = StorePool()
+atexit.register(pool.close_all)
+
+# The tenant of the calling code: use_tenant() (scripts, tests) wins over the
+# resolver (the app's per-session lookup), then the default tenant.
+_tenant_override: "contextvars.ContextVar[Optional[str]]" = contextvars.ContextVar("deepmemory_tenant", default=None)
+_tenant_resolver: Optional[Callable[[], Optional[str]]] = None
+
+def set_tenant_resolver(fn: Optional[Callable[[], Optional[str]]]):
+    global _tenant_resolver
+    _tenant_resolver = fn
+
+@contextlib.contextmanager
+def use_tenant(tenant_id: str):
+    token = _tenant_override.set(tenant_id)
+    try:
+        yield pool.get(tenant_id)
+    finally:
+        _tenant_override.reset(token)
+
+def current_tenant_id() -> str:
+    tenant_id = _tenant_override.get()
+    if tenant_id is None and _tenant_resolver is not None:
+        tenant_id = _tenant_resolver()
+    return tenant_id or DEFAULT_TENANT
+
+def current() -> TenantStore:
+    return pool.get(current_tenant_id())
+
+def get_store() -> SharedStore:
+    """
+    The current tenant's shared store (for subscriptions).
+    """
+    return current().store
+
+def avatar_path(node_id: str) -> str:
+    return os.path.join(current().avatar_dir, f"{node_id}.png")
+
+def _save(collection: str, data: List[Dict[str, Any]]):
+    current().save(collection, data)
+
+def flush():
+    """
+    Writes pending node/edge saves to disk now (e.g. before a backup).
+    """
+    current().writes.flush()
+
+def write_stats() -> Dict[str, Any]:
+    return dict(current().writes.stats, durability=DURABILITY)
+
+def reload():
+    """
+    Drops every cached collection, e.g. after a backup was restored over data/.
+    """
+    tenant = current()
+    tenant.writes.discard()
+    tenant.events.reload()
+    for collection in ("nodes", "edges", "events"):
+        tenant.store.invalidate(collection)
+
+def migrate_storage():
+    """
+    Rewrites all stores in the configured STORAGE_FORMAT (e.g. after switching to binary).
+    """
+    tenant = current()
+    for collection in ("nodes", "edges"):
+        tenant.save(collection, tenant._load(collection, tenant.file_of(collection)))
+    tenant.events.rewrite(ext=_EXT)
+    tenant.store.invalidate("events")
+
 def get_nodes() -> List[Dict[str, Any]]:
-    return load_json(NODES_FILE)
+    """
+    All nodes. The dicts are shared with other sessions: copy before modifying
+    (e.g. save_node(dict(node, name=...))).
+    """
+    return list(current().store.get("nodes"))
+
+def get_nodes_version() -> int:
+    """
+    Monotonic version of the node store, for caches keyed on nodes.
+    """
+    return current().store.version_of("nodes")
 
 def get_node_by_id(node_id: str) -> Dict[str, Any]:
-    nodes = get_nodes()
-    for n in nodes:
+    for n in current().store.get("nodes"):
         if n['id'] == node_id:
             return n
     return None
@@ -42,7 +376,7 @@ def save_node(node: Dict[str, Any]):
             break
     if not found:
         nodes.append(node)
-    save_json(NODES_FILE, nodes)
+    _save("nodes", nodes)
 
 def delete_node(node_id: str):
     """
@@ -51,78 +385,105 @@ def delete_node(node_id: str):
     # 1. Remove Node
     nodes = get_nodes()
     new_nodes = [n for n in nodes if n['id'] != node_id]
-    save_json(NODES_FILE, new_nodes)
+    _save("nodes", new_nodes)
     
     # 2. Remove Edges
     edges = get_edges()
     new_edges = [e for e in edges if e['source'] != node_id and e['target'] != node_id]
-    save_json(EDGES_FILE, new_edges)
+    _save("edges", new_edges)
     
-    # 3. Clean Events
-    events = get_events()
-    for e in events:
+    # 3. Clean Events (only shards that mention the node are rewritten)
+    # Note: We keep the event even if empty, as it might have text/images.
+    def drop_node(e):
         if node_id in e.get('related_nodes', []):
             e['related_nodes'].remove(node_id)
-            # Note: We keep the event even if empty, as it might have text/images.
+            return True
+        return False
             
-    save_json(EVENTS_FILE, events)
+    tenant = current()
+    if tenant.events.update_many(drop_node):
+        tenant.store.invalidate("events")
     
     # 4. Consistency Check (optional but good)
     update_edges_from_events()
 
 def get_events() -> List[Dict[str, Any]]:
-    return load_json(EVENTS_FILE)
+    return list(iter_events())
+
+def iter_events() -> Iterator[Dict[str, Any]]:
+    """
+    Streams events shard by shard, for filters that don't need the full list.
+    """
+    return current().events.iter_events()
+
+def get_events_in_range(start: str = "", end: str = "") -> List[Dict[str, Any]]:
+    """
+    Events dated within [start, end] (ISO dates, either optional), newest first.
+    Only the shards overlapping the range are read.
+    """
+    events = list(current().events.iter_range(start, end))
+    events.sort(key=lambda x: x.get('date', ''), reverse=True)
+    return events
+
+def get_event(event_id: str) -> Dict[str, Any]:
+    """
+    The event with the given ID (or None); only its shard is read.
+    """
+    return current().events.get(event_id)
 
 def save_event(event: Dict[str, Any]):
-    events = get_events()
-    events.append(event)
-    save_json(EVENTS_FILE, events)
+    tenant = current()
+    tenant.events.add(event)
+    tenant.store.invalidate("events")
     update_edges_from_events()
 
+def iter_all_events() -> Iterator[Dict[str, Any]]:
+    """
+    Events sorted by date descending, opening shards lazily (newest first).
+    """
+    return current().events.iter_desc()
+
 def get_all_events() -> List[Dict[str, Any]]:
     """
     Returns all events sorted by date descending.
     """
-    events = get_events()
-    events.sort(key=lambda x: x.get('date', ''), reverse=True)
-    return events
+    return list(iter_all_events())
+
+def count_events() -> int:
+    return current().events.count()
+
+def get_events_version() -> int:
+    """
+    Monotonic version of the event store (see shared_store).
+    """
+    return current().store.version_of("events")
 
 def delete_event(event_id: str):
     """
     Deletes the event with the given ID.
     """
-    events = get_events()
-    new_events = [e for e in events if e['id'] != event_id]
-    save_json(EVENTS_FILE, new_events)
-    # Note: We might want to re-calc edges if edges are derived from events.
-    # Currently edges are cumulative/independent mostly, but update_edges_from_events exists.
-    # For now, simplistic delete.
-    update_edges_from_events()
+    tenant = current()
+    if tenant.events.delete(event_id):
+        tenant.store.invalidate("events")
+        update_edges_from_events()
 
 def update_event(event_id: str, new_data: Dict[str, Any]):
     """
     Updates the event with the given ID using the provided data.
+    Only its shard is rewritten; a date change moves it between shards atomically.
     """
-    events = get_events()
-    updated = False
-    for i, e in enumerate(events):
-        if e['id'] == event_id:
-            events[i].update(new_data)
-            updated = True
-            break
-            
-    if updated:
-        save_json(EVENTS_FILE, events)
+    tenant = current()
+    if tenant.events.update(event_id, new_data):
+        tenant.store.invalidate("events")
         update_edges_from_events()
 
 def get_events_for_node(node_id: str) -> List[Dict[str, Any]]:
     """
     Retrieves all events involving a specific node, sorted by date (newest first).
     """
-    events = get_events()
     node_events = []
     
-    for e in events:
+    for e in iter_events():
         if node_id in e.get('related_nodes', []):
             node_events.append(e)
             
@@ -132,27 +493,41 @@ def get_events_for_node(node_id: str) -> List[Dict[str, Any]]:
     return node_events
 
 def get_edges() -> List[Dict[str, Any]]:
-    return load_json(EDGES_FILE)
+    """
+    All edges (shared dicts, like get_nodes).
+    """
+    return list(current().store.get("edges"))
+
+def get_edges_version() -> int:
+    """
+    Monotonic version of the edge store, for caches keyed on edges.
+    """
+    return current().store.version_of("edges")
 
 def add_edge(source: str, target: str, label: str = ""):
     """
     Manually creates or updates an edge between two nodes.
     """
-    if source == target: return
+    add_edges([(source, target, label)])
+
+def add_edges(links: List[Tuple[str, str, str]]):
+    """
+    Creates or relabels several (source, target, label) edges with one save,
+    e.g. when accepting connection suggestions in bulk.
+    """
+    links = [(tuple(sorted((s, t))), label) for s, t, label in links if s != t]
+    if not links:
+        return
     
-    edges = get_edges()
-    key_sorted = tuple(sorted((source, target)))
+    edges = [dict(e) for e in get_edges()] # private copy: edited in place below
+    index = {tuple(sorted((e['source'], e['target']))): e for e in edges}
     
-    found = False
-    for e in edges:
-        e_key = tuple(sorted((e['source'], e['target'])))
-        if e_key == key_sorted:
+    for key_sorted, label in links:
+        e = index.get(key_sorted)
+        if e is not None:
             e['relation_type'] = label
             # Optionally increment weight? For manual mapping, maybe not.
-            found = True
-            break
-    
-    if not found:
+            continue
         new_edge = {
             "source": key_sorted[0],
             "target": key_sorted[1],
@@ -161,8 +536,9 @@ def add_edge(source: str, target: str, label: str = ""):
             "relation_type": label
         }
         edges.append(new_edge)
+        index[key_sorted] = new_edge
         
-    save_json(EDGES_FILE, edges)
+    _save("edges", edges)
 
 def remove_edge(source: str, target: str):
     """
@@ -177,13 +553,13 @@ def remove_edge(source: str, target: str):
         if e_key != key_sorted:
             new_edges.append(e)
             
-    save_json(EDGES_FILE, new_edges)
+    _save("edges", new_edges)
 
 def update_edge_attribute(source: str, target: str, attr_key: str, attr_value: Any):
     """
     Manually updates an attribute (like label/relation_type) for a specific edge.
     """
-    edges = get_edges()
+    edges = [dict(e) for e in get_edges()] # private copy: edited in place below
     key_sorted = tuple(sorted((source, target)))
     
     updated = False
@@ -195,87 +571,58 @@ def update_edge_attribute(source: str, target: str, attr_key: str, attr_value: A
             break
             
     if updated:
-        save_json(EDGES_FILE, edges)
+        _save("edges", edges)
 
 def update_edges_from_events():
     """
-    Re-calculates edges. Preserves existing 'relation_type' if already set, 
-    unless new info overwrites it (not implemented here strictly, we keep old labels).
+    Re-calculates edges from event co-occurrence and saves them.
+    Preserves existing 'relation_type' labels, and keeps labelled manual edges
+    (from add_edge) that no event supports.
     """
-    events = get_events()
-    old_edges = {tuple(sorted((e['source'], e['target']))): e for e in get_edges()}
-    
-    edges_map = {} 
-    root_id = "root_me"
+    # Deferred: numpy is only needed when edges are rebuilt
+    from utils import graph_model
+
+    interner = current().interner()
+    events = [graph_model.Event.from_dict(e, interner) for e in iter_events()]
+    old_edges = graph_model.EdgeTable.from_dicts(get_edges(), interner)
     
-    for event in events:
-        participants = event.get("related_nodes", [])
-        date = event.get("date", "")
-        # Check if this event brought explicit relation info (custom structure)
-        # We might store relation info in the event in future iterations.
-        
-        # 1. Link Me to everyone
-        for p_id in participants:
-            if p_id == root_id: continue
-            
-            key = tuple(sorted((root_id, p_id)))
-            if key not in edges_map:
-                # Inherit old data if exists
-                old_data = old_edges.get(key, {})
-                edges_map[key] = {
-                    "source": key[0], 
-                    "target": key[1], 
-                    "weight": 0, 
-                    "last_interaction": "",
-                    "relation_type": old_data.get("relation_type", "")
-                }
-            
-            edges_map[key]["weight"] += 1
-            if date > edges_map[key]["last_interaction"]:
-                edges_map[key]["last_interaction"] = date
+    edges = graph_model.rebuild_edges(events, old_edges)
+    _save("edges", edges.to_dicts())
+    # The tooltip index follows the same events (only changed ones are patched)
+    _edge_event_index().sync(lambda: events, get_events_version())
 
-        # 2. Link participants
-        for p1, p2 in itertools.combinations(participants, 2):
-            if p1 == root_id or p2 == root_id: continue 
-            
-            key = tuple(sorted((p1, p2)))
-            if key not in edges_map:
-                 old_data = old_edges.get(key, {})
-                 edges_map[key] = {
-                     "source": key[0], 
-                     "target": key[1], 
-                     "weight": 0, 
-                     "last_interaction": "",
-                     "relation_type": old_data.get("relation_type", "")
-                 }
-            
-            edges_map[key]["weight"] += 1
-            if date > edges_map[key]["last_interaction"]:
-                edges_map[key]["last_interaction"] = date
+def _edge_event_index():
+    from utils.edge_events import EdgeEventIndex
+    tenant = current()
+    return tenant.index("edge_events", partial(EdgeEventIndex, tenant.interner()))
+
+def get_edge_events():
+    """
+    The latest-shared-event index of the current edges (see edge_events), for
+    edge tooltips.
+    """
+    from utils import graph_model
+
+    index = _edge_event_index()
+    index.sync(lambda: (graph_model.Event.from_dict(e, index.ids) for e in iter_events()), get_events_version())
+    return index
     
 def reset_database():
     """
     Factory reset: wipes all data and restores the initial state with just 'Me'.
     """
+    tenant = current()
     # 1. Delete files
-    for filepath in [NODES_FILE, EDGES_FILE, EVENTS_FILE]:
+    for filepath in [tenant.nodes_file, tenant.edges_file, tenant.events_file]:
         if os.path.exists(filepath):
             os.remove(filepath)
+    tenant.events.clear()
+    tenant.store.invalidate("events")
             
     # 2. Re-initialize Nodes with 'Me'
-    root_node = {
-        "id": "root_me",
-        "name": "Me",
-        "type": "person",
-        "description": "The center of the universe",
-        "created_at": str(datetime.date.today()),
-        "avatar_type": "color",
-        "avatar_value": "#2C3E50"
-    }
-    save_json(NODES_FILE, [root_node])
+    tenant.save("nodes", [_root_node()])
     
-    # 3. Re-initialize empty Edges and Events
-    save_json(EDGES_FILE, [])
-    save_json(EVENTS_FILE, [])
+    # 3. Re-initialize empty Edges (Events were cleared above)
+    tenant.save("edges", [])
     
-    return True
\ No newline at end of file
+    return True
@@ -0,0 +1,88 @@
+"""
+Latest shared memory per tie, for the Relationship view's edge tooltips.
+
+For every pair key an event implies (see graph_model.tie_keys) the index keeps
+the ids of the events behind it and the most recent one, so an edge's memory
+count and latest memory are a dict lookup. data_manager syncs it from the same
+event pass that recomputes edge weights; only events whose participants, date
+or title changed are patched, and a pair's latest event is only searched for
+again when that event is edited away or deleted.
+"""
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from utils.graph_model import Event, IdInterner, ids, tie_keys
+
+class EdgeEventIndex:
+    def __init__(self, interner: Optional[IdInterner] = None):
+        self.version = None
+        self.ids = ids if interner is None else interner # the one load_events' events are interned in
+        self._events: Dict[str, Tuple[Tuple[int, ...], int, str, str]] = {} # id -> (related, ordinal, date, title)
+        self._pairs: Dict[int, Set[str]] = {} # pair key -> ids of its events
+        self._latest: Dict[int, str] = {} # pair key -> id of its most recent event
+        self._lock = threading.Lock()
+
+    def _recency(self, event_id: str):
+        # Latest date wins; same-day (or undated) events are ordered by id
+        return (self._events[event_id][1], event_id)
+
+    def sync(self, load_events: Callable[[], Iterable[Event]], version=None):
+        """
+        Brings the index up to date with the events. With a version token, an
+        unchanged store costs nothing (load_events is not called).
+        """
+        with self._lock:
+            if version is not None and version == self.version:
+                return
+            seen = set()
+            stale: Set[int] = set() # pairs that lost their latest event
+            for event in load_events():
+                seen.add(event.id)
+                entry = (event.related, event.ordinal, event.date, event.title)
+                known = self._events.get(event.id)
+                if known == entry:
+                    continue
+                if known is not None:
+                    self._unlink(event.id, known[0], stale)
+                self._events[event.id] = entry
+                for key in tie_keys(event.related, self.ids):
+                    self._pairs.setdefault(key, set()).add(event.id)
+                    latest = self._latest.get(key)
+                    if key not in stale and (latest is None or self._recency(event.id) > self._recency(latest)):
+                        self._latest[key] = event.id
+            for event_id in [x for x in self._events if x not in seen]:
+                self._unlink(event_id, self._events.pop(event_id)[0], stale)
+            for key in stale:
+                members = self._pairs.get(key)
+                if members:
+                    self._latest[key] = max(members, key=self._recency)
+            self.version = version
+
+    def _unlink(self, event_id: str, related: Tuple[int, ...], stale: Set[int]):
+        for key in tie_keys(related, self.ids):
+            members = self._pairs[key]
+            members.discard(event_id)
+            if not members:
+                del self._pairs[key]
+            if self._latest.get(key) == event_id:
+                del self._latest[key]
+                stale.add(key)
+
+    def latest(self, a: str, b: str) -> Optional[Dict[str, Any]]:
+        """
+        The most recent memory shared by a and b, as a dict with event_id, title,
+        date and count (memories behind the tie); None for manual connections.
+        """
+        a_int, b_int = self.ids.get(a), self.ids.get(b)
+        if a_int < 0 or b_int < 0:
+            return None
+        key = (min(a_int, b_int) << 32) | max(a_int, b_int)
+        with self._lock:
+            event_id = self._latest.get(key)
+            if event_id is None:
+                return None
+            _, _, date, title = self._events[event_id]
+            return {"event_id": event_id, "title": title, "date": date, "count": len(self._pairs[key])}
+
+    def __len__(self):
+        return len(self._pairs)
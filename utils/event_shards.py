@@ -0,0 +1,436 @@
+"""
+Time-sharded event storage.
+
+Events are partitioned by date into shard files (one per month by default) under
+data/events/, described by a small manifest.json:
+
+    {"version": 2, "granularity": "month", "generation": 12,
+     "index": "index.9.json", "index_log": "index.10.log",
+     "index_log_bytes": 84, "index_log_entries": 3,
+     "shards": {"2019-03": {"file": "2019-03.7.json", "count": 4,
+                            "min_date": "2019-03-02", "max_date": "2019-03-30"}}}
+
+Every write produces new, generation-suffixed files for the shards it touches and
+then swaps the manifest with an atomic rename, so an edit rewrites one shard and a
+date change moves an event between two shards in a single commit. The id index
+(event id -> shard key) lets edits and deletes find the shard without scanning.
+It is a base file plus an append-only log of changes (one JSON object per line,
+a null key for a deleted id): adding, moving or deleting an event appends one
+line, and the manifest records how many bytes of the log are committed. The log
+is folded into a new base file once it outgrows half the index.
+
+Shard files are immutable once written (a change produces a new generation), so
+parsed shards are cached by file name and shared by every reader in the process.
+Cached events must be treated as read-only; writers copy before changing them.
+
+Writers to one root take turns: stores opened on the same root in a process share
+a lock, and each write also holds an exclusive lock on manifest.lock (where the
+platform has fcntl) so that other processes cannot commit the same generation.
+"""
+import contextlib
+import copy
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from utils import record_store
+
+try:
+    import fcntl
+except ImportError: # Windows: writers are only serialized within the process
+    fcntl = None
+
+MANIFEST_VERSION = 2
+GRANULARITIES = {"month": 7, "year": 4, "all": 0} # shard key = date[:n]
+UNDATED = "undated"
+SHARD_CACHE_EVENTS = 50_000 # parsed events kept in memory across all cached shards
+INDEX_LOG_MIN_ENTRIES = 1024 # id index log lines kept before folding them into a new base file
+LOCK_FILE = "manifest.lock" # held by the process committing a write
+
+_root_locks: Dict[str, threading.RLock] = {}
+_root_locks_guard = threading.Lock()
+
+def _root_lock(root: str) -> threading.RLock:
+    # One lock per store directory, shared by every EventShardStore opened on it
+    with _root_locks_guard:
+        return _root_locks.setdefault(os.path.realpath(root), threading.RLock())
+
+def _apply_delta(index: Dict[str, str], delta: Dict[str, Optional[str]]) -> Dict[str, str]:
+    for event_id, key in delta.items():
+        if key is None:
+            index.pop(event_id, None)
+        else:
+            index[event_id] = key
+    return index
+
+class EventShardStore:
+    def __init__(self, root: str, granularity: str = "month", ext: str = ".json",
+                 legacy_file: Optional[str] = None, fsync: bool = False):
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"unknown shard granularity: {granularity}")
+        self.root = root
+        self.granularity = granularity
+        self.ext = ext
+        self.legacy_file = legacy_file
+        self.fsync = fsync # fsync shards and manifest before each commit point
+        self.manifest_path = os.path.join(root, "manifest.json")
+        self._lock = _root_lock(root)
+        self._manifest = None
+        self._manifest_mtime = None
+        self._index = None
+        self._index_state = None # (base file, log file, committed log bytes) self._index reflects
+        self._cache: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        self._cached_events = 0
+
+    # --- Manifest ---
+
+    def shard_key(self, date: str) -> str:
+        width = GRANULARITIES[self.granularity]
+        if not width:
+            return "all"
+        if not date or len(date) < width:
+            return UNDATED
+        return date[:width]
+
+    def _empty_manifest(self) -> Dict[str, Any]:
+        return {"version": MANIFEST_VERSION, "granularity": self.granularity,
+                "generation": 0, "index": None, "index_log": None, "index_log_bytes": 0,
+                "index_log_entries": 0, "shards": {}}
+
+    def manifest(self) -> Dict[str, Any]:
+        """
+        The current manifest, re-read only when the file changed on disk.
+        """
+        with self._lock:
+            try:
+                mtime = os.stat(self.manifest_path).st_mtime_ns
+            except FileNotFoundError:
+                if self._manifest is None or self._manifest_mtime is not None:
+                    # First use, or the store was deleted under us
+                    self._drop_cache()
+                    self._manifest, self._manifest_mtime = None, None
+                    self._manifest = self._import_legacy()
+                return self._manifest
+            if mtime != self._manifest_mtime:
+                with open(self.manifest_path, encoding="utf-8") as f:
+                    manifest = json.load(f)
+                if manifest.get("version", 0) > MANIFEST_VERSION:
+                    raise record_store.RecordFormatError("event manifest is newer than supported")
+                if self._manifest is not None and manifest["generation"] <= self._manifest["generation"] \
+                        and manifest != self._manifest:
+                    # Generations restarted (store recreated): file names may be reused
+                    self._drop_cache()
+                self._manifest = manifest
+                self._manifest_mtime = mtime
+                if manifest.get("granularity") != self.granularity:
+                    self._reshard(manifest)
+            return self._manifest
+
+    def _read_file(self, info) -> List[Dict[str, Any]]:
+        return list(record_store.iter_records(os.path.join(self.root, info["file"])))
+
+    def _drop_cache(self):
+        self._cache.clear()
+        self._cached_events = 0
+
+    def cached_shards(self) -> List[List[Dict[str, Any]]]:
+        """
+        The shards currently held in memory (for memory accounting).
+        """
+        with self._lock:
+            return list(self._cache.values())
+
+    def reload(self):
+        """
+        Forgets the manifest, id index and cached shards (files were replaced externally).
+        """
+        with self._lock:
+            self._drop_cache()
+            self._manifest, self._manifest_mtime = None, None
+            self._index, self._index_state = None, None
+
+    def _read_cached(self, info) -> List[Dict[str, Any]]:
+        name = info["file"]
+        with self._lock:
+            shard = self._cache.get(name)
+            if shard is not None:
+                self._cache.move_to_end(name)
+                return shard
+        shard = self._read_file(info)
+        with self._lock:
+            if name not in self._cache:
+                self._cache[name] = shard
+                self._cached_events += len(shard)
+                while self._cached_events > SHARD_CACHE_EVENTS and len(self._cache) > 1:
+                    _, old = self._cache.popitem(last=False)
+                    self._cached_events -= len(old)
+        return shard
+
+    def _reshard(self, manifest):
+        # The configured granularity changed: regroup everything in one commit
+        grouped: Dict[str, List[Dict[str, Any]]] = {k: [] for k in manifest["shards"]}
+        for info in manifest["shards"].values():
+            for e in self._read_file(info):
+                grouped.setdefault(self.shard_key(e.get("date", "")), []).append(e)
+        index = {e["id"]: k for k, group in grouped.items() for e in group}
+        self._commit(manifest, grouped, index)
+
+    def _import_legacy(self) -> Dict[str, Any]:
+        # One-time migration from the single events file
+        manifest = self._empty_manifest()
+        if self.legacy_file and os.path.exists(self.legacy_file):
+            events = list(record_store.iter_records(self.legacy_file))
+            if events:
+                grouped: Dict[str, List[Dict[str, Any]]] = {}
+                for e in events:
+                    grouped.setdefault(self.shard_key(e.get("date", "")), []).append(e)
+                index = {e["id"]: k for k, group in grouped.items() for e in group}
+                return self._commit(manifest, grouped, index)
+        return manifest
+
+    @contextlib.contextmanager
+    def _writing(self):
+        """
+        Holds the write lock of the root (in and across processes) and re-reads the
+        manifest, which another writer may have replaced within the same mtime tick.
+        """
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            with open(os.path.join(self.root, LOCK_FILE), "a") as f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX) # released when the file is closed
+                self._manifest_mtime = None
+                yield
+
+    def _commit(self, manifest, changed: Dict[str, List[Dict[str, Any]]],
+                index: Optional[Dict[str, str]], delta: Optional[Dict[str, Optional[str]]] = None) -> Dict[str, Any]:
+        """
+        Writes changed shards as new files, then swaps the manifest. index replaces
+        the id index; delta (id -> shard key, None when deleted) is appended to its log.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        generation = manifest["generation"] + 1
+        new = dict(manifest, generation=generation, granularity=self.granularity,
+                   shards=dict(manifest["shards"]), version=MANIFEST_VERSION)
+        if delta:
+            current = self._id_index()
+            if manifest.get("index_log_entries", 0) >= max(INDEX_LOG_MIN_ENTRIES, len(current) // 2):
+                # Fold the log into a new base file
+                index = _apply_delta(dict(current), delta)
+        for key, events in changed.items():
+            new["shards"].pop(key, None)
+            if not events:
+                continue
+            filename = f"{key}.{generation}{self.ext}"
+            record_store.save_records(os.path.join(self.root, filename), events, fsync=self.fsync)
+            dates = [e.get("date", "") for e in events]
+            new["shards"][key] = {"file": filename, "count": len(events),
+                                  "min_date": min(dates), "max_date": max(dates)}
+        if index is not None:
+            new["index"] = f"index.{generation}.json"
+            record_store.save_records(os.path.join(self.root, new["index"]), [index], fsync=self.fsync)
+            new.update(index_log=None, index_log_bytes=0, index_log_entries=0)
+        elif delta:
+            new.update(self._append_index_log(manifest, generation, delta))
+
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(new, f, ensure_ascii=False, indent=2)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path) # commit point
+
+        self._manifest = new
+        self._manifest_mtime = os.stat(self.manifest_path).st_mtime_ns
+        if index is not None:
+            self._index = index
+        elif delta:
+            _apply_delta(self._index, delta)
+        if index is not None or delta:
+            self._index_state = (new["index"], new["index_log"], new["index_log_bytes"])
+        self._collect_garbage(new)
+        return new
+
+    def _append_index_log(self, manifest, generation: int, delta: Dict[str, Optional[str]]) -> Dict[str, Any]:
+        name = manifest.get("index_log") or f"index.{generation}.log"
+        committed = manifest.get("index_log_bytes", 0) if manifest.get("index_log") else 0
+        line = (json.dumps(delta, ensure_ascii=False) + "\n").encode("utf-8")
+        with open(os.path.join(self.root, name), "a+b") as f:
+            # Drop a tail left by a write that failed before its manifest swap
+            f.truncate(committed)
+            f.write(line)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        return {"index_log": name, "index_log_bytes": committed + len(line),
+                "index_log_entries": manifest.get("index_log_entries", 0) + 1}
+
+    def _collect_garbage(self, manifest):
+        live = {s["file"] for s in manifest["shards"].values()}
+        live.update([manifest["index"], manifest.get("index_log"), os.path.basename(self.manifest_path), LOCK_FILE])
+        for name in [n for n in self._cache if n not in live]:
+            self._cached_events -= len(self._cache.pop(name))
+        for name in os.listdir(self.root):
+            if name not in live and not name.endswith(".tmp"):
+                try:
+                    os.remove(os.path.join(self.root, name))
+                except OSError:
+                    pass
+
+    def _id_index(self) -> Dict[str, str]:
+        manifest = self.manifest()
+        state = (manifest["index"], manifest.get("index_log"), manifest.get("index_log_bytes", 0))
+        if self._index is None or self._index_state != state:
+            known = self._index_state
+            if self._index is not None and known[:2] == state[:2] and known[2] <= state[2]:
+                # Same base and log: only read the lines appended since
+                index, start = self._index, known[2]
+            else:
+                index, start = {}, 0
+                if manifest["index"]:
+                    index = next(record_store.iter_records(os.path.join(self.root, manifest["index"])), {})
+            if state[1]:
+                with open(os.path.join(self.root, state[1]), "rb") as f:
+                    f.seek(start)
+                    for line in f.read(state[2] - start).splitlines():
+                        _apply_delta(index, json.loads(line))
+            self._index, self._index_state = index, state
+        return self._index
+
+    # --- Reads ---
+
+    def keys(self) -> List[str]:
+        # Chronological; undated events sort before everything, like '' dates do
+        return sorted(self.manifest()["shards"], key=lambda k: (k != UNDATED, k))
+
+    def read_shard(self, key: str) -> List[Dict[str, Any]]:
+        """
+        The events of one shard (shared, read-only; copy before modifying).
+        """
+        for _ in range(2):
+            info = self.manifest()["shards"].get(key)
+            if info is None:
+                return []
+            try:
+                return self._read_cached(info)
+            except FileNotFoundError:
+                # Superseded by a concurrent write; retry against the new manifest
+                self._manifest_mtime = None
+        return []
+
+    def iter_events(self, keys: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily chains shards (oldest first); a shard is opened only when reached.
+        """
+        for key in (self.keys() if keys is None else keys):
+            yield from self.read_shard(key)
+
+    def iter_desc(self) -> Iterator[Dict[str, Any]]:
+        """
+        Events by date, newest first, opening one shard at a time.
+        """
+        for key in reversed(self.keys()):
+            yield from sorted(self.read_shard(key), key=lambda x: x.get('date', ''), reverse=True)
+
+    def iter_range(self, start: str = "", end: str = "") -> Iterator[Dict[str, Any]]:
+        """
+        Events with start <= date <= end (ISO strings, either bound optional),
+        reading only shards whose date span overlaps the range.
+        """
+        shards = self.manifest()["shards"]
+        for key in self.keys():
+            info = shards[key]
+            if (end and info["min_date"] > end) or (start and info["max_date"] < start):
+                continue
+            for e in self.read_shard(key):
+                date = e.get("date", "")
+                if (not start or date >= start) and (not end or date <= end):
+                    yield e
+
+    def get(self, event_id: str) -> Optional[Dict[str, Any]]:
+        """
+        One event by id, reading only its shard.
+        """
+        key = self._id_index().get(event_id)
+        if key is None:
+            return None
+        return next((e for e in self.read_shard(key) if e["id"] == event_id), None)
+
+    def count(self) -> int:
+        return sum(s["count"] for s in self.manifest()["shards"].values())
+
+    # --- Writes ---
+
+    def add(self, event: Dict[str, Any]):
+        with self._writing():
+            manifest = self.manifest()
+            key = self.shard_key(event.get("date", ""))
+            self._commit(manifest, {key: self.read_shard(key) + [event]}, None, {event["id"]: key})
+
+    def update(self, event_id: str, new_data: Dict[str, Any]) -> bool:
+        """
+        Updates one event in place; if its date moves to another shard, both shards
+        are rewritten in the same commit.
+        """
+        with self._writing():
+            manifest = self.manifest()
+            old_key = self._id_index().get(event_id)
+            if old_key is None:
+                return False
+            old_shard = list(self.read_shard(old_key))
+            pos = next((i for i, e in enumerate(old_shard) if e["id"] == event_id), None)
+            if pos is None:
+                return False
+            event = dict(old_shard[pos], **new_data)
+            new_key = self.shard_key(event.get("date", ""))
+            if new_key == old_key:
+                old_shard[pos] = event
+                self._commit(manifest, {old_key: old_shard}, None)
+            else:
+                del old_shard[pos]
+                self._commit(manifest, {old_key: old_shard, new_key: self.read_shard(new_key) + [event]}, None,
+                             {event_id: new_key})
+            return True
+
+    def delete(self, event_id: str) -> bool:
+        with self._writing():
+            manifest = self.manifest()
+            key = self._id_index().get(event_id)
+            if key is None:
+                return False
+            shard = [e for e in self.read_shard(key) if e["id"] != event_id]
+            self._commit(manifest, {key: shard}, None, {event_id: None})
+            return True
+
+    def update_many(self, fn: Callable[[Dict[str, Any]], bool], keys: Optional[List[str]] = None) -> int:
+        """
+        Applies fn to every event (fn mutates and returns True if it changed anything).
+        Only shards with changes are rewritten. Dates must not change here.
+        """
+        with self._writing():
+            manifest = self.manifest()
+            changed = {}
+            for key in (self.keys() if keys is None else keys):
+                shard = copy.deepcopy(self.read_shard(key))
+                if sum(1 for e in shard if fn(e)):
+                    changed[key] = shard
+            if changed:
+                self._commit(manifest, changed, None)
+            return len(changed)
+
+    def rewrite(self, ext: Optional[str] = None):
+        """
+        Rewrites every shard, e.g. to switch the record format.
+        """
+        with self._writing():
+            if ext:
+                self.ext = ext
+            manifest = self.manifest()
+            self._commit(manifest, {k: self.read_shard(k) for k in self.keys()}, dict(self._id_index()))
+
+    def clear(self):
+        with self._writing():
+            self._commit(self.manifest(), {k: [] for k in self.keys()}, {})
@@ -0,0 +1,69 @@
+"""
+Visual pre-matching of detected faces against the avatars of known people.
+
+All avatars under assets/avatars are kept in a perceptual-hash index
+(data/avatar_hashes.json, one per tenant, refreshed from the directory on first
+use and updated whenever an avatar is saved). A new face crop whose hashes are very close to
+exactly one person's avatar is a strong match and can be pre-selected without
+asking the model; anything else is left to the LLM.
+"""
+import os
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+from utils import data_manager, media_store
+from utils.perceptual_hash import HashIndex, hashes
+
+INDEX_FILE = "avatar_hashes.json" # in the tenant's data dir
+STRONG_MATCH_BITS = 8 # mean pHash/dHash distance (of 64) for a confident match
+SEARCH_RADIUS_BITS = 16 # pHash distance for candidates worth comparing
+MIN_MARGIN_BITS = 4 # the runner-up must be at least this much further away
+
+_lock = threading.Lock()
+
+def _avatar_files() -> Dict[str, str]:
+    avatar_dir = media_store.avatar_dir()
+    if not os.path.isdir(avatar_dir):
+        return {}
+    return {name[:-4]: os.path.join(avatar_dir, name)
+            for name in os.listdir(avatar_dir) if name.endswith(".png")}
+
+def _open_index() -> HashIndex:
+    index = HashIndex(os.path.join(data_manager.current().data_dir, INDEX_FILE))
+    index.sync(_avatar_files())
+    return index
+
+def get_index() -> HashIndex:
+    """
+    The current tenant's avatar index.
+    """
+    with _lock:
+        return data_manager.current().index("face_index", _open_index)
+
+def avatar_saved(node_id: str):
+    """
+    Call after writing assets/avatars/<node_id>.png.
+    """
+    get_index().add(node_id, media_store.avatar_path(node_id))
+
+def match_face(face_path: str, candidate_ids: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """
+    Looks up a face crop among the avatars (optionally only those of candidate_ids).
+    Returns {"strong": bool, "node_id", "distance", "candidates": [(node_id, distance)]}.
+    """
+    result = {"strong": False, "node_id": None, "distance": None, "candidates": []}
+    try:
+        p, d = hashes(face_path)
+    except Exception:
+        return result
+    allowed = set(candidate_ids) if candidate_ids is not None else None
+    hits = [(dist, e["key"]) for dist, e in get_index().search(p, SEARCH_RADIUS_BITS, d)
+            if allowed is None or e["key"] in allowed]
+    result["candidates"] = [(key, dist) for dist, key in hits]
+    if hits:
+        best_dist, best_id = hits[0]
+        runner_up = hits[1][0] if len(hits) > 1 else None
+        result["node_id"], result["distance"] = best_id, best_dist
+        result["strong"] = best_dist <= STRONG_MATCH_BITS and (
+            runner_up is None or runner_up - best_dist >= MIN_MARGIN_BITS)
+    return result
@@ -0,0 +1,189 @@
+"""
+Local HTTP server speaking the DashScope API, backed by FakeModelClient.
+
+The real SDK (and so DashScopeClient and ResilientClient over it) can be
+pointed at it to exercise the network path offline: connection pooling,
+streaming (server-sent events), timeouts and error statuses. Besides the fake
+client's own latency and injected faults, optional server-side limits return
+429 Throttling.RateQuota when requests exceed `rate` per second or
+`concurrency` at once, like the real quota. Local images are accepted through
+a stand-in for the SDK's upload step.
+
+    python -m utils.fake_model_server [--port 8089] [--rate 10] [--concurrency 4]
+    DASHSCOPE_HTTP_BASE_URL=http://127.0.0.1:8089/api/v1 DASHSCOPE_API_KEY=x streamlit run serve.py
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+from utils.model_client import FakeModelClient, LatencyModel
+
+def _payload(response) -> Dict[str, Any]:
+    choices = [{"finish_reason": c.finish_reason, "message": {"role": c.message.role, "content": c.message.content}}
+               for c in response.output.choices]
+    return {"output": {"choices": choices}, "usage": {}, "request_id": uuid.uuid4().hex}
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive, so client connection reuse shows up in stats
+
+    def setup(self):
+        super().setup()
+        self.server.count("connections")
+
+    def log_message(self, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            pass # the client gave up (e.g. timed out)
+
+    def _json(self, status: int, data: Dict[str, Any]):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status: int, code: str, message: str):
+        self._json(status, {"code": code, "message": message, "request_id": uuid.uuid4().hex})
+
+    def _chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        # Upload policy: uploads go back to this server
+        query = parse_qs(urlparse(self.path).query)
+        if query.get("action") != ["getPolicy"]:
+            return self._error(404, "NotFound", self.path)
+        host, port = self.server.server_address[:2]
+        self._json(200, {"request_id": uuid.uuid4().hex, "data": {
+            "policy": "fake", "signature": "fake", "upload_dir": "fake", "upload_host": f"http://{host}:{port}/upload",
+            "oss_access_key_id": "fake", "x_oss_object_acl": "private", "x_oss_forbid_overwrite": "true"}})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        path = urlparse(self.path).path
+        if path == "/upload":
+            return self._json(200, {})
+        if not path.endswith("/generation"):
+            return self._error(404, "NotFound", path)
+        server = self.server
+        server.count("requests")
+        if not server.admit():
+            server.count("throttled")
+            return self._error(429, "Throttling.RateQuota", "Requests rate limit exceeded")
+        try:
+            reply = self._generate(json.loads(body), "multimodal-generation" in path,
+                                   self.headers.get("X-DashScope-SSE") == "enable")
+        finally:
+            server.release()
+        if reply is not None:
+            reply()
+
+    def _generate(self, request: Dict[str, Any], multimodal: bool, stream: bool):
+        # A plain answer is returned to be sent after its slot is released (the client
+        # may send its next request as soon as it reads it); a stream is sent here
+        fake = self.server.fake
+        data = request.get("input", {})
+        if multimodal:
+            responses = fake.multimodal_stream(request["model"], data["messages"])
+        else:
+            prompt = data.get("prompt") or data["messages"][-1]["content"]
+            responses = fake.generation_stream(request["model"], prompt)
+        first = next(responses)
+        if first.status_code != 200:
+            self.server.count("faults")
+            return lambda: self._error(first.status_code, first.code, first.message)
+        if not stream:
+            # One answer: join the chunks
+            content = first.output.choices[0].message.content
+            for part in responses:
+                content = content + part.output.choices[0].message.content
+            first.output.choices[0].message.content = content
+            return lambda: self._json(200, _payload(first))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream;charset=UTF-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, response in enumerate(_chain(first, responses), 1):
+            event = f"id:{i}\nevent:result\n:HTTP_STATUS/200\ndata:{json.dumps(_payload(response), ensure_ascii=False)}\n\n"
+            self._chunk(event.encode("utf-8"))
+        self._chunk(b"")
+        return None
+
+def _chain(first, rest):
+    yield first
+    yield from rest
+
+class FakeModelServer(ThreadingHTTPServer):
+    """
+    The server; start() serves from a daemon thread and returns the base URL
+    for DASHSCOPE_HTTP_BASE_URL / dashscope.base_http_api_url.
+    """
+    daemon_threads = True
+
+    def __init__(self, fake: Optional[FakeModelClient] = None, port: int = 0,
+                 rate: Optional[float] = None, concurrency: Optional[int] = None):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.fake = fake or FakeModelClient()
+        self.rate = rate
+        self.concurrency = concurrency
+        self.stats = {"connections": 0, "requests": 0, "throttled": 0, "faults": 0}
+        self._active = 0
+        self._window = [] # admission times within the last second
+        self._lock = threading.Lock()
+
+    def count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def admit(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._window = [t for t in self._window if now - t < 1.0]
+            if (self.rate is not None and len(self._window) >= self.rate) or \
+                    (self.concurrency is not None and self._active >= self.concurrency):
+                self._active += 1 # released like any other request
+                return False
+            self._window.append(now)
+            self._active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._active -= 1
+
+    def start(self) -> str:
+        threading.Thread(target=self.serve_forever, name="fake-model-server", daemon=True).start()
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/api/v1"
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--rate", type=float, default=None, help="requests per second before 429s")
+    parser.add_argument("--concurrency", type=int, default=None, help="requests at once before 429s")
+    parser.add_argument("--latency", default="lognormal:0.8,0.5")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    fake = FakeModelClient(seed=args.seed, latency=LatencyModel.parse(args.latency), error_rate=args.error_rate)
+    server = FakeModelServer(fake, args.port, args.rate, args.concurrency)
+    host, port = server.server_address[:2]
+    print(f"DASHSCOPE_HTTP_BASE_URL=http://{host}:{port}/api/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
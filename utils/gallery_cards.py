@@ -0,0 +1,150 @@
+"""
+Materialized read model for the Memory Gallery.
+
+A card is everything a gallery tile shows, resolved once: title, date,
+participant names, image paths and a content snippet. Cards are built per event
+shard (see event_shards), newest first within it like iter_desc, and only for
+the shards a page reaches. Shard files are immutable and renamed on every write,
+so after an event change only the shards whose file name moved are rebuilt; a
+node rename patches the names on the cards that mention that node. A page is a
+walk over shard counts plus a slice, without reading events or node lists.
+
+Image URLs are resolved (and published by media_server) when a page is built,
+not cached on the cards: MEDIA_DIR may be emptied at any time, and a lookup per
+shown image is a stat. Cards are shared by every session of the tenant: treat
+them as read-only.
+"""
+import os
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from utils import media_server
+from utils.event_shards import UNDATED, EventShardStore
+
+SNIPPET_CHARS = 280 # of journal text on a card; the rest is read on demand
+THUMB_WIDTH = 480 # px, the gallery's image width
+ROOT_ID = "root_me" # every memory is Me's; not listed as a participant
+
+def _snippet(content: str) -> Tuple[str, bool]:
+    text = " ".join((content or "").split())
+    if len(text) <= SNIPPET_CHARS:
+        return text, False
+    cut = text.rfind(" ", 0, SNIPPET_CHARS)
+    return text[:cut if cut > SNIPPET_CHARS // 2 else SNIPPET_CHARS].rstrip() + "…", True
+
+def _image_src(path: str) -> Optional[str]:
+    # The immutable thumbnail URL when served; the path itself otherwise (None if missing)
+    url = media_server.url(path, THUMB_WIDTH)
+    if url:
+        return url
+    return path if path and os.path.exists(path) else None
+
+def _with_images(card: Dict[str, Any]) -> Dict[str, Any]:
+    images = [src for src in (_image_src(p) for p in card["image_paths"]) if src]
+    return dict(card, thumbnail=images[0] if images else None, images=images)
+
+class GalleryCards:
+    def __init__(self):
+        self.versions = (None, None)
+        self._store: Optional[EventShardStore] = None
+        self._shard_info: Dict[str, Dict[str, Any]] = {} # shard key -> manifest entry
+        self._cards: Dict[str, Tuple[str, List[Dict[str, Any]]]] = {} # shard key -> (file, cards)
+        self._names: Dict[str, str] = {} # node id -> name
+        self._by_node: Dict[str, Set[str]] = {} # node id -> shard keys with cards naming it
+        self._lock = threading.Lock()
+
+    def sync(self, store: EventShardStore, load_nodes: Callable[[], Iterable[Dict[str, Any]]],
+             events_version=None, nodes_version=None):
+        """
+        Brings the cards up to date with the event and node stores. With version
+        tokens, an unchanged store costs nothing (nothing is read).
+        """
+        with self._lock:
+            if store is not self._store:
+                # Another event store (e.g. a different tenant's): start over
+                self.versions = (None, None)
+                self._store, self._cards, self._by_node = store, {}, {}
+            if nodes_version is None or nodes_version != self.versions[1]:
+                self._apply_names({n["id"]: n.get("name", "") for n in load_nodes()})
+            if events_version is None or events_version != self.versions[0]:
+                self._shard_info = dict(store.manifest()["shards"])
+                for key in [k for k, (file, _) in self._cards.items()
+                            if self._shard_info.get(k, {}).get("file") != file]:
+                    del self._cards[key]
+            self.versions = (events_version, nodes_version)
+
+    def _apply_names(self, names: Dict[str, str]):
+        renamed = [i for i in set(names) | set(self._names) if names.get(i) != self._names.get(i)]
+        self._names = names
+        for node_id in renamed:
+            for key in self._by_node.pop(node_id, ()):
+                if key not in self._cards:
+                    continue
+                cards = self._cards[key][1]
+                for i, card in enumerate(cards):
+                    if node_id in card["related_nodes"]:
+                        # A new dict: a page being rendered keeps the card it got
+                        cards[i] = dict(card, participants=self._participants(card["related_nodes"]))
+                if node_id in names:
+                    self._by_node.setdefault(node_id, set()).add(key)
+
+    def _participants(self, related: List[str]) -> List[str]:
+        return [self._names[p] for p in related if p != ROOT_ID and p in self._names]
+
+    def _card(self, e: Dict[str, Any]) -> Dict[str, Any]:
+        related = [p for p in e.get("related_nodes", ()) if p != ROOT_ID]
+        snippet, truncated = _snippet(e.get("content", ""))
+        return {"id": e["id"], "title": e.get("title") or "Untitled Memory", "date": e.get("date", ""),
+                "participants": self._participants(related), "related_nodes": related,
+                "image_paths": list(e.get("images", ())), "snippet": snippet, "truncated": truncated}
+
+    def _shard_cards(self, key: str) -> List[Dict[str, Any]]:
+        cached = self._cards.get(key)
+        if cached is not None:
+            return cached[1]
+        file = self._shard_info[key]["file"]
+        events = sorted(self._store.read_shard(key), key=lambda x: x.get('date', ''), reverse=True)
+        cards = [self._card(e) for e in events]
+        self._cards[key] = (file, cards)
+        for card in cards:
+            for node_id in card["related_nodes"]:
+                self._by_node.setdefault(node_id, set()).add(key)
+        return cards
+
+    def count(self) -> int:
+        with self._lock:
+            return sum(info["count"] for info in self._shard_info.values())
+
+    def page(self, offset: int = 0, limit: int = 24) -> List[Dict[str, Any]]:
+        """
+        Cards offset..offset+limit by date, newest first (undated memories last),
+        with their image URLs (thumbnail first) resolved. Shards before the page
+        are skipped by their counts.
+        """
+        with self._lock:
+            keys = sorted(self._shard_info, key=lambda k: (k != UNDATED, k), reverse=True)
+            out: List[Dict[str, Any]] = []
+            for key in keys:
+                if len(out) >= limit:
+                    break
+                count = self._shard_info[key]["count"]
+                if offset >= count:
+                    offset -= count
+                    continue
+                cards = self._shard_cards(key)
+                out.extend(cards[offset:offset + limit - len(out)])
+                offset = 0
+        return [_with_images(card) for card in out]
+
+# --- Process-wide read model ---
+
+_cards = GalleryCards()
+
+def get_gallery(store: EventShardStore, load_nodes: Callable[[], Iterable[Dict[str, Any]]],
+                events_version=None, nodes_version=None, tenant=None) -> GalleryCards:
+    """
+    The synced read model: the process-wide one, or a data_manager tenant store's own.
+    """
+    cards = _cards if tenant is None else tenant.index("gallery_cards", GalleryCards)
+    cards.sync(store, load_nodes, events_version, nodes_version)
+    return cards
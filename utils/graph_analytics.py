@@ -0,0 +1,350 @@
+"""
+Cached graph analytics over the edge data: weighted degree, centrality (weighted
+PageRank), mutual neighbors, "how do I know X" connection paths and the k-hop
+neighborhoods the Relationship view is centered on.
+
+One engine per process is kept in sync with the edge store. When edges change, only
+the affected cached results are dropped:
+- mutual-neighbor sets involving an endpoint of an added/removed edge,
+- BFS trees that an added edge could shorten or a removed edge was part of,
+- neighborhoods with a changed edge leaving one of their inner layers,
+- weight-only changes keep paths and neighbor sets and just refresh the scores;
+PageRank restarts from the previous vector, so it converges in a few iterations.
+"""
+import threading
+from collections import OrderedDict
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.graph_model import CSRAdjacency, EdgeTable, IdInterner, ROOT_ID, ids
+
+MUTUAL_CACHE_SIZE = 4096
+BFS_CACHE_SIZE = 64
+NEIGHBORHOOD_CACHE_SIZE = 256 # cached (center, layer cap) BFS layer lists
+LAYER_NODE_CAP = 40 # nodes per layer in the centered Relationship view
+PAGERANK_DAMPING = 0.85
+PAGERANK_TOL = 1e-6
+
+class GraphAnalytics:
+    def __init__(self, interner: Optional[IdInterner] = None):
+        self.version = None
+        self.ids = ids if interner is None else interner
+        self.edges = EdgeTable.from_dicts([], self.ids)
+        self.adj = CSRAdjacency.from_table(self.edges)
+        self._lock = threading.RLock()
+        self._wdeg: Optional[np.ndarray] = None
+        self._pagerank: Optional[np.ndarray] = None
+        self._pagerank_warm: Optional[np.ndarray] = None
+        self._mutual: "OrderedDict[Tuple[int, int], np.ndarray]" = OrderedDict()
+        self._bfs: "OrderedDict[int, Tuple[np.ndarray, np.ndarray]]" = OrderedDict()
+        self._layers: "OrderedDict[Tuple[int, Optional[int]], List[np.ndarray]]" = OrderedDict()
+
+    # --- Sync & invalidation ---
+
+    def sync(self, edges_data: List[Dict[str, Any]], version=None):
+        """
+        Brings the engine up to date with edges_data. With a version token (e.g. the
+        edge store's version), an unchanged store costs nothing.
+        """
+        with self._lock:
+            if version is not None and version == self.version:
+                return
+            new = EdgeTable.from_dicts(edges_data, self.ids)
+            self._apply(new)
+            self.version = version
+
+    def _apply(self, new: EdgeTable):
+        old_keys, new_keys = self.edges.keys(), new.keys()
+        added = new_keys[~np.isin(new_keys, old_keys)]
+        removed = old_keys[~np.isin(old_keys, new_keys)]
+        _, i_old, i_new = np.intersect1d(old_keys, new_keys, return_indices=True)
+        reweighted = old_keys[i_old][self.edges.weight[i_old] != new.weight[i_new]]
+
+        self.edges = new
+        self.adj = CSRAdjacency.from_table(new)
+        if not len(added) and not len(removed) and not len(reweighted):
+            return
+        self._drop_neighborhoods(np.concatenate([added, removed]), reweighted)
+
+        # Scores depend on every weight; recompute lazily (PageRank warm-started)
+        if self._pagerank is not None:
+            self._pagerank_warm = self._pagerank
+        self._wdeg = None
+        self._pagerank = None
+        if not len(added) and not len(removed):
+            return
+
+        touched = np.unique(np.concatenate([added >> 32, added & 0xFFFFFFFF,
+                                            removed >> 32, removed & 0xFFFFFFFF]))
+        touched_set = set(touched.tolist())
+        for pair in [p for p in self._mutual if p[0] in touched_set or p[1] in touched_set]:
+            del self._mutual[pair]
+
+        for source in list(self._bfs):
+            dist, parent = self._bfs[source]
+            if not _tree_survives(dist, parent, added, removed):
+                del self._bfs[source]
+
+    # --- Scores ---
+
+    def weighted_degrees(self) -> np.ndarray:
+        with self._lock:
+            if self._wdeg is None:
+                self._wdeg = self.adj.weighted_degree()
+            return self._wdeg
+
+    def weighted_degree(self, node_id: str) -> float:
+        i = self.ids.get(node_id)
+        wdeg = self.weighted_degrees()
+        return float(wdeg[i]) if 0 <= i < len(wdeg) else 0.0
+
+    def centrality_scores(self) -> np.ndarray:
+        """
+        Weighted PageRank over the interned node ints.
+        """
+        with self._lock:
+            if self._pagerank is None:
+                self._pagerank = self._compute_pagerank()
+            return self._pagerank
+
+    def _compute_pagerank(self, max_iter: int = 100) -> np.ndarray:
+        adj = self.adj
+        n = adj.n
+        if n == 0:
+            return np.zeros(0)
+        wdeg = self.weighted_degrees()
+        rows = np.repeat(np.arange(n), adj.degree())
+        # Transition probability along each CSR entry
+        share = adj.weights / np.where(wdeg[rows] > 0, wdeg[rows], 1)
+        dangling = wdeg == 0
+
+        x = np.full(n, 1.0 / n)
+        warm = self._pagerank_warm
+        if warm is not None and len(warm) <= n and warm.sum() > 0:
+            x[:len(warm)] = warm
+            x /= x.sum()
+        for _ in range(max_iter):
+            spread = np.bincount(adj.neighbors, weights=x[rows] * share, minlength=n)
+            new = (1 - PAGERANK_DAMPING) / n + PAGERANK_DAMPING * (spread + x[dangling].sum() / n)
+            done = np.abs(new - x).sum() < PAGERANK_TOL
+            x = new
+            if done:
+                break
+        self._pagerank_warm = None
+        return x
+
+    def centrality(self, node_id: str) -> float:
+        i = self.ids.get(node_id)
+        scores = self.centrality_scores()
+        return float(scores[i]) if 0 <= i < len(scores) else 0.0
+
+    def centrality_rank(self, node_id: str, among: Optional[List[str]] = None) -> Tuple[int, int]:
+        """
+        1-based rank of node_id by centrality among the given node ids (default: all
+        nodes with edges), and the size of that group.
+        """
+        scores = self.centrality_scores()
+        if among is None:
+            pool = np.flatnonzero(self.adj.degree() > 0)
+        else:
+            pool = np.array([i for i in (self.ids.get(x) for x in among) if 0 <= i < len(scores)], dtype=np.int64)
+        me = self.centrality(node_id)
+        return int((scores[pool] > me).sum()) + 1, len(pool)
+
+    # --- Neighborhoods & paths ---
+
+    def mutual_neighbors(self, a_id: str, b_id: str) -> List[str]:
+        a, b = self.ids.get(a_id), self.ids.get(b_id)
+        if a < 0 or b < 0:
+            return []
+        key = (min(a, b), max(a, b))
+        with self._lock:
+            hit = self._mutual.get(key)
+            if hit is None:
+                hit = np.intersect1d(self.adj.neighbors_of(a), self.adj.neighbors_of(b))
+                self._mutual[key] = hit
+                if len(self._mutual) > MUTUAL_CACHE_SIZE:
+                    self._mutual.popitem(last=False)
+            else:
+                self._mutual.move_to_end(key)
+        return [self.ids.lookup(i) for i in hit.tolist()]
+
+    def _tree(self, source: int) -> Tuple[np.ndarray, np.ndarray]:
+        with self._lock:
+            tree = self._bfs.get(source)
+            if tree is None:
+                tree = _bfs_tree(self.adj, source)
+                self._bfs[source] = tree
+                if len(self._bfs) > BFS_CACHE_SIZE:
+                    self._bfs.popitem(last=False)
+            else:
+                self._bfs.move_to_end(source)
+            return tree
+
+    def layers(self, center: int, k: int, cap: Optional[int] = None) -> List[np.ndarray]:
+        """
+        BFS layers 0..k around center (layer i holds the nodes i hops away), cached per
+        (center, cap) and grown one layer at a time from the deepest cached one. With a
+        cap, a layer keeps its `cap` nodes with the heaviest edge to the layer before,
+        and the next layer grows from those only. Stops early at an empty layer.
+        """
+        with self._lock:
+            key = (center, cap)
+            layers = self._layers.get(key)
+            if layers is None:
+                layers = self._layers[key] = [np.array([center], dtype=np.int32)]
+                if len(self._layers) > NEIGHBORHOOD_CACHE_SIZE:
+                    self._layers.popitem(last=False)
+            else:
+                self._layers.move_to_end(key)
+            while len(layers) <= k and len(layers[-1]):
+                layers.append(_next_layer(self.adj, layers, cap))
+            return layers[:k + 1]
+
+    def neighborhood(self, center_id: str, k: int, cap: Optional[int] = None) -> List[str]:
+        """
+        Ids of the nodes within k hops of center_id (see layers), the center included.
+        """
+        center = self.ids.get(center_id)
+        if center < 0:
+            return [center_id]
+        return [self.ids.lookup(i) for layer in self.layers(center, k, cap) for i in layer.tolist()]
+
+    def _drop_neighborhoods(self, linked: np.ndarray, reweighted: np.ndarray):
+        # Layers only change through edges leaving an inner layer (the deepest cached
+        # one has not been expanded yet); weights matter only when a cap ranks by them
+        capped = np.concatenate([linked, reweighted])
+        for key in list(self._layers):
+            layers = self._layers[key]
+            changed = linked if key[1] is None else capped
+            if not len(changed):
+                continue
+            inner = np.concatenate(layers[:-1] if len(layers[-1]) else layers)
+            if np.any(np.isin(changed >> 32, inner) | np.isin(changed & 0xFFFFFFFF, inner)):
+                del self._layers[key]
+
+    def subgraph_edges(self, node_ids: List[str], star: Optional[str] = None) -> List[Tuple[str, str, float, str]]:
+        """
+        (source, target, weight, relation label) of the edges among node_ids, in the
+        edge store's canonical (sorted id) order; with star, only those touching it.
+        Found through the CSR rows of node_ids, so it costs nothing per other edge.
+        """
+        adj = self.adj
+        rows = np.array([i for i in (self.ids.get(x) for x in node_ids) if 0 <= i < adj.n], dtype=np.int32)
+        inside = np.zeros(adj.n, dtype=bool)
+        inside[rows] = True
+        srcs, nbrs, pos = adj.expand(rows)
+        keep = inside[nbrs] & (srcs < nbrs) # each undirected edge once
+        if star is not None:
+            s = self.ids.get(star)
+            keep &= (srcs == s) | (nbrs == s)
+        labels = self.edges.labels
+        out = []
+        for u, v, p in zip(srcs[keep].tolist(), nbrs[keep].tolist(), pos[keep].tolist()):
+            a, b = sorted((self.ids.lookup(u), self.ids.lookup(v)))
+            out.append((a, b, float(adj.weights[p]), labels.get((u << 32) | v, "")))
+        return out
+
+    def connection_path(self, target_id: str, source_id: str = ROOT_ID) -> Optional[List[str]]:
+        """
+        Fewest-hop path source -> target (ties broken towards stronger ties),
+        or None if they are not connected.
+        """
+        s, t = self.ids.get(source_id), self.ids.get(target_id)
+        if s < 0 or t < 0 or s >= self.adj.n or t >= self.adj.n:
+            return [source_id] if source_id == target_id else None
+        dist, parent = self._tree(s)
+        # Nodes interned after the tree was built had no edges then
+        if t >= len(dist) or dist[t] < 0:
+            return None
+        path = [t]
+        while path[-1] != s:
+            path.append(int(parent[path[-1]]))
+        return [self.ids.lookup(i) for i in reversed(path)]
+
+def _bfs_tree(adj: CSRAdjacency, source: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Layered BFS over the CSR arrays. Each newly reached node picks, among its
+    previous-layer neighbors, the one with the heaviest edge as parent.
+    """
+    dist = np.full(adj.n, -1, dtype=np.int32)
+    parent = np.full(adj.n, -1, dtype=np.int32)
+    dist[source] = 0
+    frontier = np.array([source], dtype=np.int32)
+    depth = 0
+    while len(frontier):
+        depth += 1
+        srcs, nbrs, pos = adj.expand(frontier)
+        fresh = dist[nbrs] < 0
+        srcs, nbrs, w = srcs[fresh], nbrs[fresh], adj.weights[pos[fresh]]
+        if not len(nbrs):
+            break
+        # Sort by (neighbor, -weight) and keep the first entry per neighbor
+        order = np.lexsort((-w, nbrs))
+        nbrs, srcs = nbrs[order], srcs[order]
+        first = np.r_[True, nbrs[1:] != nbrs[:-1]]
+        frontier = nbrs[first]
+        parent[frontier] = srcs[first]
+        dist[frontier] = depth
+    return dist, parent
+
+def _next_layer(adj: CSRAdjacency, layers: List[np.ndarray], cap: Optional[int]) -> np.ndarray:
+    """
+    The unseen neighbors of the last layer, each ranked by its heaviest edge into it;
+    the top `cap` of them when capped.
+    """
+    seen = np.zeros(adj.n, dtype=bool)
+    for layer in layers:
+        seen[layer[layer < adj.n]] = True
+    _, nbrs, pos = adj.expand(layers[-1])
+    fresh = ~seen[nbrs]
+    nbrs, w = nbrs[fresh], adj.weights[pos[fresh]]
+    if not len(nbrs):
+        return np.zeros(0, dtype=np.int32)
+    # Sort by (neighbor, -weight) and keep the first entry per neighbor
+    order = np.lexsort((-w, nbrs))
+    nbrs, w = nbrs[order], w[order]
+    first = np.r_[True, nbrs[1:] != nbrs[:-1]]
+    nbrs, w = nbrs[first], w[first]
+    if cap is not None and len(nbrs) > cap:
+        nbrs = np.sort(nbrs[np.argsort(-w, kind="stable")[:cap]])
+    return nbrs.astype(np.int32)
+
+def _tree_survives(dist, parent, added, removed) -> bool:
+    """
+    Whether a cached BFS tree is still a valid fewest-hop tree after the edge diff.
+    """
+    n = len(dist)
+    for keys, is_added in ((added, True), (removed, False)):
+        if not len(keys):
+            continue
+        u, v = keys >> 32, keys & 0xFFFFFFFF
+        if is_added:
+            # New nodes, or an edge that skips a layer, can shorten paths
+            if np.any((u >= n) | (v >= n)):
+                return False
+            du, dv = dist[u], dist[v]
+            reached = (du >= 0) | (dv >= 0)
+            if np.any(reached & ((du < 0) | (dv < 0) | (np.abs(du - dv) > 1))):
+                return False
+        else:
+            inside = (u < n) & (v < n)
+            u, v = u[inside], v[inside]
+            if np.any((parent[v] == u) | (parent[u] == v)):
+                return False
+    return True
+
+# --- Process-wide engine ---
+
+_engine = GraphAnalytics()
+
+def get_engine(edges_data: List[Dict[str, Any]], version=None, tenant=None) -> GraphAnalytics:
+    """
+    The engine synced with edges_data: the process-wide one, or with a
+    data_manager tenant store, that tenant's own.
+    """
+    engine = _engine if tenant is None else tenant.index("graph_analytics", partial(GraphAnalytics, tenant.interner()))
+    engine.sync(edges_data, version)
+    return engine
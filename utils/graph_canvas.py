@@ -0,0 +1,133 @@
+"""
+Incremental vis.js graph canvas (a Streamlit component).
+
+The browser keeps one vis.js network and DataSet per canvas for the whole session.
+Each run sends only what changed since the last message, tagged with the version
+it applies on top of, so an edit, a re-center or a k-hop change neither resends
+every node (and its avatar) nor restarts the layout: nodes that stay keep their
+positions, and new ones start next to a neighbour.
+
+Nodes and edges that leave the view are parked in the browser with their last
+position; when they come back unchanged only their ids are sent ("restore").
+Removing a node removes (and parks) its edges on both sides, and a removal that
+would list more ids than it keeps is sent as the ids to keep instead.
+
+A canvas that missed a message (e.g. its iframe was recreated) asks for a resync
+through its component value and gets the full graph on the next run.
+"""
+import os
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set
+
+FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "graph_canvas_frontend")
+PARKED_MAX = 50_000 # removed nodes + edges remembered for cheap restores
+
+_component = None
+
+def _declare():
+    global _component
+    if _component is None:
+        import streamlit.components.v1 as components # deferred: only pages with a graph need it
+        _component = components.declare_component("deepmemory_graph", path=FRONTEND_DIR)
+    return _component
+
+class CanvasState:
+    """
+    What one browser canvas has been sent; keep one per session and canvas key.
+    """
+    def __init__(self):
+        self.version = 0
+        self.canvas = None # browser-side canvas the counters below belong to
+        self.click = 0
+        self.resync = 0
+        self.reset()
+
+    def reset(self):
+        self.nodes: Dict[str, Dict[str, Any]] = {}
+        self.edges: Dict[str, Dict[str, Any]] = {}
+        self.parked: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict() # (kind, id) -> item
+        self.options: Optional[Dict[str, Any]] = None
+        self.started = False
+
+    def _park(self, kind: str, items: Dict[str, Dict[str, Any]]):
+        for key, item in items.items():
+            self.parked[(kind, key)] = item
+            self.parked.move_to_end((kind, key))
+        while len(self.parked) > PARKED_MAX:
+            self.parked.popitem(last=False) # the browser may still have it; it just gets resent
+
+    def _diff(self, kind: str, items: List[Dict[str, Any]], implied: Optional[Set[str]] = None) -> Dict[str, Any]:
+        # Changes for one DataSet; edges of the nodes in implied are dropped by the browser itself
+        sent = self.nodes if kind == "node" else self.edges
+        current = {item["id"]: item for item in items}
+        upsert, restore = [], []
+        for key, item in current.items():
+            if sent.get(key) == item:
+                continue
+            if key not in sent and self.parked.get((kind, key)) == item:
+                restore.append(key)
+            else:
+                upsert.append(item)
+            self.parked.pop((kind, key), None)
+        removed = {key: item for key, item in sent.items() if key not in current}
+        self._park(kind, removed)
+        explicit = [key for key, item in removed.items()
+                    if not implied or (item["from"] not in implied and item["to"] not in implied)]
+        change = {"upsert": upsert, "restore": restore, "remove": explicit}
+        kept = [key for key in current if key in sent]
+        if len(explicit) > len(kept):
+            change["remove"], change["keep"] = [], kept
+        if kind == "node":
+            self.nodes = current
+        else:
+            self.edges = current
+        return change
+
+def _unchanged(change: Dict[str, Any]) -> bool:
+    return not (change["upsert"] or change["restore"] or change["remove"] or "keep" in change)
+
+def build_message(state: CanvasState, nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]],
+                  options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The message for this run: a diff against what the canvas was last sent.
+    """
+    full = not state.started
+    visible = {n["id"] for n in nodes}
+    removed_nodes = {key for key in state.nodes if key not in visible}
+    node_change = state._diff("node", nodes)
+    edge_change = state._diff("edge", edges, implied=removed_nodes)
+    options_changed = options != state.options
+    if not (full or options_changed) and _unchanged(node_change) and _unchanged(edge_change):
+        # Nothing to apply: a tiny message the canvas recognises as current
+        return {"base": state.version, "version": state.version,
+                "nodes": node_change, "edges": edge_change, "options": None}
+    message = {
+        "base": 0 if full else state.version,
+        "version": state.version + 1,
+        "nodes": node_change,
+        "edges": edge_change,
+        "options": options if full or options_changed else None,
+    }
+    state.version += 1
+    state.options, state.started = options, True
+    return message
+
+def graph_canvas(nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]], options: Dict[str, Any],
+                 state: CanvasState, key: str = "graph_canvas") -> Optional[str]:
+    """
+    Renders the graph (vis.js node/edge dicts with unique "id"s, edges with
+    "from"/"to") and returns the id of a node the user has just clicked, or None.
+    """
+    value = _declare()(message=build_message(state, nodes, edges, options), key=key, default=None) or {}
+    if value.get("canvas") != state.canvas:
+        state.canvas, state.click, state.resync = value.get("canvas"), 0, 0
+    if value.get("resync", 0) > state.resync:
+        # The browser lost track: the next run sends the full graph
+        state.resync = value["resync"]
+        state.reset()
+        import streamlit as st
+        st.rerun()
+    if value.get("click", 0) > state.click:
+        state.click = value["click"]
+        return value.get("selected")
+    return None
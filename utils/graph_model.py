@@ -0,0 +1,393 @@
+"""
+Compact in-memory model for the graph.
+
+Nodes, events and edges are slotted records whose ids are interned to small ints,
+and adjacency is kept as CSR-style NumPy arrays. The JSON stores and the dict-based
+data_manager API are unchanged; use to_dict()/as_dicts() for a dict view.
+"""
+import datetime
+import itertools
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+ROOT_ID = "root_me"
+
+class IdInterner:
+    """
+    Bidirectional str <-> int table. Ids are never reused within a table.
+    """
+    def __init__(self, keys: Iterable[str] = ()):
+        self._to_int: Dict[str, int] = {}
+        self._to_str: List[str] = []
+        for key in keys:
+            self.intern(key)
+
+    def intern(self, key: str) -> int:
+        idx = self._to_int.get(key)
+        if idx is None:
+            idx = len(self._to_str)
+            self._to_int[key] = idx
+            self._to_str.append(key)
+        return idx
+
+    def get(self, key: str) -> int:
+        return self._to_int.get(key, -1)
+
+    def lookup(self, idx: int) -> str:
+        return self._to_str[idx]
+
+    def __len__(self):
+        return len(self._to_str)
+
+# Default table for callers without their own (a data_manager tenant store keeps
+# one per tenant, so its arrays are sized by its own node count). Ints are only
+# comparable between records interned in the same table.
+ids = IdInterner([ROOT_ID])
+
+def _table(interner: Optional[IdInterner]) -> IdInterner:
+    return ids if interner is None else interner
+
+@lru_cache(maxsize=1 << 16) # few distinct dates, many rows
+def date_to_ordinal(value: str) -> int:
+    if not value:
+        return 0
+    try:
+        return datetime.date.fromisoformat(value[:10]).toordinal()
+    except ValueError:
+        return 0
+
+def ordinal_to_date(value: int) -> str:
+    return str(datetime.date.fromordinal(int(value))) if value > 0 else ""
+
+_NODE_KEYS = ("id", "name", "type", "description", "created_at", "avatar_type", "avatar_value")
+_EVENT_KEYS = ("id", "title", "date", "content", "images", "related_nodes")
+_EDGE_KEYS = ("source", "target", "weight", "last_interaction", "relation_type")
+
+def _extra(d: Dict[str, Any], known) -> Optional[Dict[str, Any]]:
+    # Keep unknown keys so the dict view round-trips
+    rest = {k: v for k, v in d.items() if k not in known}
+    return rest or None
+
+@dataclass
+class Node:
+    __slots__ = ("id", "name", "type", "description", "created_at", "avatar_type", "avatar_value", "extra")
+    id: int
+    name: str
+    type: str
+    description: str
+    created_at: str
+    avatar_type: str
+    avatar_value: Optional[str]
+    extra: Optional[Dict[str, Any]]
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any], interner: Optional[IdInterner] = None) -> "Node":
+        return cls(_table(interner).intern(d["id"]), d.get("name", ""), d.get("type", "person"),
+                   d.get("description", ""), d.get("created_at", ""),
+                   d.get("avatar_type", "image"), d.get("avatar_value"), _extra(d, _NODE_KEYS))
+
+    def to_dict(self, interner: Optional[IdInterner] = None) -> Dict[str, Any]:
+        d = {"id": _table(interner).lookup(self.id), "name": self.name, "type": self.type,
+             "description": self.description, "created_at": self.created_at,
+             "avatar_type": self.avatar_type}
+        if self.avatar_value is not None:
+            d["avatar_value"] = self.avatar_value
+        if self.extra:
+            d.update(self.extra)
+        return d
+
+# Shared marker for the common case where the only extra key is the journal_text alias
+_JOURNAL_ALIAS = {"journal_text": None}
+
+@dataclass
+class Event:
+    __slots__ = ("id", "title", "date", "ordinal", "content", "images", "related", "extra")
+    id: str # event ids are not graph keys, so they are not interned
+    title: str
+    date: str
+    ordinal: int
+    content: str
+    images: Tuple[str, ...]
+    related: Tuple[int, ...]
+    extra: Optional[Dict[str, Any]]
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any], interner: Optional[IdInterner] = None) -> "Event":
+        extra = _extra(d, _EVENT_KEYS)
+        if extra and "journal_text" in extra and extra["journal_text"] == d.get("content"):
+            # alias of content, don't store the text twice
+            extra = _JOURNAL_ALIAS if len(extra) == 1 else dict(extra, journal_text=None)
+        date = d.get("date", "")
+        intern = _table(interner).intern
+        return cls(d["id"], d.get("title", ""), date, date_to_ordinal(date),
+                   d.get("content", ""), tuple(d.get("images", ())),
+                   tuple(intern(p) for p in d.get("related_nodes", ())), extra)
+
+    def to_dict(self, interner: Optional[IdInterner] = None) -> Dict[str, Any]:
+        lookup = _table(interner).lookup
+        d = {"id": self.id, "title": self.title, "date": self.date,
+             "content": self.content, "images": list(self.images),
+             "related_nodes": [lookup(p) for p in self.related]}
+        if self.extra:
+            for k, v in self.extra.items():
+                d[k] = self.content if (k == "journal_text" and v is None) else v
+        return d
+
+@dataclass
+class Edge:
+    __slots__ = ("source", "target", "weight", "last_interaction", "relation_type")
+    source: int
+    target: int
+    weight: int
+    last_interaction: int # date ordinal, 0 = unknown
+    relation_type: str
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any], interner: Optional[IdInterner] = None) -> "Edge":
+        intern = _table(interner).intern
+        s, t = intern(d["source"]), intern(d["target"])
+        return cls(min(s, t), max(s, t), int(d.get("weight", 1)),
+                   date_to_ordinal(d.get("last_interaction", "")), d.get("relation_type", ""))
+
+    def key(self) -> Tuple[int, int]:
+        return (self.source, self.target)
+
+    def to_dict(self, interner: Optional[IdInterner] = None) -> Dict[str, Any]:
+        # Canonical string order, same as data_manager's sorted((source, target))
+        lookup = _table(interner).lookup
+        a, b = sorted((lookup(self.source), lookup(self.target)))
+        return {"source": a, "target": b, "weight": self.weight,
+                "last_interaction": ordinal_to_date(self.last_interaction),
+                "relation_type": self.relation_type}
+
+def as_dicts(records: Iterable[Any], interner: Optional[IdInterner] = None) -> List[Dict[str, Any]]:
+    return [r.to_dict(interner) for r in records]
+
+def _pair_key(a: int, b: int) -> int:
+    return (a << 32) | b if a < b else (b << 32) | a
+
+class EdgeTable:
+    """
+    All edges as parallel NumPy arrays (source < target, ints interned in the
+    table's interner), with relation labels kept sparsely by pair key since most
+    edges have none.
+    """
+    __slots__ = ("source", "target", "weight", "last", "labels", "ids")
+
+    def __init__(self, source, target, weight, last, labels: Dict[int, str],
+                 interner: Optional[IdInterner] = None):
+        self.source = source
+        self.target = target
+        self.weight = weight
+        self.last = last
+        self.labels = labels
+        self.ids = _table(interner)
+
+    @classmethod
+    def from_dicts(cls, edges_data: List[Dict[str, Any]], interner: Optional[IdInterner] = None) -> "EdgeTable":
+        # Column-wise, without an Edge object per row
+        interner = _table(interner)
+        intern = interner.intern
+        count = len(edges_data)
+        a = np.fromiter((intern(e["source"]) for e in edges_data), dtype=np.int32, count=count)
+        b = np.fromiter((intern(e["target"]) for e in edges_data), dtype=np.int32, count=count)
+        source, target = np.minimum(a, b), np.maximum(a, b)
+        labels = {}
+        for i, e in enumerate(edges_data):
+            if e.get("relation_type"):
+                labels[_pair_key(int(a[i]), int(b[i]))] = e["relation_type"]
+        return cls(
+            source,
+            target,
+            np.fromiter((e.get("weight", 1) for e in edges_data), dtype=np.int32, count=count),
+            np.fromiter((date_to_ordinal(e.get("last_interaction", "")) for e in edges_data),
+                        dtype=np.int32, count=count),
+            labels,
+            interner,
+        )
+
+    def __len__(self):
+        return len(self.source)
+
+    def keys(self) -> np.ndarray:
+        return (self.source.astype(np.int64) << 32) | self.target.astype(np.int64)
+
+    def __getitem__(self, i: int) -> Edge:
+        s, t = int(self.source[i]), int(self.target[i])
+        return Edge(s, t, int(self.weight[i]), int(self.last[i]), self.labels.get(_pair_key(s, t), ""))
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        return [e.to_dict(self.ids) for e in self]
+
+class CSRAdjacency:
+    """
+    Undirected adjacency in CSR form over interned node ints (one row per id in
+    the edge table's interner).
+    Row i's neighbors are neighbors[indptr[i]:indptr[i+1]].
+    """
+    __slots__ = ("indptr", "neighbors", "weights", "last")
+
+    def __init__(self, indptr, neighbors, weights, last):
+        self.indptr = indptr
+        self.neighbors = neighbors
+        self.weights = weights
+        self.last = last
+
+    @classmethod
+    def from_table(cls, edges: EdgeTable, n: int = None) -> "CSRAdjacency":
+        n = len(edges.ids) if n is None else n
+        # Mirror every edge, then sort by row
+        rows = np.concatenate([edges.source, edges.target])
+        cols = np.concatenate([edges.target, edges.source])
+        order = np.argsort(rows, kind="stable")
+        counts = np.bincount(rows, minlength=n)
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        return cls(indptr, cols[order],
+                   np.concatenate([edges.weight, edges.weight]).astype(np.float32)[order],
+                   np.concatenate([edges.last, edges.last])[order])
+
+    @property
+    def n(self) -> int:
+        return len(self.indptr) - 1
+
+    def row(self, i: int) -> slice:
+        if i < 0 or i >= self.n:
+            return slice(0, 0)
+        return slice(self.indptr[i], self.indptr[i + 1])
+
+    def neighbors_of(self, i: int) -> np.ndarray:
+        return self.neighbors[self.row(i)]
+
+    def degree(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    def weighted_degree(self) -> np.ndarray:
+        rows = np.repeat(np.arange(self.n), self.degree())
+        return np.bincount(rows, weights=self.weights, minlength=self.n)
+
+    def expand(self, frontier: np.ndarray):
+        """
+        All edges leaving the frontier rows, as parallel (sources, neighbors, positions)
+        arrays; positions index into neighbors/weights/last.
+        """
+        frontier = frontier[(frontier >= 0) & (frontier < self.n)]
+        starts = self.indptr[frontier]
+        counts = self.indptr[frontier + 1] - starts
+        total = int(counts.sum())
+        if total == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty.astype(np.int32), empty.astype(np.int32), empty
+        # Start of each row repeated over its length, plus a running offset within the row
+        base = np.repeat(starts - np.cumsum(counts) + counts, counts)
+        pos = base + np.arange(total)
+        return np.repeat(frontier, counts), self.neighbors[pos], pos
+
+    def k_hop(self, center: int, k: int) -> np.ndarray:
+        """
+        Ints of all nodes within k hops of center (BFS over the CSR arrays).
+        """
+        if center < 0 or center >= self.n:
+            return np.array([center], dtype=np.int32)
+        seen = np.zeros(self.n, dtype=bool)
+        seen[center] = True
+        frontier = np.array([center], dtype=np.int32)
+        for _ in range(k):
+            if len(frontier) == 0:
+                break
+            _, nxt, _ = self.expand(frontier)
+            nxt = np.unique(nxt[~seen[nxt]])
+            seen[nxt] = True
+            frontier = nxt
+        return np.flatnonzero(seen).astype(np.int32)
+
+def tie_keys(related: Iterable[int], interner: Optional[IdInterner] = None) -> List[int]:
+    """
+    Pair keys of the ties an event with these participants (interned in
+    interner) implies: every participant is linked to Me, and non-Me
+    participants are linked pairwise.
+    """
+    root = _table(interner).get(ROOT_ID)
+    others = sorted(set(p for p in related if p != root))
+    keys = [_pair_key(root, p) for p in others]
+    keys.extend((a << 32) | b for a, b in itertools.combinations(others, 2))
+    return keys
+
+def event_pair_keys(events: Iterable[Event], interner: Optional[IdInterner] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    One (pair key, event date ordinal) row per tie an event implies (see tie_keys).
+    """
+    keys: List[int] = []
+    dates: List[int] = []
+    for event in events:
+        ties = tie_keys(event.related, interner)
+        keys.extend(ties)
+        dates.extend([event.ordinal] * len(ties))
+    return np.array(keys, dtype=np.int64), np.array(dates, dtype=np.int32)
+
+def rebuild_edges(events: Iterable[Event], old_edges: EdgeTable) -> EdgeTable:
+    """
+    Re-derives co-occurrence edges from events on integer pair keys (see event_pair_keys).
+
+    Labels are inherited from old_edges; old edges with a label but no supporting
+    event (manual connections) are carried over unchanged. events must be
+    interned in old_edges' interner.
+    """
+    key_arr, date_arr = event_pair_keys(events, old_edges.ids)
+    # Group equal keys: weight = group size, last = group max date
+    order = np.argsort(key_arr, kind="stable")
+    key_arr, date_arr = key_arr[order], date_arr[order]
+    if len(key_arr):
+        starts = np.flatnonzero(np.r_[True, key_arr[1:] != key_arr[:-1]])
+        last = np.maximum.reduceat(date_arr, starts)
+    else:
+        starts = np.zeros(0, dtype=np.int64)
+        last = np.zeros(0, dtype=np.int32)
+    uniq = key_arr[starts]
+    weight = np.diff(np.r_[starts, len(key_arr)])
+
+    # Labelled edges that no event supports anymore are kept as manual connections
+    old_keys = old_edges.keys()
+    labelled = np.fromiter((k in old_edges.labels for k in old_keys.tolist()), dtype=bool, count=len(old_keys))
+    manual = np.flatnonzero(labelled & ~np.isin(old_keys, uniq))
+
+    all_keys = np.concatenate([uniq, old_keys[manual]])
+    labels = {}
+    for k in all_keys.tolist():
+        label = old_edges.labels.get(k)
+        if label:
+            labels[k] = label
+    return EdgeTable(
+        (all_keys >> 32).astype(np.int32),
+        (all_keys & 0xFFFFFFFF).astype(np.int32),
+        np.concatenate([weight, old_edges.weight[manual]]).astype(np.int32),
+        np.concatenate([last, old_edges.last[manual]]).astype(np.int32),
+        labels,
+        old_edges.ids,
+    )
+
+class GraphModel:
+    """
+    Typed nodes and edge table plus the CSR adjacency built from them.
+    """
+    def __init__(self, nodes: List[Node], edges: EdgeTable):
+        self.nodes = {n.id: n for n in nodes}
+        self.edges = edges
+        self.ids = edges.ids
+        self.adj = CSRAdjacency.from_table(edges)
+
+    @classmethod
+    def from_dicts(cls, nodes_data, edges_data, interner: Optional[IdInterner] = None) -> "GraphModel":
+        return cls([Node.from_dict(n, interner) for n in nodes_data], EdgeTable.from_dicts(edges_data, interner))
+
+    def k_hop_ids(self, center_id: str, k: int) -> List[str]:
+        center = self.ids.get(center_id)
+        if center not in self.nodes:
+            return list(self.ids.lookup(i) for i in self.nodes)
+        return [self.ids.lookup(i) for i in self.adj.k_hop(center, k).tolist() if i in self.nodes]
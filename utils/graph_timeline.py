@@ -0,0 +1,163 @@
+"""
+"Graph as of date" snapshots for the Relationship view.
+
+Event-derived ties are bucketed by month into a delta log (per bucket: which pairs
+gained how much weight, and their last interaction before/after the bucket), with a
+full checkpoint of the cumulative state every CHECKPOINT_EVERY buckets. A cursor
+moves between buckets by applying (or reverting) one bucket's deltas, so a slider
+step costs O(changes in that bucket); long jumps start from the nearest checkpoint.
+
+Manual edges without events have no history and are not part of snapshots.
+Relation labels are taken from the current edge store.
+"""
+import datetime
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from utils.graph_model import Event, IdInterner, event_pair_keys, ids, ordinal_to_date
+
+CHECKPOINT_EVERY = 12 # buckets between full snapshots
+
+def _month_of(ordinal: int) -> int:
+    if ordinal <= 0:
+        return -1 # undated: present from the first bucket on
+    d = datetime.date.fromordinal(ordinal)
+    return d.year * 12 + d.month - 1
+
+class _Bucket:
+    __slots__ = ("keys", "weights", "last", "prev_last")
+
+    def __init__(self, keys, weights, last, prev_last):
+        self.keys = keys # pair keys touched in this bucket
+        self.weights = weights # weight added per key
+        self.last = last # last interaction after this bucket
+        self.prev_last = prev_last # ... and before it (0 = edge did not exist)
+
+class GraphTimeline:
+    def __init__(self, events: List[Event], interner: Optional[IdInterner] = None):
+        self.ids = ids if interner is None else interner # the one events are interned in
+        keys, ordinals = event_pair_keys(events, self.ids)
+        uniq_dates, inverse = np.unique(ordinals, return_inverse=True)
+        months = np.array([_month_of(int(o)) for o in uniq_dates], dtype=np.int64)[inverse]
+        dated = months[months >= 0]
+        first = int(dated.min()) if len(dated) else 0
+        months[months < 0] = first
+
+        self.months: List[int] = sorted(set(months.tolist()))
+        self.buckets: List[_Bucket] = []
+        self.checkpoints: Dict[int, tuple] = {}
+
+        order = np.lexsort((keys, months))
+        keys, ordinals, months = keys[order], ordinals[order], months[order]
+        bounds = np.searchsorted(months, self.months + [max(self.months, default=0) + 1])
+        weights: Dict[int, int] = {}
+        last: Dict[int, int] = {}
+        for b in range(len(self.months)):
+            bk, bo = keys[bounds[b]:bounds[b + 1]], ordinals[bounds[b]:bounds[b + 1]]
+            starts = np.flatnonzero(np.r_[True, bk[1:] != bk[:-1]]) if len(bk) else np.zeros(0, dtype=np.int64)
+            u_keys = bk[starts].tolist()
+            u_weights = np.diff(np.r_[starts, len(bk)]).tolist()
+            u_last = np.maximum.reduceat(bo, starts).tolist() if len(bk) else []
+            prev = [last.get(k, 0) for k in u_keys]
+            for k, w, d in zip(u_keys, u_weights, u_last):
+                weights[k] = weights.get(k, 0) + w
+                last[k] = max(last.get(k, 0), d)
+            self.buckets.append(_Bucket(u_keys, u_weights, [last[k] for k in u_keys], prev))
+            if b % CHECKPOINT_EVERY == 0:
+                self.checkpoints[b] = (dict(weights), dict(last))
+
+    @classmethod
+    def from_dicts(cls, events_data, interner: Optional[IdInterner] = None) -> "GraphTimeline":
+        return cls([Event.from_dict(e, interner) for e in events_data], interner)
+
+    def labels(self) -> List[str]:
+        return [f"{m // 12:04d}-{m % 12 + 1:02d}" for m in self.months]
+
+    def index_of(self, date: str) -> int:
+        """
+        Bucket index for an ISO date (the last bucket at or before it), -1 if before all.
+        """
+        month = int(date[:4]) * 12 + int(date[5:7]) - 1
+        return int(np.searchsorted(self.months, month, side="right")) - 1
+
+    def cursor(self) -> "TimelineCursor":
+        return TimelineCursor(self)
+
+class TimelineCursor:
+    """
+    Cumulative edge state at one bucket of a GraphTimeline (position -1 = empty).
+    """
+    def __init__(self, timeline: GraphTimeline):
+        self.timeline = timeline
+        self.position = -1
+        self.weights: Dict[int, int] = {}
+        self.last: Dict[int, int] = {}
+
+    def _forward(self):
+        self.position += 1
+        bucket = self.timeline.buckets[self.position]
+        for k, w, d in zip(bucket.keys, bucket.weights, bucket.last):
+            self.weights[k] = self.weights.get(k, 0) + w
+            self.last[k] = d
+
+    def _backward(self):
+        bucket = self.timeline.buckets[self.position]
+        for k, w, d in zip(bucket.keys, bucket.weights, bucket.prev_last):
+            remaining = self.weights[k] - w
+            if remaining > 0:
+                self.weights[k] = remaining
+                self.last[k] = d
+            else:
+                del self.weights[k]
+                del self.last[k]
+        self.position -= 1
+
+    def seek(self, target: int):
+        target = max(-1, min(target, len(self.timeline.buckets) - 1))
+        if abs(target - self.position) > CHECKPOINT_EVERY:
+            # Long jump: restart from the nearest checkpoint at or before the target
+            base = (target // CHECKPOINT_EVERY) * CHECKPOINT_EVERY if target >= 0 else None
+            if base is None or base not in self.timeline.checkpoints:
+                self.position, self.weights, self.last = -1, {}, {}
+            else:
+                weights, last = self.timeline.checkpoints[base]
+                self.position, self.weights, self.last = base, dict(weights), dict(last)
+        while self.position < target:
+            self._forward()
+        while self.position > target:
+            self._backward()
+
+    def edges(self, labels: Optional[Dict[tuple, str]] = None) -> List[Dict[str, Any]]:
+        """
+        Snapshot edges as edge-store dicts; labels maps sorted (source, target) to relation_type.
+        """
+        labels = labels or {}
+        result = []
+        lookup = self.timeline.ids.lookup
+        for k, w in self.weights.items():
+            a, b = sorted((lookup(k >> 32), lookup(k & 0xFFFFFFFF)))
+            result.append({"source": a, "target": b, "weight": w,
+                           "last_interaction": ordinal_to_date(self.last[k]),
+                           "relation_type": labels.get((a, b), "")})
+        return result
+
+# --- Process-wide timeline ---
+
+_cached: Dict[str, Any] = {"version": None, "timeline": None}
+_lock = threading.Lock()
+
+def get_timeline(load_events: Callable[[], Iterable[Dict[str, Any]]], version=None, tenant=None) -> GraphTimeline:
+    """
+    The timeline for the current events. load_events is only called (and the
+    timeline rebuilt) when the events version changed. With a data_manager
+    tenant store, the cache is that tenant's.
+    """
+    with _lock:
+        cached = _cached if tenant is None else tenant.index(
+            "graph_timeline", lambda: {"version": None, "timeline": None})
+        if version is None or version != cached["version"] or cached["timeline"] is None:
+            cached["timeline"] = GraphTimeline.from_dicts(load_events(), None if tenant is None else tenant.interner())
+            cached["version"] = version
+        return cached["timeline"]
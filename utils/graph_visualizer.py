@@ -1,7 +1,8 @@
 import base64
+import math
 import os
-import networkx as nx
-from streamlit_agraph import Node, Edge, Config
+from utils import data_manager, media_server
+from utils.graph_model import GraphModel
 
 def image_to_base64(image_path):
     if not os.path.exists(image_path):
@@ -9,35 +10,67 @@ def image_to_base64(image_path):
     with open(image_path, "rb") as img_file:
         return "data:image/png;base64," + base64.b64encode(img_file.read()).decode('utf-8')
 
-def get_graph_data(nodes_data, edges_data, center_node_id=None, k_hop=1, seed=42):
+def _scaled_size(base, weighted_degree):
+    # Grows with interaction weight, logarithmically so hubs don't swamp the canvas
+    return min(base + 5 * math.log1p(weighted_degree), 60)
+
+def _edge_width(weight):
+    return 1 + min(math.log1p(weight), 5)
+
+def _edge_title(edge_events, u, v):
+    # Hover summary of the tie's most recent shared memory
+    latest = edge_events.latest(u, v) if edge_events is not None else None
+    if latest is None:
+        return None
+    when = f" ({latest['date']})" if latest['date'] else ""
+    count = latest['count']
+    return f"Latest: {latest['title'] or 'Untitled'}{when}\n{count} shared memor{'y' if count == 1 else 'ies'}"
+
+def _vis_edge(u, v, label, weight, title=None):
+    edge = {
+        "id": f"{u}|{v}",
+        "from": u,
+        "to": v,
+        "label": label,
+        "color": {'color': 'rgba(255, 255, 255, 0.15)', 'highlight': '#80dfff'}, # 微弱白线
+        "smooth": {'type': 'continuous'},
+        "width": _edge_width(weight), # 连线粗细 = 关系深浅
+        "font": {"size": 10, "color": "#888", "align": "middle", "strokeWidth": 0}
+    }
+    if title:
+        edge["title"] = title
+    return edge
+
+def get_graph_data(nodes_data, edges_data, center_node_id=None, k_hop=1, seed=42, analytics=None,
+                   max_per_layer=None, edge_events=None):
     """
-    Converts raw data into agraph Node/Edge objects using NetworkX for filtering.
-    If center_node_id is set, returns a K-Hop subgraph.
+    Converts raw data into vis.js node/edge dicts and options (see graph_canvas),
+    using the CSR graph model for filtering.
+    If center_node_id is set, returns a K-Hop subgraph; with a graph_analytics engine it
+    comes from its cached BFS layers, each capped at max_per_layer strongest ties.
+    Edge thickness follows interaction weight; with a graph_analytics engine, node size does too.
+    With an edge_events index, hovering an edge shows its latest shared memory.
     """
-    # 1. Build NetworkX Graph
-    G = nx.Graph()
-    
-    # Add nodes with attributes
-    for n in nodes_data:
-        G.add_node(n['id'], **n)
-        
-    # Add edges with attributes
-    for e in edges_data:
-        G.add_edge(e['source'], e['target'], **e)
-        
-    # 2. Filter Subgraph (K-Hop)
-    if center_node_id:
-        if center_node_id in G:
-            G = nx.ego_graph(G, center_node_id, radius=k_hop)
+    # 1. Filter Subgraph (K-Hop) on the integer adjacency
+    # Falls back to the full graph if the center node is not found (e.g. deleted)
+    visible = {n['id'] for n in nodes_data}
+    centered = bool(center_node_id and center_node_id in visible)
+    if centered:
+        if analytics is not None:
+            visible &= set(analytics.neighborhood(center_node_id, k_hop, max_per_layer))
         else:
-            # Fallback if center node not found (e.g. deleted)
-            pass
+            model = GraphModel.from_dicts(nodes_data, edges_data, data_manager.current().interner())
+            visible = set(model.k_hop_ids(center_node_id, k_hop))
             
     nodes = []
     edges = []
+    avatar_dir = data_manager.current().avatar_dir
     
-    # 3. Create agraph Nodes
-    for node_id, n in G.nodes(data=True):
+    # 2. Create agraph Nodes
+    for n in nodes_data:
+        node_id = n['id']
+        if node_id not in visible:
+            continue
         is_me = (node_id == "root_me")
         
         # Tooltip content
@@ -61,14 +94,15 @@ def get_graph_data(nodes_data, edges_data, center_node_id=None, k_hop=1, seed=42
         }
         
         # Check for avatar image
-        avatar_path = os.path.join("assets", "avatars", f"{node_id}.png")
+        avatar_path = os.path.join(avatar_dir, f"{node_id}.png")
         has_avatar = False
         if avatar_type == "image" and os.path.exists(avatar_path):
             has_avatar = True
-            b64_img = image_to_base64(avatar_path)
-            if b64_img:
+            # An immutable URL the browser caches; a data URI when not served
+            image_src = media_server.url(avatar_path) or image_to_base64(avatar_path)
+            if image_src:
                 node_shape = "circularImage"
-                node_image = b64_img
+                node_image = image_src
                 # Type B: Planet (with Avatar)
                 node_shadow = {
                     "enabled": True,
@@ -86,36 +120,41 @@ def get_graph_data(nodes_data, edges_data, center_node_id=None, k_hop=1, seed=42
                 # Other stars
                 node_color = n.get("avatar_value", "#FFFFFF")
         
-        nodes.append(Node(
-            id=node_id,
-            label=n.get('name', 'Unknown'),
-            title=title_text,
-            size=node_size,
-            color=node_color,
-            shape=node_shape,
-            image=node_image if node_image else "",
-            borderWidth=0, # 无边框
-            shadow=node_shadow,
-            font={"color": "#f0f0f0", "size": 14, "face": "Courier New"} # 白色字体
-        ))
+        # Size by tie strength (weighted degree); Me keeps at least its fixed size
+        if analytics is not None:
+            scaled = _scaled_size(20, analytics.weighted_degree(node_id))
+            node_size = max(node_size, scaled) if is_me else scaled
         
-    # 4. Create agraph Edges
-    for u, v, e in G.edges(data=True):
-        edge_label = e.get("relation_type", "")
+        node = {
+            "id": node_id,
+            "label": n.get('name', 'Unknown'),
+            "title": title_text,
+            "size": node_size,
+            "color": node_color,
+            "shape": node_shape,
+            "borderWidth": 0, # 无边框
+            "shadow": node_shadow,
+            "font": {"color": "#f0f0f0", "size": 14, "face": "Courier New"} # 白色字体
+        }
+        if node_image:
+            node["image"] = node_image
+        nodes.append(node)
         
-        if center_node_id and k_hop == 1:
-            if u != center_node_id and v != center_node_id:
+    # 3. Create agraph Edges (induced on the visible nodes; k=1 shows only the star)
+    star = center_node_id if centered and k_hop == 1 else None
+    if centered and analytics is not None:
+        # Read off the visible nodes' adjacency rows instead of scanning every edge
+        for u, v, weight, label in analytics.subgraph_edges(list(visible), star):
+            edges.append(_vis_edge(u, v, label, weight, _edge_title(edge_events, u, v)))
+    else:
+        for e in edges_data:
+            u, v = e['source'], e['target']
+            if u not in visible or v not in visible:
+                continue
+            if star and u != star and v != star:
                 continue
-                
-        edges.append(Edge(
-            source=u,
-            target=v,
-            label=edge_label,
-            color={'color': 'rgba(255, 255, 255, 0.15)', 'highlight': '#80dfff'}, # 微弱白线
-            smooth={'type': 'continuous'},
-            strokeWidth=1,
-            font={"size": 10, "color": "#888", "align": "middle", "strokeWidth": 0}
-        ))
+            edges.append(_vis_edge(u, v, e.get("relation_type", ""), e.get("weight", 1),
+                                   _edge_title(edge_events, u, v)))
         
     physics = {
         "enabled": True,
@@ -145,20 +184,14 @@ def get_graph_data(nodes_data, edges_data, center_node_id=None, k_hop=1, seed=42
         "tooltipDelay": 200
     }
 
-    config = Config(
-        width="100%",
-        height=600,
-        directed=False,
-        physics=physics, 
-        interaction=interaction,
-        hierarchical=False,
-        fit=True,
-        layout={'randomSeed': seed},
-        nodeHighlightBehavior=True,
-        highlightColor="#FFD700", 
-        collapsible=False,
-        heading="", 
-        backgroundColor="#00000000" # 全透明背景
-    )
+    # Background stays transparent; the seed only matters for the first layout,
+    # later updates keep the positions the canvas already has
+    options = {
+        "width": "100%",
+        "height": "600px",
+        "physics": physics,
+        "interaction": interaction,
+        "layout": {'randomSeed': seed},
+    }
     
-    return nodes, edges, config
+    return nodes, edges, options
@@ -1,14 +1,21 @@
 import os
 import json
-from dashscope import MultiModalConversation, Generation
-import dashscope
 
-from PIL import Image
+from utils import media_store
+from utils.model_client import get_client
 
 def analyze_image_with_qwen(image_path, context_text=""):
     """
     Analyzes image using Qwen-VL-Plus to detect people and describe them, 
-    incorporating user-provided context clues. Returns cropped face images if possible.
+    incorporating user-provided context clues. Each person gets a 'face_path' to a
+    cropped thumbnail (see media_store) if possible.
+    """
+    return list(iter_image_entities(image_path, context_text))
+
+def iter_image_entities(image_path, context_text=""):
+    """
+    Streaming version of analyze_image_with_qwen: yields each detected person
+    (with its face crop) as soon as the model has finished describing it.
     """
     abs_path = os.path.abspath(image_path)
     file_url = f"file://{abs_path}"
@@ -39,45 +46,54 @@ def analyze_image_with_qwen(image_path, context_text=""):
         ]
     }]
 
+    original_img = None
     try:
-        response = MultiModalConversation.call(model='qwen-vl-plus', messages=messages)
-        if response.status_code == 200:
-            content = _extract_text_from_qwen_response(response)
-            results = _parse_json_safely(content)
-            
-            # Post-process: Crop faces
+        chunks = (_extract_text_from_qwen_response(r)
+                  for r in _checked(get_client().multimodal_stream(model='qwen-vl-plus', messages=messages)))
+        for res in _stream_entities(chunks):
+            # Post-process: Crop faces (as each entity arrives)
             try:
-                original_img = Image.open(image_path)
-                width, height = original_img.size
-                
-                for res in results:
-                    if 'box_2d' in res:
-                        # Qwen-VL uses [ymin, xmin, ymax, xmax] with 0-1000 scale
-                        box = res['box_2d']
-                        ymin, xmin, ymax, xmax = box
-                        
-                        left = (xmin / 1000) * width
-                        top = (ymin / 1000) * height
-                        right = (xmax / 1000) * width
-                        bottom = (ymax / 1000) * height
-                        
-                        # Add margin? Maybe a little.
-                        # Crop
-                        cropped = original_img.crop((left, top, right, bottom))
-                        res['cropped_face'] = cropped
+                if 'box_2d' in res:
+                    if original_img is None:
+                        from PIL import Image # deferred: only the image path needs Pillow
+                        original_img = Image.open(image_path)
+                    width, height = original_img.size
+                    
+                    # Qwen-VL uses [ymin, xmin, ymax, xmax] with 0-1000 scale
+                    box = res['box_2d']
+                    ymin, xmin, ymax, xmax = box
+                    
+                    left = (xmin / 1000) * width
+                    top = (ymin / 1000) * height
+                    right = (xmax / 1000) * width
+                    bottom = (ymax / 1000) * height
+                    
+                    # Add margin? Maybe a little.
+                    # Crop, and keep only a small thumbnail on disk
+                    cropped = original_img.crop((left, top, right, bottom))
+                    res['face_path'] = media_store.save_crop(cropped)
             except Exception as e:
                 print(f"Cropping failed: {e}")
-                
-            return results
-            
-        return [{"error": f"API Error: {response.code} - {response.message}"}]
+            yield res
+    except _ApiError as e:
+        yield {"error": f"API Error: {e.code} - {e.message}"}
     except Exception as e:
-        return [{"error": f"Analysis failed: {str(e)}"}]
+        yield {"error": f"Analysis failed: {str(e)}"}
+    finally:
+        # Release the decoded photo as soon as the response is done
+        if original_img is not None:
+            original_img.close()
 
 def analyze_text_diary(text):
     """
     Analyzes text diary using Qwen-Plus (LLM) to extract entities and relationships.
     """
+    return list(iter_text_entities(text))
+
+def iter_text_entities(text):
+    """
+    Streaming version of analyze_text_diary: yields each person as soon as it is parsed.
+    """
     prompt = f"""
     分析这篇日记内容："{text}"
     
@@ -92,21 +108,36 @@ def analyze_text_diary(text):
     """
     
     try:
-        response = Generation.call(model='qwen-plus', prompt=prompt, result_format='message')
-        if response.status_code == 200:
-            content = response.output.choices[0].message.content
-            return _parse_json_safely(content)
-        return []
+        chunks = (r.output.choices[0].message.content
+                  for r in _checked(get_client().generation_stream(model='qwen-plus', prompt=prompt,
+                                                                   result_format='message')))
+        yield from _stream_entities(chunks)
+    except _ApiError:
+        return
     except Exception as e:
-        return [{"error": str(e)}]
+        yield {"error": str(e)}
 
-def find_best_match(new_description, known_nodes):
+def find_best_match(new_description, known_nodes, face_path=None):
     """
     Uses LLM to match a new visual/text description against known nodes.
+    With a face crop, a strong perceptual-hash match against a known avatar is
+    returned directly (source "face") and the LLM is not called.
+    For several people from one photo, use match_entities (one call for all).
     Returns: {"match_found": bool, "suggested_id": str, "suggested_name": str, "reason": str}
     """
     if not known_nodes:
         return {"match_found": False}
+    
+    if face_path:
+        try:
+            from utils import face_index # deferred: numpy + Pillow
+            visual = face_index.match_face(face_path, [n['id'] for n in known_nodes if n['id'] != 'root_me'])
+        except Exception:
+            visual = {"strong": False}
+        if visual["strong"]:
+            name = next(n['name'] for n in known_nodes if n['id'] == visual['node_id'])
+            return {"match_found": True, "suggested_id": visual['node_id'], "suggested_name": name,
+                    "reason": f"Face matches avatar ({visual['distance']:.0f}/64 bits apart)", "source": "face"}
         
     # Simplify nodes for token efficiency
     known_summary = []
@@ -129,7 +160,7 @@ def find_best_match(new_description, known_nodes):
     """
     
     try:
-        response = Generation.call(model='qwen-plus', prompt=prompt, result_format='message')
+        response = get_client().generation_call(model='qwen-plus', prompt=prompt, result_format='message')
         if response.status_code == 200:
             content = response.output.choices[0].message.content
             result = _parse_json_safely(content)
@@ -150,6 +181,93 @@ def find_best_match(new_description, known_nodes):
     except Exception:
         return {"match_found": False}
 
+def match_entities(entities, known_nodes):
+    """
+    Batched find_best_match for the people detected in one photo or diary: one
+    LLM call for all of them instead of one per person, each resending the
+    contact list. Strong face matches are settled first without the LLM. Two
+    entities never get the same node: the model is told so, and if it still
+    proposes a node twice the more confident proposal wins.
+    Returns one find_best_match-shaped dict per entity, in order.
+    """
+    results = [{"match_found": False} for _ in entities]
+    candidates = {n['id']: n for n in known_nodes if n['id'] != 'root_me'}
+    if not entities or not candidates:
+        return results
+
+    # 1. Faces: a strong avatar match needs no LLM (closest face wins a shared node)
+    claims = {}
+    faces = [(i, e['face_path']) for i, e in enumerate(entities) if e.get('face_path')]
+    if faces:
+        try:
+            from utils import face_index # deferred: numpy + Pillow
+            for i, face_path in faces:
+                visual = face_index.match_face(face_path, list(candidates))
+                if visual["strong"]:
+                    best = claims.get(visual['node_id'])
+                    if best is None or visual['distance'] < best[1]:
+                        claims[visual['node_id']] = (i, visual['distance'])
+        except Exception:
+            claims = {}
+    for node_id, (i, distance) in claims.items():
+        results[i] = {"match_found": True, "suggested_id": node_id, "suggested_name": candidates[node_id]['name'],
+                      "reason": f"Face matches avatar ({distance:.0f}/64 bits apart)", "source": "face"}
+
+    # 2. Everyone else in one call, against the contacts not already claimed
+    pending = [i for i in range(len(entities)) if not results[i]["match_found"]]
+    remaining = {key: n for key, n in candidates.items() if key not in claims}
+    if not pending or not remaining:
+        return results
+    detected = [{"entity": k + 1, "description": entities[i].get('description') or "无描述"}
+                for k, i in enumerate(pending)]
+    known_summary = [f"ID: {n['id']}, Name: {n['name']}, Known Traits: {n.get('description', '') or '无详细描述'}"
+                     for n in remaining.values()]
+
+    prompt = f"""
+    我在同一张照片/日记里检测到这些人物：
+    {json.dumps(detected, ensure_ascii=False)}
+    
+    这是我记忆库里已有的熟人：
+    {json.dumps(known_summary, ensure_ascii=False)}
+    
+    任务：逐个判断每个人物是否极有可能是已有的某个人。
+    同一张照片里的两个人不可能是同一个人：每个熟人 ID 最多只能匹配一个人物。
+    对每个人物返回一个 JSON 对象，组成列表，例如：
+    [{{"entity": 1, "match_found": true, "suggested_id": "...", "confidence": 0.9, "reason": "..."}},
+     {{"entity": 2, "match_found": false}}]
+    
+    只返回 JSON 列表。
+    """
+
+    try:
+        response = get_client().generation_call(model='qwen-plus', prompt=prompt, result_format='message')
+        if response.status_code != 200:
+            return results
+        proposals = _parse_json_safely(response.output.choices[0].message.content)
+    except Exception:
+        return results
+
+    # 3. Enforce one entity per node, most confident first
+    accepted = []
+    for item in proposals if isinstance(proposals, list) else []:
+        try:
+            k = int(item.get("entity")) - 1
+            confidence = float(item.get("confidence", 0.5))
+        except (AttributeError, TypeError, ValueError):
+            continue
+        if 0 <= k < len(pending) and item.get("match_found") and item.get("suggested_id") in remaining:
+            accepted.append((confidence, k, item))
+    taken = set()
+    for confidence, k, item in sorted(accepted, key=lambda a: (-a[0], a[1])):
+        i = pending[k]
+        if item['suggested_id'] in taken or results[i]["match_found"]:
+            continue
+        taken.add(item['suggested_id'])
+        results[i] = {"match_found": True, "suggested_id": item['suggested_id'],
+                      "suggested_name": remaining[item['suggested_id']]['name'],
+                      "reason": item.get("reason", ""), "confidence": confidence}
+    return results
+
 def _extract_text_from_qwen_response(response):
     # Qwen-VL content extraction helper
     content_list = response.output.choices[0].message.content
@@ -159,6 +277,102 @@ def _extract_text_from_qwen_response(response):
             text_content += item['text']
     return text_content
 
+class _ApiError(Exception):
+    def __init__(self, code, message):
+        super().__init__(f"{code} - {message}")
+        self.code = code
+        self.message = message
+
+def _checked(responses):
+    # Streamed responses can fail at any chunk
+    for response in responses:
+        if response.status_code != 200:
+            raise _ApiError(response.code, response.message)
+        yield response
+
+class JsonArrayStream:
+    """
+    Incremental parser for a JSON array of objects arriving in pieces (optionally
+    wrapped in a ```json fence). feed() returns the objects completed so far, so
+    callers can act on each entity before the rest of the response has arrived.
+    A bare top-level object is returned once it closes.
+    """
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0 # next character to scan
+        self.top = None # '[' or '{' once the payload started
+        self.depth = 0
+        self.start = None # buffer offset of the object being read
+        self.in_string = False
+        self.escape = False
+        self.finished = False
+
+    def feed(self, text):
+        done = []
+        if self.finished:
+            return done
+        self.buffer += text
+        buf = self.buffer
+        for i in range(self.pos, len(buf)):
+            c = buf[i]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif c == '\\':
+                    self.escape = True
+                elif c == '"':
+                    self.in_string = False
+            elif self.top is None:
+                # Skip the fence / any preamble
+                if c in '[{':
+                    self.top, self.depth = c, 1
+                    self.start = i if c == '{' else None
+            elif c == '"':
+                self.in_string = True
+            elif c in '[{':
+                if c == '{' and self.top == '[' and self.depth == 1:
+                    self.start = i
+                self.depth += 1
+            elif c in ']}':
+                self.depth -= 1
+                closes_item = self.depth == (1 if self.top == '[' else 0)
+                if c == '}' and closes_item and self.start is not None:
+                    try:
+                        obj = json.loads(buf[self.start:i + 1])
+                        if isinstance(obj, dict):
+                            done.append(obj)
+                    except json.JSONDecodeError:
+                        pass
+                    self.start = None
+                if self.depth == 0:
+                    self.finished = True
+                    break
+        # Keep only the unfinished object
+        keep = self.start if self.start is not None else len(buf)
+        self.buffer = buf[keep:]
+        self.pos = len(buf) - keep
+        if self.start is not None:
+            self.start = 0
+        return done
+
+def _stream_entities(chunks):
+    """
+    Yields the objects of a streamed JSON array as they complete. If nothing could
+    be parsed incrementally, falls back to parsing the whole text.
+    """
+    parser = JsonArrayStream()
+    parts = []
+    found = False
+    for chunk in chunks:
+        parts.append(chunk)
+        for obj in parser.feed(chunk):
+            found = True
+            yield obj
+    if not found:
+        for obj in _parse_json_safely("".join(parts)):
+            if isinstance(obj, dict):
+                yield obj
+
 def _parse_json_safely(text):
     text = text.strip()
     if text.startswith("```json"): text = text[7:]
@@ -0,0 +1,199 @@
+"""
+Background job queue for AI analysis.
+
+Submitting a job returns its id immediately; a small pool of worker threads runs
+the jobs (at most max_workers at a time) and records their status in a job table
+persisted to data/jobs.json, so a browser refresh or a server restart does not
+lose queued or finished work (jobs that were running when the server stopped are
+queued again).
+
+Job record:
+    {"id", "kind", "params", "owner", "status": "queued" | "running" | "done" | "failed",
+     "result", "error", "created_at", "started_at", "finished_at"}
+
+owner is whoever submitted the job (the app uses the tenant id); callers look a
+job up with get(job_id, owner) so an id alone does not reveal another owner's job.
+The table is shared by all tenants on purpose: its workers are the process's budget
+of concurrent model calls, and a queue per tenant would multiply it. For the same
+reason the file lives outside any tenant's snapshot (see backup.EXCLUDED_FILES).
+
+A handler may be a generator: its items are appended to job["result"] as they are
+produced, so pollers can show partial results while the job is still running. The
+table is written on status changes only; partial results stay in memory, since a
+job interrupted by a restart runs again from the start anyway.
+
+Results should be JSON (face crops are passed as file paths); any other values stay
+in memory and are persisted as null.
+"""
+import inspect
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from utils import record_store
+
+JOBS_FILE = os.path.join("data", "jobs.json")
+MAX_WORKERS = int(os.environ.get("DEEPMEMORY_ANALYSIS_WORKERS", "2"))
+JOB_TTL_SECONDS = 7 * 24 * 3600 # finished jobs nobody reviewed are dropped after this
+
+PENDING = ("queued", "running")
+
+class JobQueue:
+    def __init__(self, handlers: Dict[str, Callable[[Dict[str, Any]], Any]],
+                 path: str = JOBS_FILE, max_workers: int = MAX_WORKERS):
+        self.handlers = handlers
+        self.path = path
+        self.max_workers = max(1, max_workers)
+        self._lock = threading.RLock()
+        self._pending: "queue.Queue[str]" = queue.Queue()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._workers: List[threading.Thread] = []
+        self._load()
+
+    # --- Persistence ---
+
+    def _load(self):
+        try:
+            records = list(record_store.iter_records(self.path))
+        except (FileNotFoundError, record_store.RecordFormatError):
+            records = []
+        cutoff = time.time() - JOB_TTL_SECONDS
+        for job in records:
+            if job["status"] not in PENDING and (job.get("finished_at") or 0) < cutoff:
+                continue
+            if job["status"] in PENDING:
+                # Interrupted by a restart: run it again
+                job["status"] = "queued"
+                self._pending.put(job["id"])
+            self._jobs[job["id"]] = job
+        if records:
+            self._persist()
+
+    def _persist(self):
+        # Values json cannot encode are stored as null
+        snapshot = json.loads(json.dumps(list(self._jobs.values()), ensure_ascii=False, default=lambda o: None))
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        record_store.save_records(self.path, snapshot)
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields)
+            self._persist()
+
+    # --- Workers ---
+
+    def _ensure_workers(self):
+        with self._lock:
+            self._workers = [t for t in self._workers if t.is_alive()]
+            while len(self._workers) < self.max_workers:
+                t = threading.Thread(target=self._work, name=f"analysis-worker-{len(self._workers)}", daemon=True)
+                t.start()
+                self._workers.append(t)
+
+    def _work(self):
+        while True:
+            job_id = self._pending.get()
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job["status"] != "queued":
+                    continue # forgotten while waiting
+            self._update(job_id, status="running", started_at=time.time())
+            try:
+                result = self.handlers[job["kind"]](job["params"])
+                if inspect.isgenerator(result):
+                    partial = []
+                    with self._lock:
+                        job["result"] = partial
+                    for item in result:
+                        with self._lock:
+                            partial.append(item)
+                    result = partial
+                self._update(job_id, status="done", result=result, finished_at=time.time())
+            except Exception as e:
+                self._update(job_id, status="failed", error=str(e), finished_at=time.time())
+
+    # --- API ---
+
+    def submit(self, kind: str, params: Dict[str, Any], owner: Optional[str] = None) -> str:
+        if kind not in self.handlers:
+            raise ValueError(f"unknown job kind: {kind}")
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = {"id": job_id, "kind": kind, "params": params, "owner": owner, "status": "queued",
+                                  "result": None, "error": None, "created_at": time.time(),
+                                  "started_at": None, "finished_at": None}
+            self._persist()
+        self._pending.put(job_id)
+        self._ensure_workers()
+        return job_id
+
+    def get(self, job_id: str, owner: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        A copy of the job, or None if it is unknown (or, with owner, not owner's).
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or (owner is not None and job.get("owner") != owner):
+                return None
+            # Copy the result list too: a running job keeps appending to it
+            result = job["result"]
+            return dict(job, result=list(result) if isinstance(result, list) else result)
+
+    def position(self, job_id: str) -> int:
+        """
+        Number of queued jobs submitted before this one (0 if it is running or done).
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] != "queued":
+                return 0
+            return sum(1 for j in self._jobs.values()
+                       if j["status"] == "queued" and j["created_at"] < job["created_at"])
+
+    def forget(self, job_id: str):
+        """
+        Drops a job from the table (after its result was committed or discarded).
+        """
+        with self._lock:
+            if self._jobs.pop(job_id, None) is not None:
+                self._persist()
+
+    def resume(self):
+        # Make sure jobs recovered from disk get workers
+        if not self._pending.empty():
+            self._ensure_workers()
+
+# --- Analysis jobs ---
+
+def _analyze_image(params: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    from utils import image_processor
+    return image_processor.iter_image_entities(params["image_path"], params.get("context_clues", ""))
+
+def _analyze_text(params: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    from utils import image_processor
+    # Convert to the common format of the review page
+    for r in image_processor.iter_text_entities(params["text"]):
+        yield {"description": r.get("description", "Mentioned in text"),
+               "suggested_name": r.get("name"),
+               "relation_type": r.get("relation")} if "error" not in r else r
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+def get_queue() -> JobQueue:
+    """
+    The process-wide analysis queue ("image" and "text" jobs).
+    """
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue({"image": _analyze_image, "text": _analyze_text})
+            _queue.resume()
+        return _queue
@@ -0,0 +1,225 @@
+"""
+"People you might connect" suggestions for the Inspector's connection editor.
+
+Candidates for a selected person are the people they have no relation label with
+yet (including unlabelled co-occurrence edges), scored from three signals, each
+a sparse row product over CSR arrays (the selected node's row times the matrix):
+- common neighbors in the edge graph (A @ A),
+- Adamic-Adar: common neighbors weighted by 1 / log(degree), so a shared hub such
+  as Me says little,
+- recency-weighted co-occurrence: shared memories (B.T @ B over the event-person
+  incidence B), each worth 0.5 ** (age / RECENCY_HALF_LIFE_DAYS).
+
+One engine per process follows the edge and event stores. The incidence is
+patched per changed event, and cached per-node results are dropped only for the
+nodes a change can reach: endpoints of added/removed edges and their neighbors,
+endpoints of relabelled edges, and the people of changed events.
+"""
+import datetime
+import threading
+from collections import OrderedDict
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from utils.graph_model import CSRAdjacency, EdgeTable, IdInterner, ROOT_ID, date_to_ordinal, ids
+
+RECENCY_HALF_LIFE_DAYS = 365.0 # undated memories count as this old
+COOCCURRENCE_WEIGHT = 1.0 # score of one shared memory from today, relative to Adamic-Adar
+MAX_SUGGESTIONS = 25 # kept per node; callers take the top k of these
+RESULT_CACHE_SIZE = 1024
+
+def _csr(rows: np.ndarray, cols: np.ndarray, n: int) -> CSRAdjacency:
+    # Directed rows -> cols; only indptr/neighbors are set (enough for expand)
+    order = np.argsort(rows, kind="stable")
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+    return CSRAdjacency(indptr, cols[order], None, None)
+
+class LinkSuggestions:
+    def __init__(self, interner: Optional[IdInterner] = None):
+        self.versions = (None, None)
+        self.ids = ids if interner is None else interner
+        self.edges = EdgeTable.from_dicts([], self.ids)
+        self.adj = CSRAdjacency.from_table(self.edges)
+        self._lock = threading.RLock()
+        # Event-person incidence as COO rows over reusable event slots
+        self._events: Dict[str, Tuple[int, Tuple[int, ...], int]] = {} # id -> (slot, people, ordinal)
+        self._free: List[int] = []
+        self._inc_slot = np.zeros(0, dtype=np.int32)
+        self._inc_node = np.zeros(0, dtype=np.int32)
+        self._ordinal = np.zeros(0, dtype=np.int32) # by slot
+        self._by_node: Optional[CSRAdjacency] = None # node -> slots, rebuilt lazily
+        self._by_event: Optional[CSRAdjacency] = None # slot -> nodes
+        self._today = 0
+        self._results: "OrderedDict[int, List[Dict[str, Any]]]" = OrderedDict()
+
+    # --- Sync & invalidation ---
+
+    def sync(self, edges_data: List[Dict[str, Any]], load_events: Callable[[], Iterable[Dict[str, Any]]],
+             edges_version=None, events_version=None):
+        """
+        Brings the engine up to date with the stores. With version tokens, an
+        unchanged store costs nothing (load_events is not even called).
+        """
+        with self._lock:
+            today = datetime.date.today().toordinal()
+            if today != self._today:
+                self._today = today
+                self._results.clear() # every recency weight moved
+            if edges_version is None or edges_version != self.versions[0]:
+                self._apply_edges(EdgeTable.from_dicts(edges_data, self.ids))
+            if events_version is None or events_version != self.versions[1]:
+                self._apply_events(load_events())
+            self.versions = (edges_version, events_version)
+
+    def _drop(self, nodes: Iterable[int]):
+        for i in nodes:
+            self._results.pop(i, None)
+
+    def _apply_edges(self, new: EdgeTable):
+        old_keys, new_keys = self.edges.keys(), new.keys()
+        linked = np.concatenate([new_keys[~np.isin(new_keys, old_keys)],
+                                 old_keys[~np.isin(old_keys, new_keys)]])
+        old_labels, new_labels = self.edges.labels, new.labels
+        relabelled = [k for k in set(old_labels) | set(new_labels) if old_labels.get(k) != new_labels.get(k)]
+        old_adj = self.adj
+        self.edges = new
+        self.adj = CSRAdjacency.from_table(new)
+        if not self._results:
+            return
+        # A new or removed edge changes common neighbors and degrees around both ends
+        ends = np.unique(np.concatenate([linked >> 32, linked & 0xFFFFFFFF])).astype(np.int32)
+        self._drop(ends.tolist())
+        self._drop(old_adj.expand(ends)[1].tolist())
+        self._drop(self.adj.expand(ends)[1].tolist())
+        for k in relabelled:
+            self._drop((k >> 32, k & 0xFFFFFFFF))
+
+    def _apply_events(self, events_data: Iterable[Dict[str, Any]]):
+        seen = set()
+        gone: List[int] = [] # slots whose incidence rows are replaced or removed
+        added: List[Tuple[int, Tuple[int, ...], int]] = []
+        for e in events_data:
+            event_id = e["id"]
+            seen.add(event_id)
+            people = tuple(sorted(set(self.ids.intern(p) for p in e.get("related_nodes", ()))))
+            ordinal = date_to_ordinal(e.get("date", ""))
+            known = self._events.get(event_id)
+            if known is not None and known[1] == people and known[2] == ordinal:
+                continue
+            if known is not None:
+                slot = known[0]
+                gone.append(slot)
+                self._drop(known[1])
+            else:
+                slot = self._free.pop() if self._free else len(self._events) + len(self._free)
+            self._events[event_id] = (slot, people, ordinal)
+            self._drop(people)
+            added.append((slot, people, ordinal))
+        for event_id in [x for x in self._events if x not in seen]:
+            slot, people, _ = self._events.pop(event_id)
+            gone.append(slot)
+            self._free.append(slot)
+            self._drop(people)
+        if not gone and not added:
+            return
+
+        keep = ~np.isin(self._inc_slot, np.array(gone, dtype=np.int32))
+        self._inc_slot = np.concatenate([self._inc_slot[keep],
+                                         np.array([s for s, people, _ in added for _ in people], dtype=np.int32)])
+        self._inc_node = np.concatenate([self._inc_node[keep],
+                                         np.array([p for _, people, _ in added for p in people], dtype=np.int32)])
+        n_slots = len(self._events) + len(self._free)
+        ordinal = np.zeros(n_slots, dtype=np.int32)
+        ordinal[:len(self._ordinal)] = self._ordinal[:n_slots]
+        for slot, _, o in added:
+            ordinal[slot] = o
+        self._ordinal = ordinal
+        self._by_node = self._by_event = None
+
+    def _incidence(self) -> Tuple[CSRAdjacency, CSRAdjacency]:
+        if self._by_node is None:
+            n = max(len(self.ids), int(self._inc_node.max()) + 1 if len(self._inc_node) else 0)
+            self._by_node = _csr(self._inc_node, self._inc_slot, n)
+            self._by_event = _csr(self._inc_slot, self._inc_node, len(self._ordinal))
+        return self._by_node, self._by_event
+
+    # --- Scores ---
+
+    def scores(self, node: int) -> Dict[str, np.ndarray]:
+        """
+        Per-candidate score vectors (indexed by node int) for one node: common
+        neighbors, Adamic-Adar, shared memories and their recency-weighted sum.
+        """
+        with self._lock:
+            by_node, by_event = self._incidence()
+            n = max(self.adj.n, by_node.n, node + 1)
+            adj = self.adj
+            # Row of A @ A (two-step walks), each step through a mid node worth 1/log(deg)
+            mids, reach, _ = adj.expand(adj.neighbors_of(node))
+            degree = adj.degree()
+            common = np.bincount(reach, minlength=n)
+            adamic_adar = np.bincount(reach, weights=1.0 / np.log(np.maximum(degree[mids], 2)), minlength=n)
+            # Row of B.T @ B, each event weighted by its recency
+            slots, people, _ = by_event.expand(by_node.neighbors_of(node))
+            age = np.where(self._ordinal[slots] > 0, self._today - self._ordinal[slots], RECENCY_HALF_LIFE_DAYS)
+            recency = 0.5 ** (np.maximum(age, 0) / RECENCY_HALF_LIFE_DAYS)
+            shared = np.bincount(people, minlength=n)
+            cooccurrence = np.bincount(people, weights=recency, minlength=n)
+            return {"common": common, "adamic_adar": adamic_adar, "shared": shared,
+                    "cooccurrence": cooccurrence}
+
+    def suggest(self, node_id: str, k: int = 10) -> List[Dict[str, Any]]:
+        """
+        Top-k people node_id might have a relation with, best first, as dicts with
+        id, score, common (neighbors), shared (memories) and linked (already has an
+        unlabelled edge).
+        """
+        node = self.ids.get(node_id)
+        if node < 0:
+            return []
+        with self._lock:
+            hit = self._results.get(node)
+            if hit is None:
+                hit = self._results[node] = self._compute(node)
+                if len(self._results) > RESULT_CACHE_SIZE:
+                    self._results.popitem(last=False)
+            else:
+                self._results.move_to_end(node)
+            return hit[:k]
+
+    def _compute(self, node: int) -> List[Dict[str, Any]]:
+        s = self.scores(node)
+        score = s["adamic_adar"] + COOCCURRENCE_WEIGHT * s["cooccurrence"]
+        # Not themselves, not Me (every tie to Me is implied), not already labelled
+        score[node] = 0
+        root = self.ids.get(ROOT_ID)
+        if 0 <= root < len(score):
+            score[root] = 0
+        row = self.adj.row(node)
+        nbrs = self.adj.neighbors[row]
+        pair_keys = [(min(node, int(m)) << 32) | max(node, int(m)) for m in nbrs.tolist()]
+        labelled = np.array([self.edges.labels.get(p, "") != "" for p in pair_keys], dtype=bool)
+        score[nbrs[labelled]] = 0
+        candidates = np.flatnonzero(score > 0)
+        if len(candidates) > MAX_SUGGESTIONS:
+            candidates = candidates[np.argpartition(-score[candidates], MAX_SUGGESTIONS)[:MAX_SUGGESTIONS]]
+        candidates = candidates[np.lexsort((candidates, -score[candidates]))]
+        linked = set(nbrs.tolist())
+        return [{"id": self.ids.lookup(c), "score": round(float(score[c]), 3), "common": int(s["common"][c]),
+                 "shared": int(s["shared"][c]), "linked": c in linked} for c in candidates.tolist()]
+
+# --- Process-wide engine ---
+
+_engine = LinkSuggestions()
+
+def get_engine(edges_data: List[Dict[str, Any]], load_events: Callable[[], Iterable[Dict[str, Any]]],
+               edges_version=None, events_version=None, tenant=None) -> LinkSuggestions:
+    """
+    The synced engine: the process-wide one, or a data_manager tenant store's own.
+    """
+    engine = _engine if tenant is None else tenant.index("link_prediction", partial(LinkSuggestions, tenant.interner()))
+    engine.sync(edges_data, load_events, edges_version, events_version)
+    return engine
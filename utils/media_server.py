@@ -0,0 +1,229 @@
+"""
+Immutable media URLs for images under assets/.
+
+Views used to hand local paths to st.image (and the graph embedded avatars as
+data URIs), so every rerun re-read the bytes and pushed them to the browser
+again. url() instead publishes the file under its content hash in MEDIA_DIR
+(a hard link, so no copy) and returns /app/static/media/<hash>.<ext>, which
+serve.py routes ahead of Streamlit's own static files (st.image passes
+/app/static/ URLs through to the browser as they are) with a one-year immutable
+Cache-Control. A name never changes content, so browsers reuse what they fetched
+across reruns and visits, and a changed file simply gets a new URL.
+
+"<hash>-w<width>.<ext>" is a thumbnail of the same content, made on first
+request and kept. Only THUMB_WIDTHS are served, so clients cannot request
+arbitrary resizes.
+
+Because published files are hard links, writers must replace files
+(tmp + os.replace), never rewrite them in place. MEDIA_DIR lives under data/tmp:
+it is a cache, left out of backups, and can be deleted at any time.
+
+Started with plain `streamlit run app.py` the route does not exist; src() then
+returns the path and url() None, and the views fall back to sending bytes.
+"""
+import hashlib
+import os
+import re
+import shutil
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+MEDIA_DIR = os.path.join("data", "tmp", "media")
+ROUTE = "/app/static/media" # Streamlit reserves /media; st.image only passes /app/static/ URLs through
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+THUMB_WIDTHS = (160, 480, 960) # px; views round a requested width up to one of these
+HASH_CHARS = 32 # hex digits of sha256 kept in names
+CHUNK_BYTES = 1 << 20
+MOUNTED_ENV = "DEEPMEMORY_MEDIA_ROUTE" # set by routes(); env so it survives module reloads
+CLEANUP_EVERY_SECONDS = 600
+
+_NAME = re.compile(r"^([0-9a-f]{%d})(?:-w(\d+))?(\.[a-z0-9]+)$" % HASH_CHARS)
+_TYPES = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg",
+          ".gif": "image/gif", ".webp": "image/webp"}
+
+_hashes: Dict[str, Tuple[int, int, str]] = {} # abspath -> (size, mtime_ns, name)
+_lock = threading.Lock()
+_thumb_lock = threading.Lock()
+_linked = False # hard links worked in this process (see cleanup)
+_last_cleanup = 0.0
+
+def mounted() -> bool:
+    return os.environ.get(MOUNTED_ENV) == "1"
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:HASH_CHARS]
+
+def _publish(path: str, name: str):
+    global _linked
+    target = os.path.join(MEDIA_DIR, name)
+    if os.path.exists(target):
+        return
+    os.makedirs(MEDIA_DIR, exist_ok=True)
+    tmp_path = f"{target}.{threading.get_ident()}.tmp"
+    try:
+        os.link(path, tmp_path)
+        _linked = True
+    except OSError:
+        # No hard links here (e.g. another filesystem): copy once
+        shutil.copyfile(path, tmp_path)
+    os.replace(tmp_path, target)
+
+def published_name(path: str) -> Optional[str]:
+    """
+    "<hash>.<ext>" for the file at path, published to MEDIA_DIR; None if it is
+    missing or not an image. Hashes are cached by (size, mtime), so a rerun costs a stat.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in _TYPES:
+        return None
+    key = os.path.abspath(path)
+    try:
+        stat = os.stat(key)
+    except OSError:
+        return None
+    with _lock:
+        cached = _hashes.get(key)
+    if cached and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+        name = cached[2]
+        if os.path.exists(os.path.join(MEDIA_DIR, name)):
+            return name
+    else:
+        name = _file_hash(key) + (".jpg" if ext == ".jpeg" else ext)
+    _publish(key, name)
+    with _lock:
+        _hashes[key] = (stat.st_size, stat.st_mtime_ns, name)
+    _maybe_cleanup()
+    return name
+
+def _thumb_width(width: Optional[int]) -> Optional[int]:
+    if not width:
+        return None
+    return next((w for w in THUMB_WIDTHS if w >= width), None) # wider than all: the original
+
+def url(path: str, width: Optional[int] = None) -> Optional[str]:
+    """
+    Immutable URL of an image (a thumbnail at least width px wide if width is
+    given), or None when the route is not mounted or the file is missing.
+    """
+    if not path or not mounted():
+        return None
+    try:
+        name = published_name(path)
+    except OSError as e:
+        print(f"Failed to publish {path}: {e}")
+        return None
+    if name is None:
+        return None
+    thumb = _thumb_width(width)
+    if thumb:
+        stem, ext = os.path.splitext(name)
+        name = f"{stem}-w{thumb}{ext}"
+    return f"{ROUTE}/{name}"
+
+def src(path: str, width: Optional[int] = None) -> str:
+    """
+    What to pass to st.image: the immutable URL when served, else the path.
+    """
+    return url(path, width) or path
+
+def _make_thumb(original: str, target: str, width: int):
+    from PIL import Image # deferred: only thumbnails need Pillow
+    with _thumb_lock:
+        if os.path.exists(target):
+            return
+        with Image.open(original) as img:
+            img.thumbnail((width, width * 4)) # bounded by width; tall images keep their shape
+            ext = os.path.splitext(target)[1]
+            if ext == ".jpg" and img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            tmp_path = target + ".tmp"
+            img.save(tmp_path, format=Image.registered_extensions()[ext])
+        os.replace(tmp_path, target)
+
+def resolve(name: str) -> Optional[str]:
+    """
+    The file to send for a requested name, making the thumbnail if needed;
+    None for anything that is not a published image.
+    """
+    match = _NAME.match(name)
+    if not match or match.group(3) not in _TYPES:
+        return None
+    digest, width, ext = match.groups()
+    original = os.path.join(MEDIA_DIR, digest + ext)
+    if not os.path.exists(original):
+        return None
+    if width is None:
+        return original
+    if int(width) not in THUMB_WIDTHS:
+        return None
+    target = os.path.join(MEDIA_DIR, name)
+    if not os.path.exists(target):
+        _make_thumb(original, target, int(width))
+    return target
+
+def routes():
+    """
+    Starlette routes serving MEDIA_DIR; pass them to st.App (see serve.py).
+    """
+    from starlette.concurrency import run_in_threadpool
+    from starlette.responses import FileResponse, Response
+    from starlette.routing import Route
+
+    async def media(request):
+        name = request.path_params["name"]
+        try:
+            path = await run_in_threadpool(resolve, name)
+        except Exception as e:
+            print(f"Failed to serve {name}: {e}")
+            path = None
+        if path is None:
+            return Response(status_code=404)
+        return FileResponse(path, media_type=_TYPES[os.path.splitext(path)[1]],
+                            headers={"Cache-Control": CACHE_CONTROL})
+
+    from streamlit import config
+    base = (config.get_option("server.baseUrlPath") or "").strip("/")
+    paths = [ROUTE] + ([f"/{base}{ROUTE}"] if base else []) # the browser may resolve URLs under either
+    os.environ[MOUNTED_ENV] = "1"
+    return [Route(f"{path}/{{name}}", media, methods=["GET", "HEAD"]) for path in paths]
+
+def cleanup() -> int:
+    """
+    Removes published files whose source is gone (its only link left is ours)
+    and their thumbnails. Returns the number of files removed.
+    """
+    if not _linked or not os.path.isdir(MEDIA_DIR):
+        return 0 # copies always have one link: nothing tells a stale one apart
+    stale = set()
+    for entry in os.scandir(MEDIA_DIR):
+        match = _NAME.match(entry.name)
+        try:
+            if match and match.group(2) is None and entry.stat().st_nlink == 1:
+                stale.add(match.group(1))
+        except OSError:
+            pass
+    removed = 0
+    for entry in os.scandir(MEDIA_DIR):
+        match = _NAME.match(entry.name)
+        if match and match.group(1) in stale:
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+def _maybe_cleanup():
+    # Piggybacks on publishing, at most once every CLEANUP_EVERY_SECONDS
+    global _last_cleanup
+    now = time.time()
+    with _lock:
+        if now - _last_cleanup < CLEANUP_EVERY_SECONDS:
+            return
+        _last_cleanup = now
+    cleanup()
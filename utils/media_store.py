@@ -0,0 +1,125 @@
+"""
+Disk-backed face crops.
+
+Crops produced during analysis are written straight away as small, size-capped
+PNG thumbnails to a temporary media area (data/tmp/crops), so analysis results and
+session state only carry file paths instead of decoded images. Committing a
+person moves their crop to the current tenant's assets/avatars/<id>.png; crops
+nobody committed are removed after CROP_TTL_SECONDS.
+"""
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Iterable, Optional
+
+from utils import data_manager
+
+CROPS_DIR = os.path.join("data", "tmp", "crops") # shared by all tenants, names are random
+THUMB_MAX_SIDE = 256 # px; avatars are shown at <= 100 px
+CROP_TTL_SECONDS = 7 * 24 * 3600 # as long as an unreviewed analysis job is kept
+CLEANUP_EVERY_SECONDS = 600
+
+_last_cleanup = 0.0
+_cleanup_lock = threading.Lock()
+
+def save_crop(image) -> str:
+    """
+    Writes a PIL image as a compressed thumbnail and returns its path.
+    """
+    os.makedirs(CROPS_DIR, exist_ok=True)
+    thumb = image.copy()
+    thumb.thumbnail((THUMB_MAX_SIDE, THUMB_MAX_SIDE))
+    if thumb.mode not in ("RGB", "RGBA", "L"):
+        thumb = thumb.convert("RGB")
+    path = os.path.join(CROPS_DIR, f"{uuid.uuid4().hex}.png")
+    tmp_path = path + ".tmp"
+    thumb.save(tmp_path, format="PNG", optimize=True)
+    os.replace(tmp_path, path)
+    _maybe_cleanup()
+    return path
+
+def avatar_dir() -> str:
+    return data_manager.current().avatar_dir
+
+def avatar_path(node_id: str) -> str:
+    return data_manager.avatar_path(node_id)
+
+def promote_crop(crop_path: str, node_id: str) -> Optional[str]:
+    """
+    Moves a temporary crop to the node's avatar. Returns the avatar path, or None
+    if the crop is gone (e.g. expired).
+    """
+    if not crop_path or not os.path.exists(crop_path):
+        return None
+    target = avatar_path(node_id)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.replace(crop_path, target)
+    except OSError:
+        # Different filesystem
+        shutil.move(crop_path, target)
+    _avatar_changed(node_id)
+    return target
+
+def save_avatar(node_id: str, data: bytes) -> str:
+    """
+    Writes an uploaded avatar image for a node.
+    """
+    target = avatar_path(node_id)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    # Replaced, not rewritten: the old file may be hard-linked as served media
+    tmp_path = target + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, target)
+    _avatar_changed(node_id)
+    return target
+
+def _avatar_changed(node_id: str):
+    # Keep the visual match index current (deferred: it needs numpy/Pillow)
+    try:
+        from utils import face_index
+        face_index.avatar_saved(node_id)
+    except Exception as e:
+        print(f"Failed to index avatar: {e}")
+
+def discard_crops(paths: Iterable[Optional[str]]):
+    """
+    Deletes temporary crops that will not be used (only files inside CROPS_DIR).
+    """
+    root = os.path.abspath(CROPS_DIR)
+    for path in paths:
+        if path and os.path.dirname(os.path.abspath(path)) == root:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+def cleanup_crops(ttl: float = CROP_TTL_SECONDS) -> int:
+    """
+    Removes crops older than ttl seconds. Returns the number of files removed.
+    """
+    if not os.path.isdir(CROPS_DIR):
+        return 0
+    cutoff = time.time() - ttl
+    removed = 0
+    for entry in os.scandir(CROPS_DIR):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+def _maybe_cleanup():
+    # Piggybacks on writes, at most once every CLEANUP_EVERY_SECONDS
+    global _last_cleanup
+    now = time.time()
+    with _cleanup_lock:
+        if now - _last_cleanup < CLEANUP_EVERY_SECONDS:
+            return
+        _last_cleanup = now
+    cleanup_crops()
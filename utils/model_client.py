@@ -0,0 +1,360 @@
+import os
+import re
+import abc
+import json
+import time
+import random
+import asyncio
+import hashlib
+import functools
+import threading
+
+# Pluggable model backend. The default talks to DashScope; the fake one runs fully
+# offline so ingestion and review can be exercised without the real service.
+CLIENT_ENV = "DEEPMEMORY_MODEL_CLIENT" # "dashscope" (default) or "fake"
+
+class ModelClient(abc.ABC):
+    """
+    Minimal interface used by image_processor. Both calls return objects shaped like
+    DashScope responses: status_code, code, message, output.choices[0].message.content
+    """
+    @abc.abstractmethod
+    def multimodal_call(self, model, messages, **kwargs):
+        ...
+
+    @abc.abstractmethod
+    def generation_call(self, model, prompt, **kwargs):
+        ...
+
+    # Streaming variants yield responses carrying only the new part of the content
+    # (DashScope's incremental_output). Clients without streaming yield one response.
+    def multimodal_stream(self, model, messages, **kwargs):
+        yield self.multimodal_call(model, messages, **kwargs)
+
+    def generation_stream(self, model, prompt, **kwargs):
+        yield self.generation_call(model, prompt, **kwargs)
+
+    # Async variants (used by resilient_client). By default the sync calls run in a
+    # worker thread; clients with a native async transport override them.
+    async def amultimodal_call(self, model, messages, **kwargs):
+        return await _in_thread(functools.partial(self.multimodal_call, model, messages, **kwargs))
+
+    async def ageneration_call(self, model, prompt, **kwargs):
+        return await _in_thread(functools.partial(self.generation_call, model, prompt, **kwargs))
+
+    async def amultimodal_stream(self, model, messages, **kwargs):
+        async for response in _threaded(self.multimodal_stream(model, messages, **kwargs)):
+            yield response
+
+    async def ageneration_stream(self, model, prompt, **kwargs):
+        async for response in _threaded(self.generation_stream(model, prompt, **kwargs)):
+            yield response
+
+def _in_thread(fn):
+    return asyncio.get_running_loop().run_in_executor(None, fn)
+
+async def _threaded(responses):
+    # Drives a blocking generator from a worker thread, one item at a time
+    done = object()
+    try:
+        while True:
+            response = await _in_thread(functools.partial(next, responses, done))
+            if response is done:
+                return
+            yield response
+    finally:
+        try:
+            responses.close()
+        except ValueError:
+            pass # still running in its thread (the caller timed out); it ends on its own
+
+class DashScopeClient(ModelClient):
+    """
+    Thin pass-through to the DashScope SDK.
+    """
+    def multimodal_call(self, model, messages, **kwargs):
+        from dashscope import MultiModalConversation
+        return MultiModalConversation.call(model=model, messages=messages, **kwargs)
+
+    def generation_call(self, model, prompt, **kwargs):
+        from dashscope import Generation
+        return Generation.call(model=model, prompt=prompt, **kwargs)
+
+    def multimodal_stream(self, model, messages, **kwargs):
+        from dashscope import MultiModalConversation
+        yield from MultiModalConversation.call(model=model, messages=messages, stream=True,
+                                               incremental_output=True, **kwargs)
+
+    def generation_stream(self, model, prompt, **kwargs):
+        from dashscope import Generation
+        yield from Generation.call(model=model, prompt=prompt, stream=True,
+                                   incremental_output=True, **kwargs)
+
+    # The SDK's aio classes share one pooled aiohttp session per event loop
+    async def amultimodal_call(self, model, messages, **kwargs):
+        from dashscope import AioMultiModalConversation
+        return await AioMultiModalConversation.call(model=model, messages=messages, **kwargs)
+
+    async def ageneration_call(self, model, prompt, **kwargs):
+        from dashscope import AioGeneration
+        return await AioGeneration.call(model=model, prompt=prompt, **kwargs)
+
+    async def amultimodal_stream(self, model, messages, **kwargs):
+        from dashscope import AioMultiModalConversation
+        async for response in await AioMultiModalConversation.call(model=model, messages=messages, stream=True,
+                                                                   incremental_output=True, **kwargs):
+            yield response
+
+    async def ageneration_stream(self, model, prompt, **kwargs):
+        from dashscope import AioGeneration
+        async for response in await AioGeneration.call(model=model, prompt=prompt, stream=True,
+                                                       incremental_output=True, **kwargs):
+            yield response
+
+# --- Offline fake ---
+
+class _Obj:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+def _make_response(content, status_code=200, code="", message=""):
+    choice = _Obj(message=_Obj(role="assistant", content=content), finish_reason="stop")
+    return _Obj(
+        status_code=status_code,
+        code=code,
+        message=message,
+        output=_Obj(choices=[choice]) if status_code == 200 else None,
+    )
+
+def error_response(status_code, code, message):
+    """
+    A DashScope-shaped failure, for errors raised before the service answered.
+    """
+    return _make_response(None, status_code, code, message)
+
+class LatencyModel:
+    """
+    Samples per-call latency in seconds.
+    kind: "none", "fixed" (a), "uniform" (a..b), "lognormal" (median a, sigma b)
+    """
+    def __init__(self, kind="none", a=0.0, b=0.0):
+        self.kind = kind
+        self.a = a
+        self.b = b
+
+    @classmethod
+    def parse(cls, spec):
+        # e.g. "lognormal:0.8,0.5" / "fixed:0.2" / "uniform:0.1,0.6"
+        if not spec:
+            return cls()
+        kind, _, args = spec.partition(":")
+        values = [float(v) for v in args.split(",") if v.strip()]
+        values += [0.0] * (2 - len(values))
+        return cls(kind.strip(), values[0], values[1])
+
+    def sample(self, rng):
+        if self.kind == "fixed":
+            return self.a
+        if self.kind == "uniform":
+            return rng.uniform(self.a, self.b)
+        if self.kind == "lognormal":
+            # median * exp(N(0, sigma))
+            return self.a * rng.lognormvariate(0.0, self.b)
+        return 0.0
+
+STREAM_CHUNK_CHARS = 24 # fake stream: characters per chunk
+STREAM_FIRST_TOKEN = 0.3 # fake stream: share of the latency before the first chunk
+
+_FAKE_DESCRIPTIONS = [
+    "戴眼镜的短发男生，穿蓝色衬衫",
+    "长发女生，穿白色连衣裙，面带微笑",
+    "中年男性，戴黑色鸭舌帽",
+    "扎马尾的女生，穿红色卫衣",
+    "留胡子的男性，穿灰色西装",
+    "短发女性，戴珍珠耳环",
+]
+_FAKE_NAMES = ["老王", "小李", "Alice", "Bob", "陈老师", "张阿姨"]
+_FAKE_RELATIONS = ["朋友", "同事", "邻居", "老师", "同学"]
+
+class FakeModelClient(ModelClient):
+    """
+    Deterministic offline stand-in for DashScope.
+
+    Content depends only on (seed, request payload), so the same photo or prompt always
+    yields the same detections. Fault injection (errors, malformed JSON) and latency are
+    drawn from a separate seeded stream so a retried call can succeed.
+    """
+    def __init__(self, seed=0, latency=None, error_rate=0.0, malformed_rate=0.0,
+                 max_people=4, match_rate=0.5, sleep=time.sleep):
+        self.seed = seed
+        self.latency = latency or LatencyModel()
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.max_people = max_people
+        self.match_rate = match_rate
+        self.sleep = sleep
+        self.calls = 0
+        self._fault_rng = random.Random(seed)
+        self._lock = threading.Lock() # calls and _fault_rng are shared by concurrent callers
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            seed=int(os.environ.get("DEEPMEMORY_FAKE_SEED", "0")),
+            latency=LatencyModel.parse(os.environ.get("DEEPMEMORY_FAKE_LATENCY", "")),
+            error_rate=float(os.environ.get("DEEPMEMORY_FAKE_ERROR_RATE", "0")),
+            malformed_rate=float(os.environ.get("DEEPMEMORY_FAKE_MALFORMED_RATE", "0")),
+        )
+
+    def _content_rng(self, payload):
+        digest = hashlib.sha1(f"{self.seed}:{payload}".encode("utf-8")).hexdigest()
+        return random.Random(int(digest[:16], 16))
+
+    def _begin_call(self, stream=False):
+        """
+        Applies latency and decides the fault for this call.
+        Returns (fault, remaining_delay); fault is an error response, "malformed", or None.
+        Streaming calls only wait for the first token here and spread the remaining
+        delay over the chunks (see _stream).
+        """
+        with self._lock:
+            # One call's draws stay together under concurrency; the sleep is outside the lock
+            self.calls += 1
+            delay = self.latency.sample(self._fault_rng)
+            roll = self._fault_rng.random()
+            throttled = self._fault_rng.random() < 0.5 if roll < self.error_rate else False
+        remaining = delay * (1 - STREAM_FIRST_TOKEN) if stream else 0.0
+        if delay - remaining > 0:
+            self.sleep(delay - remaining)
+        if roll < self.error_rate:
+            if throttled:
+                return _make_response(None, 429, "Throttling.RateQuota", "Requests rate limit exceeded"), 0.0
+            return _make_response(None, 500, "InternalError", "Internal server error"), 0.0
+        if roll < self.error_rate + self.malformed_rate:
+            return "malformed", remaining
+        return None, remaining
+
+    @staticmethod
+    def _render(data, malformed):
+        text = "```json\n" + json.dumps(data, ensure_ascii=False, indent=2) + "\n```"
+        if malformed:
+            # Cut the payload mid-object, like a truncated completion
+            return text[:max(1, len(text) // 2)]
+        return text
+
+    def _detections(self, rng, context_text):
+        people = []
+        for _ in range(rng.randint(0, self.max_people)):
+            ymin = rng.randint(0, 700)
+            xmin = rng.randint(0, 700)
+            ymax = min(1000, ymin + rng.randint(100, 300))
+            xmax = min(1000, xmin + rng.randint(80, 300))
+            name = rng.choice(_FAKE_NAMES) if context_text and rng.random() < 0.5 else None
+            people.append({
+                "description": rng.choice(_FAKE_DESCRIPTIONS),
+                "suggested_name": name,
+                "confidence_reason": "根据线索推断" if name else "线索不足",
+                "box_2d": [ymin, xmin, ymax, xmax],
+            })
+        return people
+
+    def _stream(self, text, wrap, delay):
+        # Splits the rest of the latency evenly over the chunks
+        chunks = [text[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(text), STREAM_CHUNK_CHARS)] or [""]
+        step = delay / len(chunks)
+        for i, chunk in enumerate(chunks):
+            if i and step > 0:
+                self.sleep(step)
+            yield _make_response(wrap(chunk))
+
+    def multimodal_call(self, model, messages, **kwargs):
+        fault, _ = self._begin_call()
+        if fault is not None and fault != "malformed":
+            return fault
+        return _make_response([{"text": self._multimodal_text(model, messages, fault)}])
+
+    def multimodal_stream(self, model, messages, **kwargs):
+        fault, delay = self._begin_call(stream=True)
+        if fault is not None and fault != "malformed":
+            yield fault
+            return
+        yield from self._stream(self._multimodal_text(model, messages, fault), lambda c: [{"text": c}], delay)
+
+    def _multimodal_text(self, model, messages, fault):
+        content = messages[0]["content"]
+        image = next((c["image"] for c in content if "image" in c), "")
+        prompt = next((c["text"] for c in content if "text" in c), "")
+        clue = re.search(r'线索是："(.*?)"', prompt)
+        context_text = clue.group(1) if clue else ""
+
+        rng = self._content_rng(f"{model}|{image}|{context_text}")
+        return self._render(self._detections(rng, context_text), fault == "malformed")
+
+    def generation_call(self, model, prompt, **kwargs):
+        fault, _ = self._begin_call()
+        if fault is not None and fault != "malformed":
+            return fault
+        return _make_response(self._generation_text(model, prompt, fault))
+
+    def generation_stream(self, model, prompt, **kwargs):
+        fault, delay = self._begin_call(stream=True)
+        if fault is not None and fault != "malformed":
+            yield fault
+            return
+        yield from self._stream(self._generation_text(model, prompt, fault), lambda c: c, delay)
+
+    def _generation_text(self, model, prompt, fault):
+        rng = self._content_rng(f"{model}|{prompt}")
+        entities = re.findall(r'"entity": (\d+), "description"', prompt)
+        if entities:
+            # Batched matching; ids may repeat, like a model ignoring the constraint
+            known_ids = re.findall(r"ID: ([^,\"]+), Name:", prompt)
+            data = []
+            for k in entities:
+                if known_ids and rng.random() < self.match_rate:
+                    data.append({"entity": int(k), "match_found": True, "suggested_id": rng.choice(known_ids),
+                                 "confidence": round(rng.uniform(0.5, 1.0), 2), "reason": "外貌特征相似"})
+                else:
+                    data.append({"entity": int(k), "match_found": False})
+        elif "match_found" in prompt:
+            known_ids = re.findall(r"ID: ([^,\"]+), Name:", prompt)
+            if known_ids and rng.random() < self.match_rate:
+                data = {"match_found": True, "suggested_id": rng.choice(known_ids), "reason": "外貌特征相似"}
+            else:
+                data = {"match_found": False}
+        else:
+            names = rng.sample(_FAKE_NAMES, rng.randint(0, 3))
+            data = [{
+                "name": name,
+                "relation": rng.choice(_FAKE_RELATIONS),
+                "description": "日记中提到的人物",
+            } for name in names]
+        return self._render(data, fault == "malformed")
+
+# --- Client selection ---
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client() -> ModelClient:
+    """
+    The process-wide client: the selected backend behind the rate limiter,
+    retries and circuit breaker of resilient_client.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            from utils.resilient_client import ResilientClient
+            if os.environ.get(CLIENT_ENV, "dashscope").lower() == "fake":
+                _client = ResilientClient(FakeModelClient.from_env())
+            else:
+                _client = ResilientClient(DashScopeClient())
+        return _client
+
+def set_client(client: ModelClient):
+    """
+    Swaps the process-wide client (e.g. a configured FakeModelClient for benchmarks).
+    """
+    global _client
+    with _client_lock:
+        _client = client
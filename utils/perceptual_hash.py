@@ -0,0 +1,261 @@
+"""
+Perceptual image hashes and a Hamming-distance index.
+
+- dhash: 64-bit difference hash (gradient signs of a 9x8 grayscale thumbnail).
+- phash: 64-bit DCT hash (low 8x8 frequencies of a 32x32 thumbnail vs. their median).
+Similar images have hashes a few bits apart; unrelated ones differ in ~32 of 64 bits.
+
+HashIndex keeps (key -> file, hashes) persisted as a small record file and answers
+"which keys are within r bits of this hash" with multi-index hashing over the
+pHashes, so a lookup visits a small part of the index instead of every entry.
+"""
+import os
+import threading
+from functools import lru_cache
+from itertools import combinations
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils import record_store
+
+HASH_SIZE = 8 # 8x8 = 64-bit hashes
+PHASH_SAMPLE = 32 # thumbnail side for the DCT
+
+_popcount = getattr(int, "bit_count", None) or (lambda x: bin(x).count("1"))
+
+def hamming(a: int, b: int) -> int:
+    return _popcount(a ^ b)
+
+def _gray(image, size: Tuple[int, int]) -> np.ndarray:
+    # image: PIL image or file path
+    from PIL import Image # deferred: Pillow is only needed when hashing
+    if isinstance(image, (str, os.PathLike)):
+        with Image.open(image) as img:
+            return _gray(img, size)
+    small = image.convert("L").resize(size, Image.LANCZOS)
+    return np.asarray(small, dtype=np.float64)
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.astype(np.uint8).ravel()).tobytes(), "big")
+
+def dhash(image) -> int:
+    pixels = _gray(image, (HASH_SIZE + 1, HASH_SIZE))
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    m = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    m[0] /= np.sqrt(2.0)
+    return m
+
+_DCT = _dct_matrix(PHASH_SAMPLE)
+
+def phash(image) -> int:
+    pixels = _gray(image, (PHASH_SAMPLE, PHASH_SAMPLE))
+    low = (_DCT @ pixels @ _DCT.T)[:HASH_SIZE, :HASH_SIZE]
+    # The DC term only encodes overall brightness
+    median = np.median(low.ravel()[1:])
+    return _bits_to_int(low > median)
+
+def hashes(image) -> Tuple[int, int]:
+    """
+    (phash, dhash) of an image or image file, decoding it once.
+    """
+    from PIL import Image
+    if isinstance(image, (str, os.PathLike)):
+        with Image.open(image) as img:
+            img.load()
+            return phash(img), dhash(img)
+    return phash(image), dhash(image)
+
+@lru_cache(maxsize=None)
+def _flip_masks(bits: int, radius: int) -> Tuple[int, ...]:
+    # All masks of `bits` width with at most `radius` bits set
+    return tuple(sum(1 << i for i in combo)
+                 for r in range(radius + 1) for combo in combinations(range(bits), r))
+
+class MultiIndexHash:
+    """
+    Multi-index hashing over 64-bit hashes under Hamming distance. Each hash is split
+    into CHUNKS substrings with one lookup table each. Two hashes at most r bits apart
+    differ in at most r // CHUNKS bits in some chunk (pigeonhole), so a lookup probes
+    every table with the chunk values within that distance and verifies the
+    candidates, touching only a tiny part of the index.
+    """
+    CHUNKS = 4
+    CHUNK_BITS = 16
+
+    def __init__(self):
+        self.tables: List[Dict[int, List[Tuple[int, Any]]]] = [{} for _ in range(self.CHUNKS)]
+        self.size = 0
+
+    def _chunks(self, value: int):
+        mask = (1 << self.CHUNK_BITS) - 1
+        return [(value >> (i * self.CHUNK_BITS)) & mask for i in range(self.CHUNKS)]
+
+    def add(self, value: int, key: Any):
+        for table, chunk in zip(self.tables, self._chunks(value)):
+            table.setdefault(chunk, []).append((value, key))
+        self.size += 1
+
+    def remove(self, value: int, key: Any) -> bool:
+        """
+        Removes one (value, key) added before; False if it is not in the index.
+        """
+        removed = False
+        for table, chunk in zip(self.tables, self._chunks(value)):
+            bucket = table.get(chunk, [])
+            if (value, key) in bucket:
+                bucket.remove((value, key))
+                removed = True
+                if not bucket:
+                    del table[chunk]
+        if removed:
+            self.size -= 1
+        return removed
+
+    def search(self, value: int, radius: int) -> List[Tuple[int, Any]]:
+        """
+        All (distance, key) with distance <= radius.
+        """
+        masks = _flip_masks(self.CHUNK_BITS, radius // self.CHUNKS)
+        seen = set()
+        found = []
+        for table, chunk in zip(self.tables, self._chunks(value)):
+            for mask in masks:
+                for candidate, key in table.get(chunk ^ mask, ()):
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    d = hamming(candidate, value)
+                    if d <= radius:
+                        found.append((d, key))
+        return found
+
+class HashIndex:
+    """
+    Persistent key -> image hash table with multi-index-hash lookups.
+
+    Entry: {"key", "path", "phash", "dhash", "mtime_ns", "size", ...extra fields}
+    (hashes stored as 16-digit hex strings). A file is only re-hashed when its
+    mtime or size changed.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._mih: Optional[MultiIndexHash] = None
+        try:
+            for e in record_store.iter_records(path):
+                self._entries[e["key"]] = e
+        except (FileNotFoundError, record_store.RecordFormatError):
+            pass
+
+    def __len__(self):
+        return len(self._entries)
+
+    def save(self):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            record_store.save_records(self.path, list(self._entries.values()))
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._entries.get(key)
+
+    def entries(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._entries.values())
+
+    def add(self, key: str, image_path: str, persist: bool = True, **extra) -> Optional[Dict[str, Any]]:
+        """
+        Hashes image_path under key (skipped if the file is unchanged). Returns the
+        entry, or None if the file cannot be read.
+        """
+        try:
+            stat = os.stat(image_path)
+        except OSError:
+            return None
+        with self._lock:
+            old = self._entries.get(key)
+            if old and old["path"] == image_path and old["mtime_ns"] == stat.st_mtime_ns and old["size"] == stat.st_size:
+                if extra and any(old.get(k) != v for k, v in extra.items()):
+                    old.update(extra)
+                    if persist:
+                        self.save()
+                return old
+        try:
+            p, d = hashes(image_path)
+        except Exception:
+            return None
+        entry = dict(extra, key=key, path=image_path, phash=f"{p:016x}", dhash=f"{d:016x}",
+                     mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+        with self._lock:
+            if key in self._entries and self._mih is not None:
+                self._mih.remove(int(self._entries[key]["phash"], 16), key)
+            self._entries[key] = entry
+            if self._mih is not None:
+                self._mih.add(p, key)
+            if persist:
+                self.save()
+        return entry
+
+    def remove(self, key: str, persist: bool = True):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                if self._mih is not None:
+                    self._mih.remove(int(old["phash"], 16), key)
+                if persist:
+                    self.save()
+
+    def sync(self, files: Dict[str, str], extras: Optional[Dict[str, Dict[str, Any]]] = None) -> int:
+        """
+        Makes the index cover exactly the readable files ({key: path}, with optional
+        extra fields per key); returns the number of entries added, re-hashed or removed.
+        """
+        changed = 0
+        extras = extras or {}
+        with self._lock:
+            for key in [k for k in self._entries if k not in files]:
+                self.remove(key, persist=False)
+                changed += 1
+        for key, path in files.items():
+            before = self._entries.get(key)
+            before_extra = {k: before.get(k) for k in extras.get(key, {})} if before else None
+            entry = self.add(key, path, persist=False, **extras.get(key, {}))
+            if entry is None:
+                # Unreadable or missing file: a stale entry would still match
+                if before is not None:
+                    self.remove(key, persist=False)
+                    changed += 1
+                continue
+            if entry is not before or before_extra != {k: entry.get(k) for k in extras.get(key, {})}:
+                changed += 1
+        if changed:
+            self.save()
+        return changed
+
+    def _lookup(self) -> MultiIndexHash:
+        if self._mih is None:
+            mih = MultiIndexHash()
+            for e in self._entries.values():
+                mih.add(int(e["phash"], 16), e["key"])
+            self._mih = mih
+        return self._mih
+
+    def search(self, p: int, radius: int, d: Optional[int] = None) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        Entries whose pHash is within radius bits of p, nearest first. With a dHash,
+        the distance is the mean of both hash distances.
+        """
+        with self._lock:
+            hits = []
+            for dist, key in self._lookup().search(p, radius):
+                e = self._entries[key]
+                if d is not None:
+                    dist = (dist + hamming(int(e["dhash"], 16), d)) / 2
+                hits.append((dist, e))
+        hits.sort(key=lambda h: h[0])
+        return hits
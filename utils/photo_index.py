@@ -0,0 +1,83 @@
+"""
+Near-duplicate detection for memory photos.
+
+Every image attached to an event is kept in a perceptual-hash index
+(data/photo_hashes.json, one per tenant, keyed by image path, with the ids of
+the events using it). The index is re-synced with the event store whenever its version changes;
+only new or modified files are hashed. Uploads are checked against it before any
+analysis is started, so a burst shot or a re-upload can reuse the earlier event
+instead of triggering another model call.
+"""
+import io
+import os
+import threading
+from typing import Any, Dict, List, Tuple
+
+from utils import data_manager
+from utils.perceptual_hash import HashIndex, hashes
+
+INDEX_FILE = "photo_hashes.json" # in the tenant's data dir
+DUPLICATE_BITS = 6 # mean pHash/dHash distance (of 64) counted as the same photo
+
+_lock = threading.Lock()
+
+def get_index() -> HashIndex:
+    """
+    The current tenant's photo index, synced with its events.
+    """
+    with _lock:
+        tenant = data_manager.current()
+        state = tenant.index("photo_index", lambda: {
+            "index": HashIndex(os.path.join(tenant.data_dir, INDEX_FILE)), "version": None})
+        index = state["index"]
+        version = data_manager.get_events_version()
+        if version != state["version"]:
+            event_ids: Dict[str, List[str]] = {}
+            for e in data_manager.iter_events():
+                for path in e.get('images', []):
+                    event_ids.setdefault(path, []).append(e['id'])
+            index.sync({p: p for p in event_ids}, {p: {"event_ids": ids} for p, ids in event_ids.items()})
+            state["version"] = version
+        return index
+
+def find_near_duplicates(image, radius: float = DUPLICATE_BITS) -> List[Tuple[float, Dict[str, Any]]]:
+    """
+    Indexed photos that look like image (a path, PIL image or raw bytes of an
+    upload), nearest first, as (distance, entry) with entry["event_ids"].
+    """
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        from PIL import Image # deferred: Pillow
+        with Image.open(io.BytesIO(bytes(image))) as img:
+            img.load()
+            p, d = hashes(img)
+    else:
+        p, d = hashes(image)
+    # The pHash alone may be up to 2 * radius bits off when the dHash is identical
+    hits = get_index().search(p, int(2 * radius), d)
+    return [(dist, e) for dist, e in hits if dist <= radius]
+
+def find_duplicate_groups(radius: float = DUPLICATE_BITS) -> List[List[Dict[str, Any]]]:
+    """
+    Batch scan of the whole library: groups of photos that are near-duplicates of
+    each other (transitively), largest first.
+    """
+    index = get_index()
+    entries = index.entries()
+    parent = {e["key"]: e["key"] for e in entries}
+
+    def find(k):
+        while parent[k] != k:
+            parent[k] = parent[parent[k]]
+            k = parent[k]
+        return k
+
+    for e in entries:
+        p, d = int(e["phash"], 16), int(e["dhash"], 16)
+        for dist, other in index.search(p, int(2 * radius), d):
+            if dist <= radius and other["key"] != e["key"]:
+                parent[find(other["key"])] = find(e["key"])
+
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for e in entries:
+        groups.setdefault(find(e["key"]), []).append(e)
+    return sorted((g for g in groups.values() if len(g) > 1), key=len, reverse=True)
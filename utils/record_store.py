@@ -0,0 +1,177 @@
+"""
+Compact record file format for the DeepMemory stores.
+
+Layout (".dmr"):
+    header  : MAGIC (4 bytes) | format version (u8) | codec (u8)
+    records : length (u32, little endian) | payload, repeated until EOF
+
+Each payload is one dict, encoded with msgpack when available, otherwise with
+compact UTF-8 JSON. Records can be streamed one at a time and appended without
+rewriting the file. Legacy ".json" list files are read and written transparently.
+
+Conversion:
+    python -m utils.record_store convert data/events.json data/events.dmr
+    python -m utils.record_store convert data/events.dmr data/events.json
+"""
+import json
+import os
+import struct
+import sys
+from typing import Any, Dict, Iterable, Iterator, List
+
+try:
+    import msgpack
+except ImportError: # listed in requirements.txt; without it JSON payloads are written
+    msgpack = None
+
+MAGIC = b"DMRS"
+FORMAT_VERSION = 1
+BINARY_EXT = ".dmr"
+
+CODEC_JSON = 0
+CODEC_MSGPACK = 1
+
+_HEADER = struct.Struct("<4sBB")
+_LENGTH = struct.Struct("<I")
+
+class RecordFormatError(ValueError):
+    pass
+
+def default_codec() -> int:
+    return CODEC_MSGPACK if msgpack is not None else CODEC_JSON
+
+def is_binary(filepath: str) -> bool:
+    return filepath.endswith(BINARY_EXT)
+
+def _encoder(codec: int):
+    if codec == CODEC_MSGPACK:
+        return lambda r: msgpack.packb(r, use_bin_type=True)
+    return lambda r: json.dumps(r, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def _decoder(codec: int):
+    if codec == CODEC_MSGPACK:
+        if msgpack is None:
+            raise RecordFormatError("file was written with msgpack, which is not installed")
+        return lambda b: msgpack.unpackb(b, raw=False)
+    if codec == CODEC_JSON:
+        return lambda b: json.loads(b.decode("utf-8"))
+    raise RecordFormatError(f"unknown codec {codec}")
+
+def read_header(f) -> int:
+    """
+    Validates the header and returns the codec id.
+    """
+    raw = f.read(_HEADER.size)
+    if len(raw) < _HEADER.size:
+        raise RecordFormatError("truncated header")
+    magic, version, codec = _HEADER.unpack(raw)
+    if magic != MAGIC:
+        raise RecordFormatError("not a DeepMemory record file")
+    if version > FORMAT_VERSION:
+        raise RecordFormatError(f"format version {version} is newer than supported ({FORMAT_VERSION})")
+    return codec
+
+def _iter_binary(filepath: str) -> Iterator[Dict[str, Any]]:
+    with open(filepath, "rb") as f:
+        decode = _decoder(read_header(f))
+        while True:
+            prefix = f.read(_LENGTH.size)
+            if len(prefix) < _LENGTH.size:
+                # EOF, or a torn length prefix from an interrupted append
+                return
+            (size,) = _LENGTH.unpack(prefix)
+            payload = f.read(size)
+            if len(payload) < size:
+                return
+            yield decode(payload)
+
+def iter_records(filepath: str) -> Iterator[Dict[str, Any]]:
+    """
+    Streams records from a store file without materializing the whole list
+    (legacy JSON files still have to be parsed in one go).
+    """
+    if not os.path.exists(filepath):
+        return iter(())
+    if is_binary(filepath):
+        return _iter_binary(filepath)
+    with open(filepath, "r", encoding="utf-8") as f:
+        try:
+            return iter(json.load(f))
+        except json.JSONDecodeError as e:
+            raise RecordFormatError(f"{filepath} is not valid JSON: {e}") from e
+
+def load_records(filepath: str) -> List[Dict[str, Any]]:
+    # Unreadable files raise (see iter_records): never treat them as empty
+    return list(iter_records(filepath))
+
+def _write_binary(f, records: Iterable[Dict[str, Any]], codec: int):
+    encode = _encoder(codec)
+    f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, codec))
+    for r in records:
+        payload = encode(r)
+        f.write(_LENGTH.pack(len(payload)))
+        f.write(payload)
+
+def save_records(filepath: str, records: Iterable[Dict[str, Any]], codec: int = None,
+                 fsync: bool = False):
+    """
+    Writes records atomically (temp file + rename), in the format implied by the extension.
+    With fsync, the data is on disk before the rename makes it visible.
+    """
+    tmp_path = filepath + ".tmp"
+    if is_binary(filepath):
+        with open(tmp_path, "wb") as f:
+            _write_binary(f, records, default_codec() if codec is None else codec)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+    else:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(list(records), f, ensure_ascii=False, indent=2)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+    os.replace(tmp_path, filepath)
+
+def append_records(filepath: str, records: Iterable[Dict[str, Any]]):
+    """
+    Appends to a binary store in place; JSON stores fall back to a full rewrite.
+    """
+    records = list(records)
+    if not is_binary(filepath) or not os.path.exists(filepath):
+        save_records(filepath, load_records(filepath) + records)
+        return
+    with open(filepath, "rb") as f:
+        codec = read_header(f)
+    encode = _encoder(codec)
+    with open(filepath, "ab") as f:
+        for r in records:
+            payload = encode(r)
+            f.write(_LENGTH.pack(len(payload)) + payload)
+
+def convert(src: str, dst: str, codec: int = None) -> int:
+    """
+    Converts between JSON and binary stores based on file extensions.
+    Returns the number of records written.
+    """
+    count = 0
+    def counted():
+        nonlocal count
+        for r in iter_records(src):
+            count += 1
+            yield r
+    save_records(dst, counted(), codec)
+    return count
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 3 or argv[0] != "convert":
+        print("usage: python -m utils.record_store convert SRC DST", file=sys.stderr)
+        return 2
+    _, src, dst = argv
+    count = convert(src, dst)
+    print(f"{src} -> {dst}: {count} records, {os.path.getsize(src)} -> {os.path.getsize(dst)} bytes")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
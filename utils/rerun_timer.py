@@ -0,0 +1,57 @@
+"""
+Timing of script runs and fragment reruns.
+
+With DEEPMEMORY_PROFILE_RERUNS=1, app.py times every full run (scope
+"app:<page>") and every fragment body (e.g. "inspector.profile") into a small
+process-wide buffer, summarised under Developer Options. Comparing a fragment's
+time with the full run of its page shows what an interaction inside it saves.
+"""
+import functools
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Callable, Dict, List
+
+ENABLED = os.environ.get("DEEPMEMORY_PROFILE_RERUNS", "0") == "1"
+SAMPLES_PER_SCOPE = 200 # most recent timings kept per scope
+
+_samples: Dict[str, deque] = defaultdict(lambda: deque(maxlen=SAMPLES_PER_SCOPE))
+_lock = threading.Lock()
+
+def record(scope: str, ms: float):
+    with _lock:
+        _samples[scope].append(ms)
+
+def timed(scope: str) -> Callable:
+    """
+    Decorator that records how long each call takes (a no-op when disabled).
+    Apply it under @st.fragment so fragment reruns are timed too.
+    """
+    def wrap(fn):
+        if not ENABLED:
+            return fn
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(scope, (time.perf_counter() - start) * 1000)
+        return inner
+    return wrap
+
+def summary() -> List[Dict[str, float]]:
+    """
+    One row per scope: runs, median and p90 in milliseconds, slowest first.
+    """
+    with _lock:
+        snapshot = {scope: sorted(values) for scope, values in _samples.items() if values}
+    rows = [{"scope": scope, "runs": len(v), "median_ms": round(v[len(v) // 2], 1),
+             "p90_ms": round(v[min(len(v) - 1, int(len(v) * 0.9))], 1)}
+            for scope, v in snapshot.items()]
+    return sorted(rows, key=lambda r: r["median_ms"], reverse=True)
+
+def reset():
+    with _lock:
+        _samples.clear()
@@ -0,0 +1,378 @@
+"""
+Rate-limited, retrying access to the model service.
+
+ResilientClient wraps a ModelClient backend and is what get_client() returns.
+Every call (sync or async, plain or streamed) goes through:
+
+- a token bucket (RATE_PER_SECOND sustained, BURST at once), slowed down further
+  for a while after the service throttles us;
+- at most MAX_CONCURRENCY calls in flight across all threads and sessions;
+- a per-call timeout (CALL_TIMEOUT_SECONDS; for streams, the wait for each chunk);
+- up to MAX_ATTEMPTS tries on throttling, 5xx, timeouts and connection errors,
+  with exponential backoff and full jitter. A stream is only retried before its
+  first chunk, so nothing is delivered twice;
+- a circuit breaker: after BREAKER_FAILURES failed attempts in a row, calls fail
+  fast (503 "CircuitOpen") for BREAKER_RESET_SECONDS, then a single probe decides.
+  Throttling does not count, since the service is up.
+
+Failures are still returned as DashScope-shaped responses (status_code, code,
+message), so callers handle them as before.
+
+All the work runs on one event loop in a background thread. The sync methods
+and async callers on other loops hand their calls to it, so one limiter and one
+set of pooled connections serve every thread. stats() reports latency, retries,
+throttles, timeouts and rejections.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+from utils.model_client import ModelClient, error_response
+
+RATE_PER_SECOND = float(os.environ.get("DEEPMEMORY_MODEL_RATE", "5")) # sustained requests per second
+BURST = int(os.environ.get("DEEPMEMORY_MODEL_BURST", "10")) # requests allowed back to back
+MAX_CONCURRENCY = int(os.environ.get("DEEPMEMORY_MODEL_CONCURRENCY", "4"))
+CALL_TIMEOUT_SECONDS = float(os.environ.get("DEEPMEMORY_MODEL_TIMEOUT", "120"))
+MAX_ATTEMPTS = 4
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 10.0
+BREAKER_FAILURES = 5 # consecutive failed attempts that open the circuit
+BREAKER_RESET_SECONDS = 30.0
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+LATENCY_SAMPLES = 500 # most recent successful call latencies kept for stats
+
+class TokenBucket:
+    """
+    Reservation-based token bucket: each caller takes a token now and is told
+    how long to wait for it, so waiting needs no lock. Thread-safe.
+    """
+    def __init__(self, rate: float, burst: int, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self._tokens = float(burst)
+        self._stamp = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+    def penalize(self, seconds: float):
+        # After a throttle: no new tokens for a while, for every caller
+        with self._lock:
+            self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+    async def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+class CircuitBreaker:
+    """
+    closed -> open after `failures` failed attempts in a row; open -> half-open
+    after `reset_seconds`, letting one probe through; its result closes or reopens.
+    """
+    def __init__(self, failures: int = BREAKER_FAILURES, reset_seconds: float = BREAKER_RESET_SECONDS,
+                 clock=time.monotonic):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.state = "closed"
+        self.opened = 0 # times the circuit opened
+        self._streak = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open" and self.clock() - self._opened_at >= self.reset_seconds:
+                self.state = "half-open"
+            if self.state == "closed":
+                return True
+            if self.state == "half-open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.state, self._streak, self._probing = "closed", 0, False
+
+    def release(self):
+        """
+        Ends a half-open probe without a verdict (throttled, or cancelled): the
+        next call probes again.
+        """
+        with self._lock:
+            if self.state == "half-open":
+                self._probing = False
+
+    def failure(self):
+        with self._lock:
+            self._streak += 1
+            if self.state == "half-open" or (self.state == "closed" and self._streak >= self.failures):
+                self.state, self._opened_at = "open", self.clock()
+                self.opened += 1
+            self._probing = False
+
+class ResilientClient(ModelClient):
+    """
+    A ModelClient that adds rate limiting, bounded concurrency, timeouts,
+    retries and a circuit breaker around a backend ModelClient.
+    """
+    def __init__(self, backend: ModelClient, rate: float = RATE_PER_SECOND, burst: int = BURST,
+                 concurrency: int = MAX_CONCURRENCY, timeout: float = CALL_TIMEOUT_SECONDS,
+                 attempts: int = MAX_ATTEMPTS, backoff_base: float = BACKOFF_BASE_SECONDS,
+                 backoff_max: float = BACKOFF_MAX_SECONDS, breaker: Optional[CircuitBreaker] = None,
+                 seed: Optional[int] = None):
+        self.backend = backend
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.attempts = attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self._rng = random.Random(seed)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._loop_lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._counts = {"calls": 0, "ok": 0, "failed": 0, "attempts": 0, "retries": 0,
+                        "throttled": 0, "timeouts": 0, "errors": 0, "rejected": 0, "in_flight": 0}
+
+    # --- Event loop ---
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="model-client", daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    def _on_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def _run(self, coro):
+        # Blocking: runs a coroutine on the client loop from any other thread
+        loop = self._ensure_loop()
+        if self._on_loop():
+            coro.close()
+            raise RuntimeError("sync model calls cannot be made from the client's own event loop")
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    async def _await(self, coro):
+        # Async: runs a coroutine on the client loop from any event loop
+        loop = self._ensure_loop()
+        if self._on_loop():
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+    # --- Calls ---
+
+    def _slot(self) -> asyncio.Semaphore:
+        # Created on the client loop (older Pythons bind it at construction)
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        return self._slots
+
+    def _backoff(self, attempt: int) -> float:
+        return self._rng.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+    def _settle(self, response) -> str:
+        # "ok", "retry" or "final"; updates the breaker and counters
+        status = getattr(response, "status_code", 200)
+        if status == 200:
+            self.breaker.success()
+            return "ok"
+        if status == 429:
+            self._counts["throttled"] += 1
+            self.breaker.release() # answered, but says nothing about its health
+            return "retry"
+        if status in RETRYABLE_STATUS:
+            self.breaker.failure()
+            return "retry"
+        self.breaker.success() # the service answered; the request itself was wrong
+        return "final"
+
+    async def _attempt(self, send):
+        # One try under the limiter: (response, outcome)
+        if not self.breaker.allow():
+            self._counts["rejected"] += 1
+            return error_response(503, "CircuitOpen", "Model service unavailable; failing fast"), "final"
+        await self.bucket.acquire()
+        self._counts["attempts"] += 1
+        try:
+            response = await asyncio.wait_for(send(), self.timeout)
+        except asyncio.TimeoutError:
+            self._counts["timeouts"] += 1
+            response = error_response(504, "RequestTimeout", f"No answer within {self.timeout:g}s")
+        except Exception as e:
+            self._counts["errors"] += 1
+            response = error_response(503, "ConnectionError", str(e))
+        except BaseException:
+            self.breaker.release() # cancelled (e.g. a stream's consumer went away)
+            raise
+        return response, self._settle(response)
+
+    async def _retrying(self, send):
+        self._counts["calls"] += 1
+        start = time.perf_counter()
+        for attempt in range(1, self.attempts + 1):
+            async with self._slot():
+                self._counts["in_flight"] += 1
+                try:
+                    response, outcome = await self._attempt(send)
+                finally:
+                    self._counts["in_flight"] -= 1
+            if outcome != "retry" or attempt == self.attempts:
+                break
+            delay = self._backoff(attempt)
+            if response.status_code == 429:
+                self.bucket.penalize(delay)
+            self._counts["retries"] += 1
+            await asyncio.sleep(delay)
+        self._finish(response, start)
+        return response
+
+    def _finish(self, response, start: float):
+        if getattr(response, "status_code", 200) == 200:
+            self._counts["ok"] += 1
+            self._latencies.append(time.perf_counter() - start)
+        else:
+            self._counts["failed"] += 1
+
+    async def _streaming(self, open_stream):
+        """
+        Yields the responses of a stream. Until the first chunk arrives a failure is
+        retried like a plain call; after that it ends the stream with an error response.
+        """
+        self._counts["calls"] += 1
+        start = time.perf_counter()
+        for attempt in range(1, self.attempts + 1):
+            async with self._slot():
+                self._counts["in_flight"] += 1
+                stream = None
+                try:
+                    async def first():
+                        nonlocal stream
+                        stream = open_stream()
+                        return await stream.__anext__()
+                    response, outcome = await self._attempt(first)
+                    if outcome == "ok":
+                        yield response
+                        while True:
+                            try:
+                                response = await asyncio.wait_for(stream.__anext__(), self.timeout)
+                            except StopAsyncIteration:
+                                break
+                            except asyncio.TimeoutError:
+                                self._counts["timeouts"] += 1
+                                response = error_response(504, "RequestTimeout", "Stream stalled")
+                            except Exception as e:
+                                self._counts["errors"] += 1
+                                response = error_response(503, "ConnectionError", str(e))
+                            except BaseException:
+                                self.breaker.release() # cancelled mid-stream
+                                raise
+                            yield response
+                            if response.status_code != 200:
+                                self._settle(response)
+                                break
+                        self._finish(response, start)
+                        return
+                finally:
+                    self._counts["in_flight"] -= 1
+                    if stream is not None:
+                        await stream.aclose()
+            if outcome != "retry" or attempt == self.attempts:
+                break
+            delay = self._backoff(attempt)
+            if response.status_code == 429:
+                self.bucket.penalize(delay)
+            self._counts["retries"] += 1
+            await asyncio.sleep(delay)
+        self._finish(response, start)
+        yield response
+
+    def _iterate(self, agen):
+        # Sync view of an async generator running on the client loop
+        loop = self._ensure_loop()
+        try:
+            while True:
+                try:
+                    item = asyncio.run_coroutine_threadsafe(agen.__anext__(), loop).result()
+                except StopAsyncIteration:
+                    return
+                yield item
+        finally:
+            asyncio.run_coroutine_threadsafe(agen.aclose(), loop).result()
+
+    async def _aiterate(self, agen):
+        # The same for async callers on another loop
+        self._ensure_loop()
+        try:
+            while True:
+                try:
+                    item = await self._await(agen.__anext__())
+                except StopAsyncIteration:
+                    return
+                yield item
+        finally:
+            await self._await(agen.aclose())
+
+    # --- Async interface ---
+
+    async def amultimodal_call(self, model, messages, **kwargs):
+        return await self._await(self._retrying(lambda: self.backend.amultimodal_call(model, messages, **kwargs)))
+
+    async def ageneration_call(self, model, prompt, **kwargs):
+        return await self._await(self._retrying(lambda: self.backend.ageneration_call(model, prompt, **kwargs)))
+
+    async def amultimodal_stream(self, model, messages, **kwargs):
+        async for response in self._aiterate(
+                self._streaming(lambda: self.backend.amultimodal_stream(model, messages, **kwargs))):
+            yield response
+
+    async def ageneration_stream(self, model, prompt, **kwargs):
+        async for response in self._aiterate(
+                self._streaming(lambda: self.backend.ageneration_stream(model, prompt, **kwargs))):
+            yield response
+
+    # --- Sync interface (ModelClient) ---
+
+    def multimodal_call(self, model, messages, **kwargs):
+        return self._run(self._retrying(lambda: self.backend.amultimodal_call(model, messages, **kwargs)))
+
+    def generation_call(self, model, prompt, **kwargs):
+        return self._run(self._retrying(lambda: self.backend.ageneration_call(model, prompt, **kwargs)))
+
+    def multimodal_stream(self, model, messages, **kwargs):
+        yield from self._iterate(self._streaming(lambda: self.backend.amultimodal_stream(model, messages, **kwargs)))
+
+    def generation_stream(self, model, prompt, **kwargs):
+        yield from self._iterate(self._streaming(lambda: self.backend.ageneration_stream(model, prompt, **kwargs)))
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Counters since start, the breaker state and latency percentiles (seconds,
+        successful calls including their retries).
+        """
+        latencies = sorted(self._latencies)
+        pick = lambda q: round(latencies[min(len(latencies) - 1, int(len(latencies) * q))], 3) if latencies else None
+        return dict(self._counts, breaker=self.breaker.state, breaker_opened=self.breaker.opened,
+                    latency_p50=pick(0.5), latency_p90=pick(0.9), latency_p99=pick(0.99))
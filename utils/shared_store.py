@@ -0,0 +1,127 @@
+"""
+Process-wide store shared by all Streamlit sessions.
+
+Each collection ("nodes", "edges", "events") has a loader (optional; events are
+cached per shard by event_shards instead), a cheap change token (file stat or
+manifest generation) and a version. Versions come from one monotonic counter, so
+"anything newer than what I rendered" is a single integer comparison.
+
+Writers call invalidate() after saving (or put() when the write is buffered, see
+write_behind); changes made by another process are picked up through the change
+tokens. Sessions subscribe to the collections they display and check
+Subscription.changed() to decide whether to rerun.
+"""
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+class Subscription:
+    def __init__(self, store: "SharedStore", names: Iterable[str]):
+        self.store = store
+        self.names = set(names)
+        self.seen = store.version_of(*self.names)
+
+    def watch(self, names: Iterable[str]):
+        """
+        Changes the watched collections (e.g. on page switch) without losing position.
+        """
+        names = set(names)
+        if names != self.names:
+            self.names = names
+            self.seen = self.store.version_of(*names)
+
+    def changed(self) -> bool:
+        return self.store.version_of(*self.names) > self.seen
+
+    def ack(self):
+        self.seen = self.store.version_of(*self.names)
+
+class SharedStore:
+    def __init__(self, tokens: Dict[str, Callable[[], Any]],
+                 loaders: Optional[Dict[str, Callable[[], Any]]] = None):
+        self._tokens = tokens
+        self._loaders = loaders or {}
+        self._lock = threading.RLock()
+        self.version = 0
+        self._versions = {name: 0 for name in tokens}
+        self._values: Dict[str, Any] = {}
+        self._seen_tokens: Dict[str, Any] = {}
+        self._listeners: List[Callable[[str, int], None]] = []
+
+    def get(self, name: str) -> Any:
+        """
+        The shared, parsed value of a collection. Loaded once per change and shared by
+        all sessions: treat it as read-only.
+        """
+        with self._lock:
+            self._poll(name)
+            if name not in self._values:
+                self._seen_tokens[name] = self._tokens[name]()
+                self._values[name] = self._loaders[name]()
+            return self._values[name]
+
+    def cached(self, name: str) -> Any:
+        """
+        The parsed value if it is loaded, else None (never loads).
+        """
+        with self._lock:
+            return self._values.get(name)
+
+    def _poll(self, name: str):
+        # Detect writes from outside this process
+        if name in self._seen_tokens and self._tokens[name]() != self._seen_tokens[name]:
+            self.invalidate(name)
+
+    def invalidate(self, name: str):
+        """
+        Drops the cached value and publishes a new version. Call after every write.
+        """
+        self._publish(name, None)
+
+    def put(self, name: str, value: Any):
+        """
+        Replaces the cached value with one that is not on disk yet (write-behind)
+        and publishes a new version.
+        """
+        self._publish(name, value)
+
+    def mark_synced(self, name: str):
+        """
+        Accepts the current file as this process's own write-behind flush, so
+        _poll doesn't mistake it for an external change.
+        """
+        with self._lock:
+            self._seen_tokens[name] = self._tokens[name]()
+
+    def _publish(self, name: str, value: Any):
+        with self._lock:
+            if value is None:
+                self._values.pop(name, None)
+            else:
+                self._values[name] = value
+            self._seen_tokens[name] = self._tokens[name]()
+            self.version += 1
+            self._versions[name] = self.version
+            version = self.version
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(name, version)
+
+    def version_of(self, *names: str) -> int:
+        """
+        Latest version among the given collections (all if none given).
+        """
+        with self._lock:
+            names = names or tuple(self._versions)
+            for name in names:
+                self._poll(name)
+            return max((self._versions[n] for n in names), default=0)
+
+    def subscribe(self, names: Iterable[str]) -> Subscription:
+        return Subscription(self, names)
+
+    def add_listener(self, fn: Callable[[str, int], None]):
+        """
+        fn(collection, version) is called after every invalidation, in the writer's thread.
+        """
+        with self._lock:
+            self._listeners.append(fn)
@@ -0,0 +1,131 @@
+"""
+Write-behind buffer for whole-file collections (nodes, edges).
+
+A save replaces the collection's pending value in memory and returns; a
+background thread writes each dirty collection once per interval, or sooner when
+many saves have piled up, so a burst of edits (e.g. recolouring several people)
+costs one file write per collection instead of one per click. Only the latest
+value of a collection is ever written.
+
+Durability modes:
+    immediate  write and fsync in the caller, before save returns
+    batched    flush every interval, fsync each file before it replaces the old one
+    relaxed    flush every interval without fsync (the OS decides when it hits disk)
+
+Owners call close() on interpreter exit to flush what is pending; a crash loses at
+most one interval of saves in the batched and relaxed modes.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+DURABILITY_MODES = ("immediate", "batched", "relaxed")
+
+class WriteBehind:
+    def __init__(self, writer: Callable[[str, Any, bool], None], durability: str = "batched",
+                 interval: float = 1.0, max_pending: int = 100,
+                 on_flushed: Optional[Callable[[str], None]] = None):
+        """
+        writer(path, data, fsync) persists one collection; on_flushed(name) is
+        called after each successful write.
+        """
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"unknown durability mode: {durability}")
+        self.writer = writer
+        self.durability = durability
+        self.interval = interval
+        self.max_pending = max_pending
+        self.on_flushed = on_flushed
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock() # one writer at a time, in save order
+        self._dirty: Dict[str, Tuple[str, Any]] = {}
+        self._inflight: Dict[str, Tuple[str, Any]] = {} # taken by a flush, not yet written
+        self._pending = 0
+        self._wake = threading.Event()
+        self._thread = None
+        self._closed = False
+        self.stats = {"saves": 0, "writes": 0, "flushes": 0, "errors": 0, "last_flush_ms": 0.0}
+
+    def pending(self, name: str) -> Any:
+        """
+        The unflushed value of a collection, or None when the file is current.
+        """
+        with self._lock:
+            entry = self._dirty.get(name) or self._inflight.get(name)
+        return entry[1] if entry else None
+
+    def dirty(self) -> int:
+        """
+        Number of collections with saves not on disk yet.
+        """
+        with self._lock:
+            return len(set(self._dirty) | set(self._inflight))
+
+    def put(self, name: str, path: str, data: Any):
+        with self._lock:
+            self._dirty[name] = (path, data)
+            self._pending += 1
+            self.stats["saves"] += 1
+            wake = self._pending >= self.max_pending
+            if self._thread is None and self.durability != "immediate" and not self._closed:
+                self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self._thread.start()
+        if self.durability == "immediate" or self._closed:
+            self.flush()
+        elif wake:
+            self._wake.set()
+
+    def flush(self):
+        """
+        Writes every dirty collection now. Failed writes stay dirty and are retried.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._dirty, self._pending = self._dirty, {}, 0
+                self._inflight = dict(batch)
+            if not batch:
+                return
+            start = time.perf_counter()
+            try:
+                for name, (path, data) in list(batch.items()):
+                    self.writer(path, data, self.durability != "relaxed")
+                    del batch[name]
+                    with self._lock:
+                        self._inflight.pop(name, None)
+                    self.stats["writes"] += 1
+                    if self.on_flushed:
+                        self.on_flushed(name)
+            except Exception:
+                self.stats["errors"] += 1
+                with self._lock:
+                    for name, entry in batch.items():
+                        self._dirty.setdefault(name, entry) # newer saves win
+                    self._inflight = {}
+                raise
+            finally:
+                self.stats["flushes"] += 1
+                self.stats["last_flush_ms"] = (time.perf_counter() - start) * 1000
+
+    def discard(self):
+        """
+        Drops unflushed values (the files were replaced underneath, e.g. by a restore).
+        """
+        with self._flush_lock, self._lock:
+            self._dirty, self._pending = {}, 0
+
+    def close(self):
+        """
+        Final flush; later saves are written synchronously.
+        """
+        self._closed = True
+        self._wake.set()
+        self.flush()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Write-behind flush failed: {e}")